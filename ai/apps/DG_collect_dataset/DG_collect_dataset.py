@@ -12,10 +12,10 @@ if core_dir not in sys.path:
 
 import utils
 
-# MAPPING: Step Number -> Module Name
+# MAPPING: Step Number -> Module Name (or a tuple of modules run in order)
 STEPS = {
     1: "01_setup_scrape",
-    2: "02_crop",
+    2: ("02_crop", "02_quality", "02_identity"),
     3: "03_validate",   
     4: "04_clean",      
     5: "05_caption",    
@@ -26,14 +26,17 @@ def run_pipeline(slug, limit, count, gender, trigger, model, only_step=None):
     print(f"🚀 Pipeline Started: {slug}")
     print(f"🔑 Trigger Word: {trigger}")
     
-    # Save config first
-    utils.save_config(slug, {
+    # Save config first: CLI values update the existing project config, so
+    # per-project settings (quality thresholds, caption_*, train...) survive
+    config = utils.load_config(slug) or {}
+    config.update({
         'trigger': trigger,
         'gender': gender,
         'limit': limit,
         'count': count,
         'model': model
     })
+    utils.save_config(slug, config)
 
     # Determine which steps to run
     if only_step:
@@ -47,30 +50,32 @@ def run_pipeline(slug, limit, count, gender, trigger, model, only_step=None):
 
     # Execute Steps
     for step_num in step_nums:
-        module_name = STEPS.get(step_num)
-        if not module_name:
+        module_names = STEPS.get(step_num)
+        if not module_names:
             print(f"⚠️ Warning: Step {step_num} is not defined.")
             continue
+        if isinstance(module_names, str): module_names = (module_names,)
 
-        print(f"\n--> [{module_name}] Running Step {step_num}...")
-        
-        try:
-            # Dynamic Import
-            module = importlib.import_module(module_name)
-            
-            # Run the module
-            if hasattr(module, 'run'):
-                module.run(slug)
-            else:
-                print(f"❌ Error: {module_name} does not have a 'run(slug)' function.")
-                
-        except ImportError as e:
-            print(f"❌ Error: Could not load script '{module_name}'. Details: {e}")
-        except Exception as e:
-            print(f"❌ Error during {module_name}: {e}")
-            import traceback
-            traceback.print_exc()
-            return 
+        for module_name in module_names:
+            print(f"\n--> [{module_name}] Running Step {step_num}...")
+
+            try:
+                # Dynamic Import
+                module = importlib.import_module(module_name)
+
+                # Run the module
+                if hasattr(module, 'run'):
+                    module.run(slug)
+                else:
+                    print(f"❌ Error: {module_name} does not have a 'run(slug)' function.")
+
+            except ImportError as e:
+                print(f"❌ Error: Could not load script '{module_name}'. Details: {e}")
+            except Exception as e:
+                print(f"❌ Error during {module_name}: {e}")
+                import traceback
+                traceback.print_exc()
+                return
 
     print(f"\n✅ Pipeline Complete for {slug}")
 
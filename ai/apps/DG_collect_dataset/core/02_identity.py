@@ -0,0 +1,116 @@
+import sys
+import os
+import time
+import numpy as np
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import face_embeddings
+import identity
+
+# Cheap identity gate right after cropping, so wrong-person crops never reach
+# validation or the caption model. The target identity comes from reference
+# photos in <project>/reference/ if there are any, otherwise from the
+# majority cluster of the first BOOTSTRAP_COUNT crops that passed 02_quality.
+# 06_qc still runs the strict check later; this gate is deliberately loose.
+
+REPORT_NAME = "identity_gate.json"
+REFERENCE_DIR = "reference"
+CROP_STORE = "crop_embeddings"       # Separate from 06_qc's store (different files)
+REFERENCE_STORE = "reference_embeddings"
+BOOTSTRAP_COUNT = 60
+GATE_K = 5.0                          # Looser than identity.ACCEPT_K
+MIN_REFERENCE_SPREAD = 0.05           # A handful of refs underestimates the spread
+
+def list_images(folder):
+    if not folder.exists(): return []
+    return sorted([f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.png', '.jpeg', '.webp'))])
+
+def hide_gpu_from_tensorflow():
+    # TF grabs the whole GPU by default; keep it off the card the caption model needs
+    try:
+        import tensorflow as tf
+        tf.config.set_visible_devices([], 'GPU')
+    except Exception: pass  # Already initialised (02_crop) or TF missing
+
+def reference_model(path):
+    ref_dir = path / REFERENCE_DIR
+    files = list_images(ref_dir)
+    if not files: return None
+    store = face_embeddings.EmbeddingStore(path, name=REFERENCE_STORE)
+    face_embeddings.update_store(store, ref_dir, files)
+    ids = [f for f in files if f in store.latest]
+    if not ids: return None
+
+    model = identity.IdentityModel()
+    model.fit(ids, store.get(ids), members=np.ones(len(ids), dtype=bool))
+    model.mad = max(model.mad, MIN_REFERENCE_SPREAD)
+    print(f"   Identity from {len(ids)} reference photos.")
+    return model
+
+def bootstrap_model(store, ids):
+    seed = ids[:BOOTSTRAP_COUNT]
+    model = identity.IdentityModel()
+    model.fit(seed, store.get(seed))
+    if model.ready:
+        print(f"   Identity bootstrapped from the first {len(seed)} crops.")
+    return model
+
+def run(slug):
+    config = utils.load_config(slug) or {}
+    if not config.get('identity_gate', True):
+        print("   Identity gate disabled (identity_gate: false).")
+        return
+
+    path = utils.get_project_path(slug)
+    in_dir = path / utils.DIRS['crop']
+    if not in_dir.exists():
+        print(f"❌ Error: Input directory not found: {in_dir}")
+        return
+
+    # Only crops that survived the quality gate are worth embedding
+    quality = utils.load_project_data(slug, "quality_scores.json") or {}
+    failed = {f for f, r in quality.get('images', {}).items() if not r.get('passed', True)}
+    files = [f for f in list_images(in_dir) if f not in failed]
+    print(f"🪪 [02_identity] Gating {len(files)} crops...")
+    if not files: return
+
+    hide_gpu_from_tensorflow()
+    start_t = time.time()
+    store = face_embeddings.EmbeddingStore(path, name=CROP_STORE)
+    face_embeddings.update_store(store, in_dir, files)
+    ids = [f for f in files if store.is_current(f, face_embeddings.file_signature(in_dir / f))]
+    if not ids:
+        print("   ⚠️ No faces could be embedded. Leaving the gate to 03_validate.")
+        return
+
+    model, source = reference_model(path), 'reference'
+    if model is None: model, source = bootstrap_model(store, ids), 'bootstrap'
+    if not model.ready:
+        print("   ⚠️ No reference photos and no clear cluster. Passing everything.")
+        utils.save_project_data(slug, REPORT_NAME, {'source': None, 'images': {}})
+        return
+
+    threshold = model.threshold_at(GATE_K)
+    distances = model.distances(store.get(ids))
+    results = {
+        f: {'passed': bool(d <= threshold), 'distance': round(float(d), 4)}
+        for f, d in zip(ids, distances)
+    }
+    # Crops with no embeddable face are left to 03_validate
+    utils.save_project_data(slug, REPORT_NAME, {
+        'source': source,
+        'threshold': round(float(threshold), 4),
+        'images': results,
+    })
+
+    rejected = sum(1 for r in results.values() if not r['passed'])
+    print(f"✅ [02_identity] Rejected {rejected}/{len(results)} wrong-person crops "
+          f"(threshold {threshold:.3f}, {time.time() - start_t:.1f}s).")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
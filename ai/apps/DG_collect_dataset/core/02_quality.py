@@ -0,0 +1,148 @@
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import pyramid
+
+REPORT_NAME = "quality_scores.json"
+
+# All metrics are computed on the face crop with the black square padding
+# from 02_crop removed, resized to a fixed grid so scores compare across sizes.
+ANALYSIS_SIZE = 256
+BATCH_SIZE = 64
+
+# Override any of these per project via project_config.json -> "quality": {...}
+DEFAULT_THRESHOLDS = {
+    'min_sharpness': 40.0,     # Laplacian variance
+    'min_brightness': 35.0,    # Mean luma (0-255)
+    'max_brightness': 220.0,
+    'max_clipped': 0.25,       # Fraction of pixels crushed to black or blown to white
+    'min_contrast': 20.0,      # Luma standard deviation
+    'max_noise': 10.0,         # Estimated noise sigma
+    'min_resolution': 256,     # Shortest side of the real (unpadded) content
+    'max_blockiness': 1.5,     # JPEG 8x8 grid energy vs. the rest
+}
+
+def blockiness(gray):
+    # Mean horizontal/vertical gradient folded by 8-pixel phase. Heavy JPEG
+    # compression puts a spike on one phase; the crop offset decides which.
+    g = gray.astype(np.float32)
+    col_diff = np.abs(np.diff(g, axis=1)).mean(axis=0)
+    row_diff = np.abs(np.diff(g, axis=0)).mean(axis=1)
+    scores = []
+    for prof in (col_diff, row_diff):
+        n = (prof.size // 8) * 8
+        if n < 16: continue
+        phases = prof[:n].reshape(-1, 8).mean(axis=0)
+        # +1 keeps near-flat images (tiny gradients everywhere) from scoring as blocky
+        scores.append((phases.max() + 1.0) / (float(np.median(phases)) + 1.0))
+    return float(max(scores)) if scores else 1.0
+
+def load_for_analysis(img_path):
+    gray = cv2.imread(str(img_path), cv2.IMREAD_GRAYSCALE)
+    if gray is None: return None
+    y1, y2, x1, x2 = pyramid.content_bbox(gray)
+    content = gray[y1:y2, x1:x2]
+    small = cv2.resize(content, (ANALYSIS_SIZE, ANALYSIS_SIZE), interpolation=cv2.INTER_AREA)
+    return small, min(content.shape[:2]), blockiness(content)
+
+def score_batch(stack):
+    # stack: (N, H, W) uint8 -> dict of (N,) float arrays
+    g = stack.astype(np.float32)
+    n = g.shape[0]
+    centre = g[:, 1:-1, 1:-1]
+
+    # Sharpness: variance of the 4-neighbour Laplacian
+    lap = g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:] - 4.0 * centre
+    sharpness = lap.reshape(n, -1).var(axis=1)
+
+    # Noise: Immerkaer's fast estimator (Laplacian-of-Laplacian mask)
+    corners = g[:, :-2, :-2] + g[:, :-2, 2:] + g[:, 2:, :-2] + g[:, 2:, 2:]
+    edges = g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:]
+    conv = corners - 2.0 * edges + 4.0 * centre
+    h, w = g.shape[1:]
+    noise = np.abs(conv).reshape(n, -1).sum(axis=1) * np.sqrt(0.5 * np.pi) / (6.0 * (w - 2) * (h - 2))
+
+    flat = stack.reshape(n, -1)
+    clipped = ((flat <= 5) | (flat >= 250)).mean(axis=1)
+
+    return {
+        'sharpness': sharpness,
+        'brightness': g.reshape(n, -1).mean(axis=1),
+        'contrast': g.reshape(n, -1).std(axis=1),
+        'clipped': clipped,
+        'noise': noise,
+    }
+
+def judge(scores, thresholds):
+    reasons = []
+    if scores['sharpness'] < thresholds['min_sharpness']: reasons.append('blurry')
+    if scores['brightness'] < thresholds['min_brightness']: reasons.append('underexposed')
+    if scores['brightness'] > thresholds['max_brightness']: reasons.append('overexposed')
+    if scores['clipped'] > thresholds['max_clipped']: reasons.append('clipped')
+    if scores['contrast'] < thresholds['min_contrast']: reasons.append('low_contrast')
+    if scores['noise'] > thresholds['max_noise']: reasons.append('noisy')
+    if scores['resolution'] < thresholds['min_resolution']: reasons.append('low_resolution')
+    if scores['blockiness'] > thresholds['max_blockiness']: reasons.append('compressed')
+    return reasons
+
+def score_files(in_dir, files, thresholds, batch_size=BATCH_SIZE):
+    results = {}
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        for start in range(0, len(files), batch_size):
+            chunk = files[start:start + batch_size]
+            loaded = list(pool.map(lambda f: load_for_analysis(in_dir / f), chunk))
+
+            names = [f for f, item in zip(chunk, loaded) if item is not None]
+            items = [item for item in loaded if item is not None]
+            for f, item in zip(chunk, loaded):
+                if item is None:
+                    results[f] = {'passed': False, 'reasons': ['unreadable']}
+            if not items: continue
+
+            batch_scores = score_batch(np.stack([item[0] for item in items]))
+            for idx, (f, (_, resolution, block)) in enumerate(zip(names, items)):
+                scores = {k: round(float(v[idx]), 3) for k, v in batch_scores.items()}
+                scores['resolution'] = int(resolution)
+                scores['blockiness'] = round(block, 3)
+                reasons = judge(scores, thresholds)
+                results[f] = {**scores, 'passed': not reasons, 'reasons': reasons}
+    return results
+
+def run(slug):
+    config = utils.load_config(slug) or {}
+    thresholds = {**DEFAULT_THRESHOLDS, **config.get('quality', {})}
+
+    path = utils.get_project_path(slug)
+    in_dir = path / utils.DIRS['crop']
+
+    if not in_dir.exists():
+        print(f"❌ Error: Input directory not found: {in_dir}")
+        return
+
+    files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
+    print(f"🔬 [02_quality] Scoring {len(files)} crops...")
+
+    start_t = time.time()
+    results = score_files(in_dir, files, thresholds)
+    elapsed = time.time() - start_t
+
+    utils.save_project_data(slug, REPORT_NAME, {'thresholds': thresholds, 'images': results})
+
+    rejected = [f for f, r in results.items() if not r['passed']]
+    for f in rejected:
+        print(f"    ❌ {f}: {', '.join(results[f]['reasons'])}")
+    print(f"✅ [02_quality] {len(files) - len(rejected)}/{len(files)} passed ({elapsed:.1f}s). Scores: {path / REPORT_NAME}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
@@ -1,10 +1,11 @@
 import sys
 import os
-import base64
 import time
 import torch
 import utils
 import re
+import caption_engine
+import caption_cache
 
 # Force localhost for WSL
 OLLAMA_HOST = "http://127.0.0.1:11434"
@@ -31,6 +32,9 @@ def get_system_instruction(trigger, gender):
     "{trigger} is standing outdoors in a park with blurred green trees in the background. {trigger} is wearing a navy blue wool suit jacket, a white collared shirt, and a red silk tie with diagonal stripes. The lighting is soft and natural."
     """
 
+def get_ollama_prompt(trigger):
+    return f"Describe this image of {trigger}. Focus on clothing and background."
+
 def ensure_ollama_server():
     import ollama
     try:
@@ -67,120 +71,95 @@ def run(slug, model="qwen-vl", mode="fixed"):
     out_dir = path / utils.DIRS['caption']
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # ================= LOAD QWEN (4-BIT TURBO) =================
-    qwen_model_obj = None
-    qwen_processor = None
+    # ================= CAPTION CACHE =================
+    files = [f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+
+    # Get the perfect instruction
+    system_instruction = get_system_instruction(trigger, gender_str)
+    if model == "qwen-vl":
+        model_id = caption_engine.QWEN_PATH.name
+        version = caption_cache.prompt_version(
+            get_system_instruction, gender_str, prefix_first=config.get('caption_prefix_cache', False)
+        )
+    else:
+        model_id = 'moondream'
+        version = caption_cache.prompt_version(get_ollama_prompt)
+
+    cache = caption_cache.CaptionCache()
+    txt_path_for = lambda img_path: out_dir / (os.path.splitext(img_path.name)[0] + ".txt")
+    uncached = caption_cache.apply_cached(
+        cache, [in_dir / f for f in files], model_id, version, trigger, txt_path_for, clean_caption
+    )
+    pending = [p for p in uncached if not txt_path_for(p).exists()]
+    legacy = len(uncached) - len(pending)
+    if legacy: print(f"   ⚠️ {legacy} existing .txt with no cached caption kept as is (not re-triggered); delete them to recaption.")
+    print(f"📝 Captioning {len(pending)}/{len(files)} images with {model}...")
+    if not pending:
+        cache.close()
+        print(f"✅ Captions complete.")
+        return
+
+    # ================= MODEL CHECKS =================
     client = None
 
     if model == "qwen-vl":
-        print("⏳ Loading Qwen2.5-VL (Turbo 4-bit)...")
-        from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
-        from qwen_vl_utils import process_vision_info
-        
-        # Adjust this path if your Qwen is stored differently
-        qwen_path = utils.MODEL_STORE_ROOT / "QWEN" / "Qwen2.5-VL-3B-Instruct" 
+        qwen_path = caption_engine.QWEN_PATH
         
         if not qwen_path.exists():
             print(f"❌ Qwen model not found at {qwen_path}. Run utils.bootstrap() first.")
-            return
-
-        try:
-            bnb_config = BitsAndBytesConfig(
-                load_in_4bit=True,
-                bnb_4bit_compute_dtype=torch.float16,
-                bnb_4bit_quant_type="nf4"
-            )
-            
-            qwen_model_obj = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-                str(qwen_path),
-                quantization_config=bnb_config,
-                device_map="auto",
-            )
-            qwen_processor = AutoProcessor.from_pretrained(str(qwen_path))
-            print("✅ Qwen-VL Loaded (4-bit Turbo).")
-        except Exception as e:
-            print(f"❌ Failed to load Qwen: {e}")
+            cache.close()
             return
     else:
         # Fallback to Ollama if not using Qwen-VL
         client = ensure_ollama_server()
 
     # ================= PROCESS IMAGES =================
-    files = [f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
-    print(f"📝 Captioning {len(files)} images with {model}...")
+    def save_caption(img_path, caption):
+        caption = clean_caption(caption, trigger)
+        cache.write_text(txt_path_for(img_path), caption)
 
-    # Get the perfect instruction
-    system_instruction = get_system_instruction(trigger, gender_str)
+    def save_model_caption(img_path, caption):
+        cache.put(img_path, model_id, version, caption, trigger)
+        save_caption(img_path, caption)
 
-    for i, f in enumerate(files, 1):
-        txt_path = out_dir / (os.path.splitext(f)[0] + ".txt")
-        if txt_path.exists(): 
-            continue
-        
-        img_path = in_dir / f
-        caption = ""
-        print(f"   [{i}/{len(files)}] Processing {f}...", end="", flush=True)
-        
-        start_t = time.time()
+    fallbacks = []
+    def fallback_caption(img_path, e):
+        print(f"   ⚠️ {img_path.name} Error: {e}")
+        save_caption(img_path, f"{trigger}, a {gender_str}.")
+        fallbacks.append(img_path)
 
+    if model == "qwen-vl":
+        # GPU 4-bit (Turbo), or CPU int8 when there is no CUDA / caption_device = "cpu"
+        print("⏳ Loading Qwen2.5-VL...")
         try:
-            if model == "qwen-vl":
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image", 
-                                "image": str(img_path),
-                                "max_pixels": 768 * 768 
-                            },
-                            {"type": "text", "text": system_instruction},
-                        ],
-                    }
-                ]
-                
-                text_input = qwen_processor.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True
-                )
-                
-                image_inputs, video_inputs = process_vision_info(messages)
-                inputs = qwen_processor(
-                    text=[text_input],
-                    images=image_inputs,
-                    videos=video_inputs,
-                    padding=True,
-                    return_tensors="pt",
-                )
-                inputs = inputs.to(qwen_model_obj.device)
-
-                # Increased max_new_tokens to 256 for detailed T5 style description
-                generated_ids = qwen_model_obj.generate(**inputs, max_new_tokens=256)
-                
-                generated_ids_trimmed = [
-                    out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-                ]
-                caption = qwen_processor.batch_decode(
-                    generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-                )[0]
-                
-            else:
-                # Legacy Moondream/Ollama logic
-                if not client: continue
-                with open(img_path, "rb") as ifile:
-                    b64 = base64.b64encode(ifile.read()).decode('utf-8')
-                simple_prompt = f"Describe this image of {trigger}. Focus on clothing and background."
-                res = client.chat(model='moondream', messages=[{'role': 'user', 'content': simple_prompt, 'images': [b64]}], options={'timeout': 60})
-                caption = res['message']['content'].replace('\n', ' ').strip()
-        
-        except Exception as e: 
-            print(f" ⚠️ Error: {e}")
-            caption = f"{trigger}, a {gender_str}."
-
-        # Final cleanup and save
-        caption = clean_caption(caption, trigger)
-        with open(txt_path, "w", encoding="utf-8") as tf: tf.write(caption)
-        
-        elapsed = time.time() - start_t
-        print(f" Done ({elapsed:.1f}s).")
-
-    print(f"✅ Captions complete.")
\ No newline at end of file
+            caption_engine.caption_paths(
+                pending, system_instruction,
+                on_caption=save_model_caption, on_error=fallback_caption,
+                device=config.get('caption_device', 'auto'),
+                replicas=config.get('caption_cpu_replicas', 1),
+                prefetch_depth=config.get('caption_prefetch_depth', caption_engine.PREFETCH_DEPTH),
+                token_budget=config.get('caption_token_budget', caption_engine.CAPTION_TOKEN_BUDGET),
+                batch_deadline=config.get('caption_batch_deadline', caption_engine.BATCH_DEADLINE),
+                reuse_prefix=config.get('caption_prefix_cache', False),
+            )
+        except Exception as e:
+            print(f"❌ Qwen captioning failed: {e}")
+    elif client:
+        # Legacy Moondream/Ollama logic
+        import ollama_async
+        ollama_async.caption_files(
+            pending, get_ollama_prompt(trigger), on_caption=save_model_caption, on_error=fallback_caption,
+            host=OLLAMA_HOST, model='moondream',
+        )
+    else:
+        print("⚠️ Ollama server not reachable. Skipping captions.")
+
+    cache.close()
+    missing = [p for p in pending if not txt_path_for(p).exists()]
+    if missing:
+        print(f"⚠️ Captioning incomplete: {len(missing)}/{len(pending)} images have no caption. Re-run to retry them.")
+        return
+    if fallbacks:
+        print(f"⚠️ Captions complete, {len(fallbacks)}/{len(pending)} with the generic fallback caption.")
+        return
+    print(f"✅ Captions complete.")
@@ -57,10 +57,19 @@ def run(slug):
 
     files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
     valid_count = 0
+
+    # Crops failed by the cheap gates (02_quality, 02_identity) never reach DeepFace
+    rejected = utils.load_gate_rejects(slug)
+    if rejected:
+        print(f"   Skipping {len(rejected)} images rejected by quality/identity gates.")
     
     for i, f in enumerate(files, 1):
         src = in_dir / f
         dst = out_dir / f
+
+        if f in rejected:
+            if dst.exists(): dst.unlink()
+            continue
         
         if dst.exists():
             valid_count += 1
@@ -2,21 +2,16 @@ import sys
 import os
 import shutil
 import utils
-from PIL import Image, ImageOps
+import pyramid
+import publish_manifest
+import transfer
+import launchers
+import train_planner
 from pathlib import Path
 
 TARGET_SIZE = 1024
 RESOLUTIONS = [512, 256]
 
-def resize_pad_to_square(img_path, save_path, size):
-    try:
-        with Image.open(img_path) as img:
-            img = img.convert("RGB")
-            img = ImageOps.pad(img, (size, size), color=(0, 0, 0), centering=(0.5, 0.5))
-            img.save(save_path, quality=95)
-        return True
-    except: return False
-
 def generate_toml(clean_path, resolution):
     return f"""[general]
 caption_extension = ".txt"
@@ -30,7 +25,12 @@ num_repeats = 1
 resolution = [{resolution},{resolution}]
 """
 
-def generate_bat(slug, toml_path_win_c):
+LATENTS_CMD_BAT = 'python wan_cache_latents.py --dataset_config "%CFG%" --vae "%VAE%" --vae_dtype float16 --vae_cache_cpu --skip_existing'
+TE_CMD_BAT = 'python wan_cache_text_encoder_outputs.py --dataset_config "%CFG%" --t5 "%T5%" --batch_size 16 --fp8_t5 --skip_existing'
+LATENTS_CMD_SH = 'python wan_cache_latents.py --dataset_config "${CFG}" --vae "${VAE}" --vae_dtype float16 --vae_cache_cpu --skip_existing'
+TE_CMD_SH = 'python wan_cache_text_encoder_outputs.py --dataset_config "${CFG}" --t5 "${T5}" --batch_size 16 --fp8_t5 --skip_existing'
+
+def generate_bat(slug, toml_path_win_c, cache_dir, digests=None, concurrent_caches=False):
     return f"""@echo off
 set "WAN_ROOT={utils.MUSUBI_PATHS['win_app']}"
 set "CFG={toml_path_win_c}"
@@ -42,8 +42,10 @@ set "DIT_HIGH=%C_MODEL_BASE%\\diffusion-models\\Wan\\Wan2.2\\14B\\Wan_2_2_I2V\\f
 set "VAE=%C_MODEL_BASE%\\vae\\wan_2.1_vae.pth"
 set "T5=%C_MODEL_BASE%\\clip\\models_t5_umt5-xxl-enc-bf16.pth"
 call %WAN_ROOT%\\venv\\scripts\\activate
-python wan_cache_latents.py --dataset_config "%CFG%" --vae "%VAE%" --vae_dtype float16 --vae_cache_cpu
-python wan_cache_text_encoder_outputs.py --dataset_config "%CFG%" --t5 "%T5%" --batch_size 16 --fp8_t5
+cd /d "%WAN_ROOT%"
+if not exist "%LOGDIR%" mkdir "%LOGDIR%"
+{launchers.bat_dispatch(cache_dir, digests or launchers.no_digests())}
+{launchers.bat_run_caches(slug, concurrent_caches)}
 accelerate launch --num_processes 1 "wan_train_network.py" ^
   --dataset_config "%CFG%" ^
   --output_dir "%OUT%" ^
@@ -67,18 +69,29 @@ accelerate launch --num_processes 1 "wan_train_network.py" ^
   --persistent_data_loader_workers ^
   --sdpa
 pause
-"""
+exit /b
+{launchers.bat_jobs(LATENTS_CMD_BAT, TE_CMD_BAT)}"""
 
-def generate_sh(slug, toml_path_wsl):
+def generate_sh(slug, toml_path_wsl, cache_dir, digests=None, concurrent_caches=False):
     return f"""#!/bin/bash
 WAN_DIR="{utils.MUSUBI_PATHS['wsl_app']}"
 CFG="{toml_path_wsl}"
 OUT="${{WAN_DIR}}/outputs/{slug}"
+LOGDIR="${{WAN_DIR}}/logs"
+MODEL_BASE="{utils.MUSUBI_PATHS['wsl_models']}"
+DIT_LOW="${{MODEL_BASE}}/diffusion-models/Wan/Wan2.2/14B/Wan_2_2_I2V/fp16/wan2.2_t2v_low_noise_14B_fp16.safetensors"
+DIT_HIGH="${{MODEL_BASE}}/diffusion-models/Wan/Wan2.2/14B/Wan_2_2_I2V/fp16/wan2.2_t2v_high_noise_14B_fp16.safetensors"
+VAE="${{MODEL_BASE}}/vae/wan_2.1_vae.pth"
+T5="${{MODEL_BASE}}/clip/models_t5_umt5-xxl-enc-bf16.pth"
 source ${{WAN_DIR}}/venv/bin/activate
+cd "${{WAN_DIR}}"
+{launchers.sh_caches(cache_dir, digests or launchers.no_digests(), LATENTS_CMD_SH, TE_CMD_SH, slug, concurrent_caches)}
 accelerate launch --num_processes 1 "wan_train_network.py" \\
   --dataset_config "${{CFG}}" \\
   --output_dir "${{OUT}}" \\
   --output_name "{slug}" \\
+  --dit "${{DIT_LOW}}" \\
+  --dit_high_noise "${{DIT_HIGH}}" \\
   --discrete_flow_shift 3 \\
   --fp8_base \\
   --fp8_scaled \\
@@ -108,32 +121,44 @@ def run(slug):
     # CHANGE: Read from QC directory
     in_dir = path / utils.DIRS['qc']
     publish_root = path / utils.DIRS['publish']
-    if publish_root.exists(): shutil.rmtree(publish_root)
     publish_root.mkdir(parents=True, exist_ok=True)
 
-    files = [f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png'))]
+    files = sorted(f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png')))
+    backend = pyramid.backend_for(config)
 
-    # 1. Master 1024
-    res_dir_1024 = publish_root / "1024"
-    res_dir_1024.mkdir(exist_ok=True)
-    for f in files:
-        if resize_pad_to_square(in_dir / f, res_dir_1024 / f, TARGET_SIZE):
+    # 1. Master 1024 + downsamples, published incrementally (publish_manifest):
+    # only changed images are rendered, each size dir is swapped in whole, and
+    # the Musubi caches next to them survive for the launchers to skip
+    sizes = [TARGET_SIZE] + RESOLUTIONS
+    def plan_for(size):
+        items = {}
+        for f in files:
+            items[f] = ['image', *publish_manifest.file_signature(in_dir / f), size, backend]
             txt = os.path.splitext(f)[0] + ".txt"
-            if (in_dir / txt).exists():
-                shutil.copy(in_dir / txt, res_dir_1024 / txt)
+            if (in_dir / txt).exists(): items[txt] = ['caption', publish_manifest.text_signature(in_dir / txt)]
+        return publish_manifest.PublishPlan(publish_root / str(size), items)
 
-    # 2. Downsamples
-    for res in RESOLUTIONS:
-        res_dir = publish_root / str(res)
-        res_dir.mkdir(exist_ok=True)
-        for f in files:
-            try:
-                img = Image.open(res_dir_1024 / f)
-                img.resize((res, res), Image.Resampling.LANCZOS).save(res_dir / f)
-                txt = os.path.splitext(f)[0] + ".txt"
-                if (res_dir_1024 / txt).exists():
-                    shutil.copy(res_dir_1024 / txt, res_dir / txt)
-            except: pass
+    plans = {size: plan_for(size) for size in sizes}
+    for size, plan in plans.items():
+        print(f"   {size}: {plan.summary()}")
+    todo = {size: set(plan.todo) for size, plan in plans.items()}
+    jobs = []
+    for f in files:
+        outputs = {size: plans[size].staging / f for size in sizes if f in todo[size]}
+        if outputs: jobs.append((in_dir / f, outputs))
+    pyramid.publish(jobs, backend=backend)
+
+    # 2. Captions, only next to images that were rendered or are reused
+    image_for = {os.path.splitext(f)[0]: f for f in files}
+    committed = {}
+    for size, plan in plans.items():
+        reused = set(plan.reused)
+        for name in todo[size]:
+            if not name.endswith(".txt"): continue
+            image = image_for[os.path.splitext(name)[0]]
+            if image in reused or (plan.staging / image).exists():
+                shutil.copy(in_dir / name, plan.staging / name)
+        committed[size] = plan.commit()
 
     # 3. Configs
     TARGET_RES = 256
@@ -144,17 +169,33 @@ def run(slug):
     toml_win_name = f"{slug}_{res_str}_win.toml"
     bat_win_name = f"train_{slug}_{res_str}.bat"
     win_toml_c_path = f"{utils.MUSUBI_PATHS['win_app']}\\TOML\\{toml_win_name}"
+    wsl_app = Path(utils.MUSUBI_PATHS['wsl_app'])
+    toml_wsl_name = f"{slug}_{res_str}_wsl.toml"
+    sh_name = f"train_{slug}_{res_str}.sh"
     
     with open(publish_root / toml_win_name, "w") as f:
         f.write(generate_toml(win_unc_img_path, TARGET_RES))
+    if not committed[TARGET_RES]:
+        print(f"⚠️ {wsl_img_path} was not updated; launchers still describe the previous publish.")
+    else:
+        latents, te = publish_manifest.prune_musubi_cache(wsl_img_path, Path(f"{wsl_img_path}_cache"))
+        if latents or te: print(f"   🧹 Pruned {latents} latent / {te} text-encoder cache files")
+    digests = launchers.dataset_digests(wsl_img_path, TARGET_RES)
+    concurrent = launchers.run_concurrently(train_planner.probe_host())
     with open(publish_root / bat_win_name, "w") as f:
-        f.write(generate_bat(slug, win_toml_c_path))
+        f.write(generate_bat(slug, win_toml_c_path, f"{win_unc_img_path}_cache", digests, concurrent))
+    # Same run from inside WSL: native paths, same cache stamps
+    with open(publish_root / toml_wsl_name, "w") as f:
+        f.write(generate_toml(str(wsl_img_path), TARGET_RES))
+    with open(publish_root / sh_name, "w", newline="\n") as f:
+        f.write(generate_sh(slug, str(wsl_app / 'TOML' / toml_wsl_name), f"{wsl_img_path}_cache", digests, concurrent))
+    os.chmod(publish_root / sh_name, 0o755)
     
     try:
-        win_toml_dest = Path(f"{utils.get_windows_unc_path(str(Path(utils.MUSUBI_PATHS['wsl_app']) / 'TOML'))}\\{toml_win_name}".replace("/", "\\"))
-        win_bat_dest = Path(f"{utils.get_windows_unc_path(str(Path(utils.MUSUBI_PATHS['wsl_app']) / 'BAT'))}\\{bat_win_name}".replace("/", "\\"))
-        shutil.copy(publish_root / toml_win_name, win_toml_dest)
-        shutil.copy(publish_root / bat_win_name, win_bat_dest)
+        # The UNC paths point back into WSL; copy through the local paths directly
+        transfer.transfer(publish_root, wsl_app / 'TOML', [toml_win_name, toml_wsl_name], mode="threads")
+        transfer.transfer(publish_root, wsl_app / 'BAT', [bat_win_name, sh_name], mode="threads")
+        os.chmod(wsl_app / 'BAT' / sh_name, 0o755)
     except: pass
 
     with open(publish_root / f"{trigger}.txt", "w") as f:
@@ -11,6 +11,8 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+import caption_engine
+import caption_cache
 
 # Force localhost for WSL
 OLLAMA_HOST = "http://127.0.0.1:11434"
@@ -72,86 +74,64 @@ def run(slug):
 
     print(f"📝 Captioning images in: {in_dir}...")
     
-    # Qwen Setup (4-bit Turbo)
-    if model == "qwen-vl":
-        try:
-            print("⏳ Loading Qwen2.5-VL...")
-            from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
-            
-            qwen_path = utils.MODEL_STORE_ROOT / "QWEN" / "Qwen2.5-VL-3B-Instruct"
-            
-            bnb_config = BitsAndBytesConfig(
-                load_in_4bit=True,
-                bnb_4bit_compute_dtype=torch.float16,
-                bnb_4bit_quant_type="nf4"
-            )
-            
-            qwen_model_obj = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-                str(qwen_path),
-                quantization_config=bnb_config,
-                device_map="auto",
-            )
-            qwen_processor = AutoProcessor.from_pretrained(str(qwen_path))
-        except Exception as e:
-            print(f"❌ Failed to load Qwen: {e}")
-            return
-    else:
-        # Fallback setup if needed
-        pass
-
     files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png'))])
     system_instruction = get_system_instruction(trigger, gender_str)
 
-    for i, f in enumerate(files, 1):
-        txt_path = in_dir / (os.path.splitext(f)[0] + ".txt")
-        if txt_path.exists(): 
-            continue
-        
-        print(f"   [{i}/{len(files)}] {f}...", end="", flush=True)
-        
-        try:
-            # Inference Logic
-            if model == "qwen-vl":
-                from qwen_vl_utils import process_vision_info
-                
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "image", "image": str(in_dir/f), "max_pixels": 768*768},
-                            {"type": "text", "text": system_instruction},
-                        ],
-                    }
-                ]
-                
-                text_input = qwen_processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-                image_inputs, video_inputs = process_vision_info(messages)
-                
-                inputs = qwen_processor(
-                    text=[text_input],
-                    images=image_inputs,
-                    videos=video_inputs,
-                    padding=True,
-                    return_tensors="pt",
-                ).to(qwen_model_obj.device)
+    # Cached captions are re-rendered with the current trigger; only images
+    # the cache has never seen go to the model.
+    cache = caption_cache.CaptionCache()
+    model_id = caption_engine.QWEN_PATH.name if model == "qwen-vl" else model
+    version = caption_cache.prompt_version(
+        get_system_instruction, gender_str, prefix_first=config.get('caption_prefix_cache', False)
+    )
+    txt_path_for = lambda img_path: img_path.with_suffix(".txt")
+    uncached = caption_cache.apply_cached(
+        cache, [in_dir / f for f in files], model_id, version, trigger, txt_path_for, clean_caption
+    )
 
-                generated_ids = qwen_model_obj.generate(**inputs, max_new_tokens=256)
-                
-                generated_ids_trimmed = [
-                    out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-                ]
-                caption = qwen_processor.batch_decode(
-                    generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-                )[0]
-                
-            else:
-                caption = f"{trigger}, a {gender_str}."
+    pending = [p for p in uncached if not txt_path_for(p).exists()]
+    legacy = len(uncached) - len(pending)
+    if legacy: print(f"   ⚠️ {legacy} existing .txt with no cached caption kept as is (not re-triggered); delete them to recaption.")
+    print(f"   {len(pending)}/{len(files)} images need captions.")
+    if not pending:
+        cache.close()
+        print("✅ Captioning complete.")
+        return
 
-            caption = clean_caption(caption, trigger)
-            with open(txt_path, "w", encoding="utf-8") as tf: tf.write(caption)
-            print(" Done.")
-            
+    def save_caption(img_path, caption):
+        caption = clean_caption(caption, trigger)
+        cache.write_text(txt_path_for(img_path), caption)
+
+    def save_model_caption(img_path, caption):
+        cache.put(img_path, model_id, version, caption, trigger)
+        save_caption(img_path, caption)
+
+    def report_error(img_path, e):
+        print(f"   {img_path.name} Error: {e}")
+
+    # Inference Logic (GPU 4-bit, or CPU int8 when there is no CUDA / caption_device = "cpu")
+    if model == "qwen-vl":
+        try:
+            print("⏳ Loading Qwen2.5-VL...")
+            caption_engine.caption_paths(
+                pending, system_instruction,
+                on_caption=save_model_caption, on_error=report_error,
+                device=config.get('caption_device', 'auto'),
+                replicas=config.get('caption_cpu_replicas', 1),
+                prefetch_depth=config.get('caption_prefetch_depth', caption_engine.PREFETCH_DEPTH),
+                token_budget=config.get('caption_token_budget', caption_engine.CAPTION_TOKEN_BUDGET),
+                batch_deadline=config.get('caption_batch_deadline', caption_engine.BATCH_DEADLINE),
+                reuse_prefix=config.get('caption_prefix_cache', False),
+            )
         except Exception as e:
-            print(f" Error: {e}")
+            print(f"❌ Qwen captioning failed: {e}")
+    else:
+        for img_path in pending:
+            save_caption(img_path, f"{trigger}, a {gender_str}.")
 
-    print("✅ Captioning complete.")
\ No newline at end of file
+    cache.close()
+    missing = [p for p in pending if not txt_path_for(p).exists()]
+    if missing:
+        print(f"⚠️ Captioning incomplete: {len(missing)}/{len(pending)} images have no caption. Re-run to retry them.")
+        return
+    print("✅ Captioning complete.")
@@ -2,7 +2,7 @@ import sys
 import os
 import shutil
 import utils
-from PIL import Image
+import pyramid
 
 RESOLUTIONS = [512, 256]
 
@@ -24,30 +24,23 @@ def run(project_slug):
     
     files = [f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
     
+    # 1. Resize Images (LANCZOS by default, no crop, no padding): each master
+    # decoded once for every resolution
     for res in RESOLUTIONS:
-        res_dir = down_root / str(res)
-        res_dir.mkdir(parents=True, exist_ok=True)
-        
-        count = 0
-        for f in files:
-            try:
-                # 1. Resize Image (LANCZOS, No Crop)
-                img = Image.open(in_dir / f)
-                img_res = img.resize((res, res), Image.Resampling.LANCZOS)
-                img_res.save(res_dir / f, quality=95)
-                
-                # 2. Copy Caption from Source
-                txt_name = os.path.splitext(f)[0] + ".txt"
-                src_txt = caption_dir / txt_name
-                
-                if src_txt.exists():
-                    shutil.copy(src_txt, res_dir / txt_name)
-                
-                count += 1
-            except Exception as e:
-                print(f"Error {f}: {e}")
-        
-        print(f"   ➜ {res}x{res}: {count} images")
+        (down_root / str(res)).mkdir(parents=True, exist_ok=True)
+    jobs = [(in_dir / f, {res: down_root / str(res) / f for res in RESOLUTIONS}) for f in files]
+    written = pyramid.publish(jobs, backend=pyramid.backend_for(utils.load_config(project_slug)), pad=False)
+
+    # 2. Copy Caption from Source
+    for src in written:
+        txt_name = src.stem + ".txt"
+        src_txt = caption_dir / txt_name
+        if src_txt.exists():
+            for res in RESOLUTIONS:
+                shutil.copy(src_txt, down_root / str(res) / txt_name)
+
+    for res in RESOLUTIONS:
+        print(f"   ➜ {res}x{res}: {len(written)} images")
 
     print("✅ Downsampling complete.")
 
@@ -1,7 +1,6 @@
 import sys
 import os
 import shutil
-from PIL import Image, ImageOps
 from pathlib import Path
 
 # --- BOOTSTRAP PATHS ---
@@ -9,19 +8,28 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 import utils
+import pyramid
+import publish_manifest
+import transfer
+import shards
+import buckets
+import train_planner
+import launchers
 
 # ================= CONFIGURATION =================
 TARGET_SIZE = 1024
 RESOLUTIONS = [512, 256]
 
 # --- DESTINATIONS ---
-DEST_APP_ROOT = Path("/mnt/c/AI/apps/musubi-tuner")
+DEST_APP_ROOT = transfer.WINDOWS_ROOT / "AI" / "apps" / "musubi-tuner"
 DEST_TOML_DIR = DEST_APP_ROOT / "files" / "tomls"
 DEST_DATASETS_ROOT = DEST_APP_ROOT / "files" / "datasets"
 
 # --- WINDOWS PATHS ---
 WIN_TOML_DIR_STR = r"C:\AI\apps\musubi-tuner\files\tomls"
 WIN_DATASETS_ROOT_STR = r"C:/AI/apps/musubi-tuner/files/datasets"
+# Same datasets seen from WSL, for config_files/templates/wan_train_template.sh
+WSL_DATASETS_ROOT_STR = "/mnt/c/AI/apps/musubi-tuner/files/datasets"
 
 # --- MODEL PATHS (LOCAL C:) ---
 PATH_T5 = r"C:\AI\models\clip\models_t5_umt5-xxl-enc-bf16.pth"
@@ -29,30 +37,38 @@ PATH_VAE = r"C:\AI\models\vae\WAN\wan_2.1_vae.pth"
 PATH_DIT_LOW = r"C:\AI\models\diffusion_models\Wan\Wan2.2\14B\Wan_2_2_T2V\fp16\wan2.2_t2v_low_noise_14B_fp16.safetensors"
 PATH_DIT_HIGH = r"C:\AI\models\diffusion_models\Wan\Wan2.2\14B\Wan_2_2_T2V\fp16\wan2.2_t2v_high_noise_14B_fp16.safetensors"
 
-def resize_pad_to_square(img_path, save_path, size):
-    try:
-        with Image.open(img_path) as img:
-            img = img.convert("RGB")
-            img = ImageOps.pad(img, (size, size), color=(0, 0, 0), centering=(0.5, 0.5))
-            img.save(save_path, quality=95)
-        return True
-    except: return False
+# Used when no train plan is passed (same values the templates always had)
+DEFAULT_TRAIN_SETTINGS = {
+    'batch_size': 1,
+    'num_repeats': 1,
+    'gradient_accumulation_steps': 1,
+    'max_train_epochs': 35,
+    'save_every_n_epochs': 5,
+    'max_data_loader_n_workers': 6,
+}
 
-def generate_toml(local_windows_path, resolution):
+def generate_toml(local_windows_path, resolution, settings=None):
+    s = {**DEFAULT_TRAIN_SETTINGS, **(settings or {})}
     safe_cache_dir = f"{local_windows_path}_cache"
     return f"""[general]
 caption_extension = ".txt"
-batch_size = 1
+batch_size = {s['batch_size']}
 enable_bucket = true
 bucket_no_upscale = false
 [[datasets]]
 image_directory = "{local_windows_path}"
 cache_directory = "{safe_cache_dir}"
-num_repeats = 1
+num_repeats = {s['num_repeats']}
 resolution = [{resolution},{resolution}]
 """
 
-def generate_bat(slug, toml_path_win_c):
+def generate_bat(slug, toml_path_win_c, settings=None, digests=None, concurrent_caches=False):
+    # digests: launchers.dataset_digests() of the published dataset; caches
+    # whose stamp matches are skipped when the .bat runs
+    s = {**DEFAULT_TRAIN_SETTINGS, **(settings or {})}
+    cache_dir = f"{WIN_DATASETS_ROOT_STR}/{slug}_cache".replace("/", "\\")
+    latents_cmd = 'python wan_cache_latents.py --dataset_config "%CFG%" --vae "%VAE%" --vae_dtype float16 --skip_existing'
+    te_cmd = 'python wan_cache_text_encoder_outputs.py --dataset_config "%CFG%" --t5 "%T5%" --batch_size 16 --fp8_t5 --skip_existing'
     return f"""@echo off
 SETLOCAL enabledelayedexpansion
 
@@ -78,12 +94,8 @@ call venv\\scripts\\activate
 if not exist "%OUT%" mkdir "%OUT%"
 if not exist "%LOGDIR%" mkdir "%LOGDIR%"
 
-echo Starting VAE Latent Cache...
-python wan_cache_latents.py --dataset_config "%CFG%" --vae "%VAE%" --vae_dtype float16
-
-echo Starting T5 Cache...
-python wan_cache_text_encoder_outputs.py --dataset_config "%CFG%" --t5 "%T5%" --batch_size 16 --fp8_t5
-
+{launchers.bat_dispatch(cache_dir, digests or launchers.no_digests())}
+{launchers.bat_run_caches(slug, concurrent_caches)}
 echo Starting Training...
 accelerate launch --num_processes 1 "wan_train_network.py" ^
   --dataset_config "%CFG%" ^
@@ -93,16 +105,17 @@ accelerate launch --num_processes 1 "wan_train_network.py" ^
   --fp8_base ^
   --fp8_scaled ^
   --fp8_t5 ^
-  --gradient_accumulation_steps 1 ^
+  --gradient_accumulation_steps {s['gradient_accumulation_steps']} ^
   --gradient_checkpointing ^
   --img_in_txt_in_offloading ^
   --learning_rate 0.00001 ^
   --logging_dir "%LOGDIR%" ^
   --lr_scheduler cosine ^
   --lr_warmup_steps 100 ^
-  --max_data_loader_n_workers 6 ^
-  --max_train_epochs 35 ^
-  --save_every_n_epochs 5 ^
+  --max_data_loader_n_workers {s['max_data_loader_n_workers']} ^
+  --persistent_data_loader_workers ^
+  --max_train_epochs {s['max_train_epochs']} ^
+  --save_every_n_epochs {s['save_every_n_epochs']} ^
   --seed 42 ^
   --t5 "%T5%" ^
   --task t2v-A14B ^
@@ -123,7 +136,8 @@ accelerate launch --num_processes 1 "wan_train_network.py" ^
 
 pause
 ENDLOCAL
-"""
+exit /b
+{launchers.bat_jobs(latents_cmd, te_cmd)}"""
 
 def run(slug):
     print(f"=== PUBLISHING {slug} ===")
@@ -141,43 +155,108 @@ def run(slug):
         print(f"❌ ERROR: No images found.")
         return
 
-    # 2. Local WSL Output
+    # 2. Local WSL Output (1024 masters) and 3. Windows Destination (256 dataset).
+    # Both are published incrementally: only changed files are rendered, then
+    # each directory is swapped in atomically.
     publish_root = path / utils.DIRS.get('publish', '06_publish')
-    if publish_root.exists(): shutil.rmtree(publish_root)
     publish_root.mkdir(parents=True, exist_ok=True)
+    res_dir_1024 = publish_root / "1024"
 
-    # 3. Windows Destination
     dest_dataset_dir = DEST_DATASETS_ROOT / slug
-    if dest_dataset_dir.exists(): shutil.rmtree(dest_dataset_dir)
-    dest_dataset_dir.mkdir(parents=True, exist_ok=True)
+    dest_dataset_dir.parent.mkdir(parents=True, exist_ok=True)
 
     print(f"📂 Processing images from: {in_dir}")
     print(f"🚀 Publishing to Windows: {dest_dataset_dir}")
 
     files = sorted([f for f in os.listdir(in_dir) if f.lower().endswith(('.jpg', '.png'))])
     
-    # 4. Generate Images & Copy
-    res_dir_1024 = publish_root / "1024"
-    res_dir_1024.mkdir(exist_ok=True)
-    
     TARGET_RES = 256
-    
-    for f in files:
-        if resize_pad_to_square(in_dir / f, res_dir_1024 / f, TARGET_SIZE):
+    backend = pyramid.backend_for(config)
+    bucketed = pyramid.bucketed_for(config)  # Aspect buckets instead of black-padded squares
+
+    def plan_for(dest, size):
+        items = {}
+        for f in files:
+            items[f] = ['image', *publish_manifest.file_signature(in_dir / f), size, backend, 'bucket' if bucketed else 'square']
             txt = os.path.splitext(f)[0] + ".txt"
-            if (in_dir / txt).exists():
-                shutil.copy(in_dir / txt, res_dir_1024 / txt)
-        
-        for res in RESOLUTIONS:
-            if res == 256:
-                try:
-                    res_dir = publish_root / str(res)
-                    res_dir.mkdir(exist_ok=True)
-                    img = Image.open(res_dir_1024 / f)
-                    img.resize((res, res), Image.Resampling.LANCZOS).save(dest_dataset_dir / f)
-                    if (in_dir / txt).exists():
-                        shutil.copy(in_dir / txt, dest_dataset_dir / txt)
-                except: pass
+            if (in_dir / txt).exists(): items[txt] = ['caption', publish_manifest.text_signature(in_dir / txt)]
+        return publish_manifest.PublishPlan(dest, items)
+
+    plans = {TARGET_SIZE: plan_for(res_dir_1024, TARGET_SIZE), TARGET_RES: plan_for(dest_dataset_dir, TARGET_RES)}
+    for size, plan in plans.items():
+        print(f"   {size}: {plan.summary()}")
+
+    # 4. Generate Images & Copy (one decode per image for every size that needs it).
+    # Windows destinations are rendered on local ext4, then moved in bulk.
+    todo = {size: set(plan.todo) for size, plan in plans.items()}
+    render_dirs = {
+        size: transfer.stage_dir(f"{slug}_{size}") if transfer.is_windows_path(plan.dest) else plan.staging
+        for size, plan in plans.items()
+    }
+    jobs = []
+    for f in files:
+        outputs = {size: render_dirs[size] / f for size in plans if f in todo[size]}
+        if outputs: jobs.append((in_dir / f, outputs))
+    rendered = pyramid.publish_detailed(jobs, backend=backend, bucketed=bucketed)
+
+    if bucketed:
+        # Bucket report covers every published image, not just this run's
+        previous = (utils.load_project_data(slug, buckets.REPORT_NAME) or {}).get('images', {})
+        images = {f: previous[f] for f in files if f in previous}
+        for src, info in rendered:
+            entry = images.setdefault(src.name, {'content': info['content'], 'outputs': {}})
+            entry['content'] = info['content']
+            entry['outputs'].update(info['outputs'])
+        buckets.print_report(buckets.save_report(slug, images))
+
+    # Captions only go next to an image that was rendered or is reused
+    image_for = {os.path.splitext(f)[0]: f for f in files}
+    committed = {}
+    for size, plan in plans.items():
+        reused = set(plan.reused)
+        for name in todo[size]:
+            if not name.endswith(".txt"): continue
+            image = image_for[os.path.splitext(name)[0]]
+            if image in reused or (render_dirs[size] / image).exists():
+                shutil.copy(in_dir / name, render_dirs[size] / name)
+        if render_dirs[size] != plan.staging:
+            written = [n for n in todo[size] if (render_dirs[size] / n).exists()]
+            transfer.transfer(render_dirs[size], plan.staging, written, mode=config.get('transfer_mode', 'auto'), label=f"{slug} {size}")
+        committed[size] = plan.commit(content_dir=render_dirs[size])
+        if render_dirs[size] != plan.staging: shutil.rmtree(render_dirs[size], ignore_errors=True)
+
+    if not committed[TARGET_RES]:
+        # Caches, digests and configs must keep describing the live dataset
+        print(f"❌ {dest_dataset_dir} was not updated. Caches and configs left as they were; re-run to publish.")
+        return
+    if not committed[TARGET_SIZE]:
+        print(f"⚠️ {res_dir_1024} was not updated; exports are built from the previous masters.")
+
+    # Drop Musubi cache entries for changed/removed content; the .bat caches
+    # with --skip_existing so only those get re-encoded
+    dataset_plan = plans[TARGET_RES]
+    if any(dataset_plan.changes.values()):
+        c = dataset_plan.changes
+        print(f"   Content changes: {len(c['added'])} added, {len(c['changed'])} changed, {len(c['removed'])} removed")
+        latents, te = publish_manifest.prune_musubi_cache(dest_dataset_dir, DEST_DATASETS_ROOT / f"{slug}_cache")
+        if latents or te: print(f"   🧹 Pruned {latents} latent / {te} text-encoder cache files")
+
+    # 4b. Optional packed exports (tar shards / uint8 packs), built from the masters
+    tar_shards, pack = config.get('export_shards', False), config.get('export_pack', False)
+    if tar_shards or pack:
+        export_sizes = config.get('export_sizes', [TARGET_RES])
+        export_dir = publish_root / "export"
+        digest = shards.source_digest(res_dir_1024, publish_manifest.MANIFEST_NAME)
+        if shards.is_current(export_dir, digest, export_sizes, tar_shards, pack):
+            print("   Packed export up to date.")
+        else:
+            print(f"   Packing {export_sizes} ({', '.join(shards.formats(tar_shards, pack))})...")
+            shards.export(res_dir_1024, export_dir, export_sizes, tar_shards, pack, digest, backend, bucketed)
+
+        items = {n: publish_manifest.file_signature(export_dir / n) for n in os.listdir(export_dir)}
+        export_plan = publish_manifest.PublishPlan(DEST_DATASETS_ROOT / f"{slug}_export", items)
+        transfer.transfer(export_dir, export_plan.staging, export_plan.todo, mode="threads", label=f"{slug} export")
+        export_plan.commit()
 
     # 5. Generate Configs
     win_dataset_path = f"{WIN_DATASETS_ROOT_STR}/{slug}"
@@ -186,17 +265,37 @@ def run(slug):
     toml_name = f"{slug}_{res_str}_win.toml"
     bat_name = f"train_{slug}_{res_str}.bat"
     
-    toml_content = generate_toml(win_dataset_path, TARGET_RES)
-    bat_content = generate_bat(slug, f"{WIN_TOML_DIR_STR}\\{toml_name}")
+    # Settings sized to this dataset and host (reasons in train_plan.json)
+    image_count = sum(1 for n in plans[TARGET_RES].items if not n.endswith(".txt"))
+    train_plan = train_planner.make_plan(slug, image_count, TARGET_RES, config.get('train'), bucketed)
+    train_planner.print_plan(train_plan)
+    settings = train_plan['settings']
 
-    # 6. Deploy
-    DEST_TOML_DIR.mkdir(parents=True, exist_ok=True)
-    
-    with open(DEST_TOML_DIR / toml_name, "w") as f: 
+    toml_content = generate_toml(win_dataset_path, TARGET_RES, settings)
+    # Cache stamps follow the dataset's content; the two cache jobs share the
+    # GPU only when the host has room for both models
+    digests = launchers.dataset_digests(dest_dataset_dir, [TARGET_RES, 'bucket' if bucketed else 'square'])
+    concurrent = launchers.run_concurrently(train_plan['host'])
+    print(f"   Cache steps: {'concurrent' if concurrent else 'sequential'}, skipped when already built for this content")
+    bat_content = generate_bat(slug, f"{WIN_TOML_DIR_STR}\\{toml_name}", settings, digests, concurrent)
+    env_name = f"{slug}_plan.env"
+    wsl_toml_name = f"{slug}.toml"  # The name wan_train_template.sh looks for
+
+    # 6. Deploy (written locally, then transferred)
+    with open(publish_root / toml_name, "w") as f: 
         f.write(toml_content)
     
-    with open(DEST_APP_ROOT / bat_name, "w") as f: 
+    with open(publish_root / bat_name, "w") as f: 
         f.write(bat_content)
 
+    with open(publish_root / env_name, "w") as f:
+        f.write(train_planner.to_env(settings))
+
+    with open(publish_root / wsl_toml_name, "w") as f:
+        f.write(generate_toml(f"{WSL_DATASETS_ROOT_STR}/{slug}", TARGET_RES, settings))
+
+    transfer.transfer(publish_root, DEST_TOML_DIR, [toml_name, env_name, wsl_toml_name], mode="threads")
+    transfer.transfer(publish_root, DEST_APP_ROOT, [bat_name], mode="threads")
+
     print(f"✅ Images copied to: {dest_dataset_dir}")
     print(f"✅ Configs deployed to Musubi app.")
\ No newline at end of file
@@ -21,57 +21,54 @@ def run(slug):
     if not files: return
 
     # Lazy import to apply env vars first
-    from deepface import DeepFace
-    from sklearn.cluster import DBSCAN
-    import numpy as np
+    import face_embeddings
+    import identity
+    import face_index
 
-    embeddings = []
-    valid_files = []
+    # 1. Get Embeddings (only new/changed images; the rest come from the project store)
+    store = face_embeddings.EmbeddingStore(path)
+    print(f"   Generating embeddings for {len(files)} images ({len(store)} stored)...")
+    updated = face_embeddings.update_store(store, in_dir, files)
 
-    print(f"   Generating embeddings for {len(files)} images...")
-    # 1. Get Embeddings
-    for f in files:
-        try:
-            # Get face embedding
-            embedding = DeepFace.represent(
-                img_path=str(in_dir / f), 
-                model_name="Facenet", 
-                enforce_detection=False
-            )[0]["embedding"]
-            embeddings.append(embedding)
-            valid_files.append(f)
-        except Exception: 
-            pass
+    valid_files = [f for f in files if store.is_current(f, face_embeddings.file_signature(in_dir / f))]
+    embeddings = store.get(valid_files)
     
-    if not embeddings: 
+    if not len(embeddings): 
         print("   ⚠️ No faces detected for QC. Copying all.")
         for f in files: shutil.copy(in_dir / f, out_dir / f)
         return
 
-    # 2. Cluster
-    print("   Clustering faces...")
-    # eps=10.0 is loose, fits Facenet euclidean distance
-    clustering = DBSCAN(eps=10.0, min_samples=3).fit(embeddings)
-    labels = clustering.labels_
-    
-    # Find majority cluster
-    from collections import Counter
-    counts = Counter(labels)
-    # Ignore noise (-1)
-    if -1 in counts: del counts[-1]
-    
-    if not counts:
+    # 2. Identity model: full re-cluster when due, otherwise O(1) per new image
+    print("   Scoring faces against identity model...")
+    model = identity.load_model(slug)
+    for f in updated: model.decisions.pop(f, None)  # Re-embedded: decide again
+    decisions = identity.classify(model, valid_files, embeddings, refit_fn=lambda: (valid_files, embeddings))
+    identity.save_model(slug, model)
+
+    if not model.ready:
         print("   ⚠️ No clear cluster found. Keeping all.")
-        majority_label = -1
     else:
-        majority_label = counts.most_common(1)[0][0]
-        
-    print(f"   Majority Cluster: {majority_label} (Size: {counts[majority_label]})")
+        print(f"   Identity threshold: {model.threshold:.3f} (median {model.median:.3f}, MAD {model.mad:.3f})")
+
+    # 3. Cross-project check: flag faces that match another project's identity
+    # better than ours, then publish the kept faces minus the flagged ones to
+    # the global index. Without a settled identity nothing is published.
+    centroid = model.centroid if model.ready else None
+    contaminated = face_index.find_contamination(slug, valid_files, embeddings, centroid)
+    utils.save_project_data(slug, face_index.REPORT_NAME, {'images': contaminated})
+    for f, hit in contaminated.items():
+        print(f"   ⚠️ {f} looks like '{hit['project']}' ({hit['project_similarity']:.2f} vs own {hit['own_similarity']:.2f})")
+    own = [f for f in valid_files if model.ready and decisions[f][0] and f not in contaminated]
+    if own:
+        face_index.update_project(slug, own, store.get(own), model.centroid)
+    else:
+        face_index.drop_project(slug)
 
-    # 3. Filter
+    # 4. Filter
     kept = 0
-    for f, label in zip(valid_files, labels):
-        if label == majority_label or majority_label == -1:
+    for f in valid_files:
+        if f in contaminated: continue
+        if not model.ready or decisions[f][0]:
             shutil.copy(in_dir / f, out_dir / f)
             # Copy caption
             txt = os.path.splitext(f)[0] + ".txt"
@@ -0,0 +1,75 @@
+import sys
+import os
+import math
+from collections import Counter
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Aspect-ratio buckets for publishing without black padding. For a resolution
+# R the pixel budget is R*R; buckets are every WxH on the BUCKET_STEP grid
+# that fits the budget, between MIN_ASPECT and MAX_ASPECT. Each image goes to
+# the bucket with the closest aspect ratio and is resized to cover it with a
+# minimal centre crop, so the VAE and trainer only ever see real content.
+
+BUCKET_STEP = 16        # Musubi's resolution step for Wan/Hunyuan buckets
+MIN_ASPECT = 0.5
+MAX_ASPECT = 2.0
+REPORT_NAME = "buckets.json"
+
+_cache = {}
+
+def make_buckets(resolution, step=BUCKET_STEP, min_aspect=MIN_ASPECT, max_aspect=MAX_ASPECT):
+    # -> [(w, h)] largest area for each width, sorted by aspect ratio
+    key = (resolution, step, min_aspect, max_aspect)
+    if key in _cache: return _cache[key]
+    budget = resolution * resolution
+    buckets = []
+    for w in range(step, resolution * 4 + 1, step):
+        h = (budget // w) // step * step
+        if h < step: break
+        if min_aspect <= w / h <= max_aspect: buckets.append((w, h))
+    buckets.sort(key=lambda b: b[0] / b[1])
+    _cache[key] = buckets
+    return buckets
+
+def nearest_bucket(width, height, resolution):
+    target = math.log(width / height)
+    return min(make_buckets(resolution), key=lambda b: abs(math.log(b[0] / b[1]) - target))
+
+def cover_crop_box(width, height, bucket):
+    # Scale that covers the bucket, and the centred crop box in scaled pixels
+    bw, bh = bucket
+    scale = max(bw / width, bh / height)
+    sw, sh = max(bw, round(width * scale)), max(bh, round(height * scale))
+    left, top = (sw - bw) // 2, (sh - bh) // 2
+    return (sw, sh), (left, top, left + bw, top + bh)
+
+def summarize(images):
+    # images: {name: {'content': [w, h], 'outputs': {size: [w, h]}}}
+    report = {}
+    for size in sorted({s for entry in images.values() for s in entry['outputs']}, key=int):
+        counts = Counter(
+            f"{w}x{h}" for entry in images.values() for s, (w, h) in entry['outputs'].items() if s == size
+        )
+        report[size] = dict(sorted(counts.items(), key=lambda kv: -kv[1]))
+
+    # Share of a padded square that would have been black
+    padded = [1 - (w * h) / max(w, h) ** 2 for w, h in (e['content'] for e in images.values())]
+    saved = sum(padded) / len(padded) if padded else 0.0
+    return {'distribution': report, 'padding_avoided': round(saved, 4)}
+
+def save_report(slug, images):
+    report = {**summarize(images), 'images': images}
+    utils.save_project_data(slug, REPORT_NAME, report)
+    return report
+
+def print_report(report):
+    for size, counts in report['distribution'].items():
+        top = ", ".join(f"{k}: {v}" for k, v in list(counts.items())[:6])
+        more = f" (+{len(counts) - 6} more)" if len(counts) > 6 else ""
+        print(f"   Buckets @{size}: {top}{more}")
+    print(f"   Padding avoided: {report['padding_avoided'] * 100:.1f}% of square pixels")
@@ -0,0 +1,150 @@
+import sys
+import os
+import re
+import time
+import sqlite3
+import hashlib
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Captions keyed by (image content hash, model, prompt version) and stored
+# with the trigger replaced by a placeholder. The real trigger is substituted
+# at write time, so changing a project's trigger or reusing photos for another
+# LoRA never needs the caption model again.
+#
+# The digest of every .txt the pipeline writes is kept too: a cached caption
+# only replaces a .txt whose text is still what we last wrote there, so hand
+# edits survive re-runs.
+
+CACHE_DB = utils.CACHE_ROOT / "captions.sqlite"
+TRIGGER_PLACEHOLDER = "{trigger}"
+HASH_CHUNK = 1 << 20
+QUERY_CHUNK = 500  # Keys per "IN (...)" query, well under SQLite's variable limit
+
+def prompt_version(instruction_fn, *args, prefix_first=False):
+    # The instruction rendered with the placeholder: any wording change is a new
+    # version, and so is the instruction-before-image layout of the prefix cache
+    text = instruction_fn(TRIGGER_PLACEHOLDER, *args)
+    if prefix_first: text += "\n[prefix_first]"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def to_template(caption, trigger):
+    # Lookarounds rather than \b: triggers like "ohwx_" or "<sks>" start or end
+    # with a non-word character, where \b never matches
+    return re.sub(rf"(?i)(?<!\w){re.escape(trigger)}(?!\w)", TRIGGER_PLACEHOLDER, caption)
+
+def render(template, trigger):
+    return template.replace(TRIGGER_PLACEHOLDER, trigger)
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class CaptionCache:
+    def __init__(self, db_path=CACHE_DB):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS captions (
+                content_hash TEXT, model TEXT, prompt_version TEXT,
+                template TEXT, created REAL,
+                PRIMARY KEY (content_hash, model, prompt_version)
+            );
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS written (
+                txt_path TEXT PRIMARY KEY, digest TEXT
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def select_in(self, query, keys, params=()):
+        # Rows of `query` (ending in "IN ({})") for every key, a chunk at a
+        # time, so only the rows asked for are read from the shared tables
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[i:i + QUERY_CHUNK]
+            yield from self.conn.execute(query.format(",".join("?" * len(chunk))), (*params, *chunk))
+
+    def hash_files(self, paths):
+        # Re-hash only files whose size/mtime changed since we last saw them
+        rows = self.select_in(
+            "SELECT path, size, mtime_ns, content_hash FROM file_hashes WHERE path IN ({})", map(str, paths)
+        )
+        known = {row[0]: row[1:] for row in rows}
+        hashes, updates = {}, []
+        for p in paths:
+            st = os.stat(p)
+            entry = known.get(str(p))
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                hashes[p] = entry[2]
+                continue
+            hashes[p] = file_sha256(p)
+            updates.append((str(p), st.st_size, st.st_mtime_ns, hashes[p]))
+        if updates:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", updates)
+        return hashes
+
+    def get_many(self, paths, model, version):
+        # -> {path: template} for every cached path
+        hashes = self.hash_files(paths)
+        rows = dict(self.select_in(
+            "SELECT content_hash, template FROM captions"
+            " WHERE model = ? AND prompt_version = ? AND content_hash IN ({})",
+            hashes.values(), (model, version),
+        ))
+        return {p: rows[h] for p, h in hashes.items() if h in rows}
+
+    def put(self, path, model, version, caption, trigger):
+        content_hash = self.hash_files([path])[path]
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?)",
+                (content_hash, model, version, to_template(caption, trigger), time.time()),
+            )
+
+    def written_digests(self, txt_paths):
+        return dict(self.select_in("SELECT txt_path, digest FROM written WHERE txt_path IN ({})", map(str, txt_paths)))
+
+    def write_text(self, txt_path, text):
+        # Every pipeline write goes through here so apply_cached can tell our
+        # own .txt files from hand-edited ones
+        with open(txt_path, "w", encoding="utf-8") as tf: tf.write(text)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO written VALUES (?, ?)", (str(txt_path), text_digest(text)))
+
+def text_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def apply_cached(cache, img_paths, model, version, trigger, txt_path_fn, clean_fn):
+    # Writes every cached caption with the current trigger and returns the
+    # paths that still need the caption model. An existing .txt is replaced
+    # only if it still holds the text we last wrote; edited ones are kept.
+    templates = cache.get_many(img_paths, model, version)
+    written = cache.written_digests(txt_path_fn(p) for p in templates)
+    rewritten = kept = 0
+    for img_path, template in templates.items():
+        caption = clean_fn(render(template, trigger), trigger)
+        txt_path = txt_path_fn(img_path)
+        if txt_path.exists():
+            current = txt_path.read_text(encoding="utf-8")
+            if current == caption: continue
+            if written.get(str(txt_path)) != text_digest(current):
+                kept += 1
+                continue
+        cache.write_text(txt_path, caption)
+        rewritten += 1
+    if templates:
+        print(f"   Caption cache: {len(templates)} hits, {rewritten} .txt rewritten, {kept} edited .txt kept.")
+    return [p for p in img_paths if p not in templates]
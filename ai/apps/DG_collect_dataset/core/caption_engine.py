@@ -0,0 +1,551 @@
+import sys
+import os
+import re
+import copy
+import hashlib
+import time
+import inspect
+import multiprocessing as mp
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, chain
+import torch
+from PIL import Image
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Shared Qwen2.5-VL caption engine used by 03_caption and 05_caption.
+# Model and processor are duck-typed so the batching logic can be driven on
+# CPU by a tiny stand-in (anything with generate/apply_chat_template/etc).
+
+QWEN_PATH = utils.MODEL_STORE_ROOT / "QWEN" / "Qwen2.5-VL-3B-Instruct"
+
+MAX_PIXELS = 768 * 768
+MAX_NEW_TOKENS = 256
+PATCH_PIXELS = 28 * 28       # One visual token per 28x28 patch after merge
+PROMPT_TOKENS = 320          # Chat template + instruction, rounded up
+MAX_BATCH = 16
+MEMORY_HEADROOM = 0.7        # Fraction of free memory the batch may claim
+ACTIVATION_OVERHEAD = 3.0    # KV cache -> total working set (vision tower, logits)
+PREFETCH_DEPTH = 2           # Batches decoded/tokenized ahead of the one generating
+PREFETCH_WORKERS = 2
+TEXT_ENCODER_TOKEN_BUDGET = 512  # umT5 context Musubi keeps; the rest is truncated
+T5_TOKENS_PER_QWEN_TOKEN = 1.3   # umT5 sentencepiece splits English finer than Qwen BPE
+# Default caption budget in umT5 tokens. It has to stay under
+# MAX_NEW_TOKENS * T5_TOKENS_PER_QWEN_TOKEN (~333) or the token cap, not the
+# budget, decides caption length; a larger budget only matters with a larger
+# max_new_tokens. Never above TEXT_ENCODER_TOKEN_BUDGET.
+CAPTION_TOKEN_BUDGET = 320
+SOFT_BUDGET_FRACTION = 0.8       # Past this, stop at the next sentence end
+BATCH_DEADLINE = 60.0            # Wall-clock seconds per generate call, i.e. per batch (max_time)
+SENTENCE_ENDS = ('.', '!', '?')
+CPU_CACHE_DIR = utils.CACHE_ROOT / "qwen_cpu"  # Quantized CPU state_dicts, one per weights/library versions
+
+def resolve_device(device="auto"):
+    if device == "auto": return "cuda" if torch.cuda.is_available() else "cpu"
+    return device
+
+def load_qwen(qwen_path=QWEN_PATH, device="auto", threads=None):
+    if resolve_device(device) == "cpu":
+        return load_qwen_cpu(qwen_path, threads)
+
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
+
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_quant_type="nf4"
+    )
+    model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
+        str(qwen_path),
+        quantization_config=bnb_config,
+        device_map="auto",
+    )
+    processor = AutoProcessor.from_pretrained(str(qwen_path))
+    # Batched generation needs every prompt to end at the same column
+    processor.tokenizer.padding_side = "left"
+    print("✅ Qwen-VL Loaded (4-bit Turbo).")
+    return model, processor
+
+def cpu_cache_path(qwen_path):
+    # The quantized state_dict is only valid for the weights, config and
+    # library versions it was made from; any change gets a new file.
+    import transformers
+    h = hashlib.sha1()
+    for name in ("config.json", "model.safetensors.index.json"):
+        f = qwen_path / name
+        if f.exists(): h.update(f.read_bytes())
+    for f in sorted(qwen_path.glob("*.safetensors")):
+        st = f.stat()
+        h.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    tag = f"torch{torch.__version__}-transformers{transformers.__version__}-{h.hexdigest()[:12]}"
+    return CPU_CACHE_DIR / f"{qwen_path.name}-int8-{tag}.pt"
+
+def swap_dynamic_linears(model):
+    # Same module swap quantize_dynamic does, minus the observer pass, so a
+    # meta-initialised model can take a saved int8 state_dict
+    import torch.ao.nn.quantized.dynamic as nnqd
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if type(child) is torch.nn.Linear:
+                setattr(module, name, nnqd.Linear(child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8))
+
+def save_cpu_model(model, cache_path):
+    state = model.state_dict()
+    # Non-persistent buffers (rotary inv_freq) are not in the state_dict
+    buffers = {n: b for n, b in model.named_buffers() if n not in state}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    torch.save({'state_dict': state, 'buffers': buffers}, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+def load_cpu_model(qwen_path, cache_path):
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoConfig, GenerationConfig
+
+    saved = torch.load(cache_path, weights_only=True)
+    config = AutoConfig.from_pretrained(str(qwen_path))
+    with torch.device("meta"):
+        model = Qwen2_5_VLForConditionalGeneration._from_config(config, torch_dtype=torch.float32)
+    swap_dynamic_linears(model)
+    model.load_state_dict(saved['state_dict'], assign=True)
+    for name, buf in saved['buffers'].items():
+        owner, _, attr = name.rpartition('.')
+        model.get_submodule(owner).register_buffer(attr, buf, persistent=False)
+    missing = [n for n, t in chain(model.named_parameters(), model.named_buffers()) if t.is_meta]
+    if missing: raise RuntimeError(f"{len(missing)} tensors not in the cache (e.g. {missing[0]})")
+    model.generation_config = GenerationConfig.from_pretrained(str(qwen_path))
+    return model
+
+def load_qwen_cpu(qwen_path=QWEN_PATH, threads=None):
+    # bitsandbytes 4-bit is CUDA only. On CPU we use int8 dynamic quantization
+    # of every nn.Linear and keep the quantized state_dict, so later loads
+    # skip both the fp32 load and the quantization pass.
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
+
+    torch.set_num_threads(threads or utils.physical_cores())
+    cache_path = cpu_cache_path(qwen_path)
+
+    model = None
+    if cache_path.exists():
+        try:
+            model = load_cpu_model(qwen_path, cache_path)
+        except Exception as e:
+            print(f"   ⚠️ Quantized cache unusable ({e}), rebuilding.")
+    if model is None:
+        print(f"   Quantizing {qwen_path.name} to int8 (first run only)...")
+        model = Qwen2_5_VLForConditionalGeneration.from_pretrained(str(qwen_path), torch_dtype=torch.float32)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        save_cpu_model(model, cache_path)
+    model.eval()
+
+    processor = AutoProcessor.from_pretrained(str(qwen_path))
+    processor.tokenizer.padding_side = "left"
+    print(f"✅ Qwen-VL Loaded (CPU int8, {torch.get_num_threads()} threads).")
+    return model, processor
+
+def build_messages(img_path, instruction, prefix_first=False):
+    # Image then instruction, the order the captions were tuned with. With
+    # prefix_first the instruction goes first instead: everything up to
+    # <|vision_start|> is then identical for every image in a project and its
+    # KV state can be reused (PrefixCache).
+    image = {"type": "image", "image": str(img_path), "max_pixels": MAX_PIXELS}
+    text = {"type": "text", "text": instruction}
+    return [
+        {
+            "role": "user",
+            "content": [text, image] if prefix_first else [image, text],
+        }
+    ]
+
+def estimate_tokens(size, max_pixels=MAX_PIXELS, max_new_tokens=MAX_NEW_TOKENS):
+    w, h = size
+    return int(min(w * h, max_pixels) / PATCH_PIXELS) + PROMPT_TOKENS + max_new_tokens
+
+def free_memory_bytes(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.cuda.mem_get_info(device)[0]
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+def kv_bytes_per_token(model):
+    cfg = getattr(model.config, 'text_config', model.config)
+    heads = cfg.num_attention_heads
+    kv_heads = getattr(cfg, 'num_key_value_heads', None) or heads
+    head_dim = cfg.hidden_size // heads
+    elem = torch.finfo(getattr(model, 'dtype', torch.float16)).bits // 8
+    return 2 * cfg.num_hidden_layers * kv_heads * head_dim * elem
+
+def auto_batch_size(model, tokens_per_image, max_batch=MAX_BATCH):
+    per_image = kv_bytes_per_token(model) * tokens_per_image * ACTIVATION_OVERHEAD
+    budget = free_memory_bytes(model.device) * MEMORY_HEADROOM
+    return max(1, min(max_batch, int(budget // per_image)))
+
+def image_size(img_path):
+    # Header read only, no decode
+    try:
+        with Image.open(img_path) as img: return img.size
+    except Exception:
+        return (0, 0)
+
+def group_by_size(img_paths, batch_size, sizes=None):
+    # Neighbouring token counts share a batch so padding stays small
+    sizes = sizes or {p: image_size(p) for p in img_paths}
+    ordered = sorted(img_paths, key=lambda p: (estimate_tokens(sizes[p]), str(p)))
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+# KV state for the shared prompt prefix (system turn + instruction). Computed
+# on the first batch of a project and copied into every later generate call,
+# so only image and answer tokens are prefilled per image.
+# Opt-in (config 'caption_prefix_cache'): it drives Qwen2.5-VL internals
+# (get_rope_index, rope_deltas, Cache.batch_repeat_interleave) that change
+# between transformers releases, and a mismatch gives wrong captions rather
+# than an error. Check captions against the plain path before enabling it.
+class PrefixCache:
+    def __init__(self, model):
+        self.model = model
+        self.ids = None
+        self.cache = None
+        self.enabled = hasattr(getattr(model, 'model', None), 'get_rope_index')
+
+    def prefix_len(self, input_ids):
+        vision_start = self.model.config.vision_start_token_id
+        hits = (input_ids[0] == vision_start).nonzero()
+        return int(hits[0]) if len(hits) else 0
+
+    def ensure(self, prefix_ids):
+        if self.ids is not None and torch.equal(self.ids, prefix_ids): return
+        with torch.inference_mode():
+            out = self.model(input_ids=prefix_ids.to(self.model.device), use_cache=True)
+        self.ids = prefix_ids.clone()
+        self.cache = out.past_key_values
+        print(f"   Cached prompt prefix ({prefix_ids.shape[1]} tokens).")
+
+    def expand(self, batch_size):
+        cache = copy.deepcopy(self.cache)
+        if batch_size > 1: cache.batch_repeat_interleave(batch_size)
+        return cache
+
+def sentence_end_ids(tokenizer):
+    # Token ids whose text ends a sentence, computed once per tokenizer. Only
+    # vocab entries containing . ! or ? are decoded (a few thousand of ~151k).
+    ids = getattr(tokenizer, '_dg_sentence_end_ids', None)
+    if ids is None:
+        candidates = [(tok, i) for tok, i in tokenizer.get_vocab().items() if any(c in tok for c in SENTENCE_ENDS)]
+        ids = [i for tok, i in candidates
+               if tokenizer.convert_tokens_to_string([tok]).rstrip().endswith(SENTENCE_ENDS)]
+        ids = torch.tensor(sorted(ids))
+        tokenizer._dg_sentence_end_ids = ids
+    return ids
+
+# Per-row stop once the caption is past the soft budget and the last token
+# closes a sentence. Rows that never reach a sentence end stop at max_new_tokens.
+class SentenceBudgetStop:
+    def __init__(self, prompt_len, soft_tokens, end_ids):
+        self.prompt_len = prompt_len
+        self.soft_tokens = soft_tokens
+        self.end_ids = end_ids
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if input_ids.shape[1] - self.prompt_len < self.soft_tokens:
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        return torch.isin(input_ids[:, -1], self.end_ids.to(input_ids.device))
+
+# Caption length and time limits. The token budget is in text-encoder (umT5)
+# tokens and is converted to Qwen tokens for generation.
+class CaptionLimits:
+    def __init__(self, max_new_tokens=MAX_NEW_TOKENS, token_budget=CAPTION_TOKEN_BUDGET, batch_deadline=BATCH_DEADLINE):
+        self.token_budget = min(token_budget, TEXT_ENCODER_TOKEN_BUDGET)
+        self.batch_deadline = batch_deadline
+        self.max_new_tokens = min(max_new_tokens, int(self.token_budget / T5_TOKENS_PER_QWEN_TOKEN))
+
+    def generate_kwargs(self, processor, prompt_len):
+        from transformers import StoppingCriteriaList
+        soft = int(self.max_new_tokens * SOFT_BUDGET_FRACTION)
+        stop = SentenceBudgetStop(prompt_len, soft, sentence_end_ids(processor.tokenizer))
+        kwargs = {'max_new_tokens': self.max_new_tokens, 'stopping_criteria': StoppingCriteriaList([stop])}
+        # max_time bounds the whole generate call, however many rows the batch has
+        if self.batch_deadline: kwargs['max_time'] = self.batch_deadline
+        return kwargs
+
+    def count_tokens(self, processor, text):
+        return int(len(processor.tokenizer(text, add_special_tokens=False).input_ids) * T5_TOKENS_PER_QWEN_TOKEN)
+
+    def trim(self, processor, text):
+        # Drop a dangling half-sentence (token cap or batch deadline hit), then whole
+        # trailing sentences until the caption fits the text-encoder budget.
+        text = text.strip()
+        sentences = re.split(r'(?<=[.!?])\s+', text)
+        if len(sentences) > 1 and not sentences[-1].endswith(SENTENCE_ENDS): sentences.pop()
+        while len(sentences) > 1 and self.count_tokens(processor, " ".join(sentences)) > self.token_budget:
+            sentences.pop()
+        return " ".join(sentences)
+
+def rope_index_kwargs(model, input_ids):
+    # transformers 5 takes the token modality (text 0, image 1) explicitly
+    if 'mm_token_type_ids' not in inspect.signature(model.model.get_rope_index).parameters: return {}
+    return {'mm_token_type_ids': (input_ids == model.config.image_token_id).int()}
+
+def generate_with_prefix(model, processor, prefix_cache, encodings, limits):
+    # encodings: one un-padded processor output per image. Rows are laid out as
+    # [prefix | pad | suffix] so the shared prefix sits at the same columns.
+    prefix_len = prefix_cache.prefix_len(encodings[0].input_ids)
+    if prefix_len == 0: return None
+    prefix_ids = encodings[0].input_ids[:, :prefix_len]
+    if any(not torch.equal(e.input_ids[:, :prefix_len], prefix_ids) for e in encodings): return None
+    prefix_cache.ensure(prefix_ids)
+
+    suffixes = [e.input_ids[0, prefix_len:] for e in encodings]
+    width = max(len(x) for x in suffixes)
+    pad_id = processor.tokenizer.pad_token_id
+    input_ids = torch.full((len(encodings), prefix_len + width), pad_id, dtype=prefix_ids.dtype)
+    attention_mask = torch.zeros_like(input_ids)
+    for row, suffix in enumerate(suffixes):
+        input_ids[row, :prefix_len] = prefix_ids[0]
+        input_ids[row, -len(suffix):] = suffix
+        attention_mask[row, :prefix_len] = 1
+        attention_mask[row, -len(suffix):] = 1
+
+    device = model.device
+    input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+    pixel_values = torch.cat([e.pixel_values for e in encodings]).to(device)
+    image_grid_thw = torch.cat([e.image_grid_thw for e in encodings]).to(device)
+    total = input_ids.shape[1]
+
+    with torch.inference_mode():
+        # Multimodal RoPE positions over the full rows; pads are masked out
+        position_ids, rope_deltas = model.model.get_rope_index(
+            input_ids, image_grid_thw=image_grid_thw, attention_mask=attention_mask,
+            **rope_index_kwargs(model, input_ids)
+        )
+        cache = prefix_cache.expand(len(encodings))
+        # Prefill everything after the prefix except the last token (cache
+        # positions follow from the cache length) ...
+        model(
+            input_ids=input_ids[:, prefix_len:-1],
+            attention_mask=attention_mask[:, :-1],
+            pixel_values=pixel_values,
+            image_grid_thw=image_grid_thw,
+            position_ids=position_ids[:, :, prefix_len:-1],
+            past_key_values=cache,
+            use_cache=True,
+        )
+        # ... and let generate pick up from the cache with the known rope offsets
+        model.model.rope_deltas = rope_deltas
+        generated_ids = model.generate(
+            input_ids=input_ids, attention_mask=attention_mask, past_key_values=cache,
+            **limits.generate_kwargs(processor, total),
+        )
+    return generated_ids[:, total:]
+
+def prepare_batch(processor, img_paths, instruction, vision_fn=None, prefix_first=False):
+    # CPU side of a batch: image decode/resize and tokenization, one encoding
+    # per image. Safe to run on a worker thread while the model generates.
+    if vision_fn is None:
+        from qwen_vl_utils import process_vision_info as vision_fn
+
+    pin = torch.cuda.is_available()
+    encodings = []
+    for img_path in img_paths:
+        conv = build_messages(img_path, instruction, prefix_first)
+        text = processor.apply_chat_template(conv, tokenize=False, add_generation_prompt=True)
+        image_inputs, video_inputs = vision_fn([conv])
+        enc = processor(text=[text], images=image_inputs, videos=video_inputs, return_tensors="pt")
+        if pin: enc['pixel_values'] = enc['pixel_values'].pin_memory()
+        encodings.append(enc)
+    return encodings
+
+def pad_left(encodings, pad_id, device):
+    width = max(e.input_ids.shape[1] for e in encodings)
+    input_ids = torch.full((len(encodings), width), pad_id, dtype=encodings[0].input_ids.dtype)
+    attention_mask = torch.zeros_like(input_ids)
+    for row, e in enumerate(encodings):
+        n = e.input_ids.shape[1]
+        input_ids[row, -n:] = e.input_ids[0]
+        attention_mask[row, -n:] = 1
+    inputs = {
+        'input_ids': input_ids.to(device),
+        'attention_mask': attention_mask.to(device),
+        'pixel_values': torch.cat([e.pixel_values for e in encodings]).to(device, non_blocking=True),
+        'image_grid_thw': torch.cat([e.image_grid_thw for e in encodings]).to(device),
+    }
+    # transformers 5 processors also return token modalities, needed for mRoPE
+    if 'mm_token_type_ids' in encodings[0]:
+        types = torch.zeros_like(input_ids, dtype=encodings[0]['mm_token_type_ids'].dtype)
+        for row, e in enumerate(encodings):
+            types[row, -e.input_ids.shape[1]:] = e['mm_token_type_ids'][0]
+        inputs['mm_token_type_ids'] = types.to(device)
+    return inputs
+
+def generate_batch(model, processor, encodings, limits=None, prefix_cache=None):
+    limits = limits or CaptionLimits()
+    generated_ids_trimmed = None
+    if prefix_cache is not None and prefix_cache.enabled:
+        try:
+            generated_ids_trimmed = generate_with_prefix(model, processor, prefix_cache, encodings, limits)
+        except torch.cuda.OutOfMemoryError:
+            raise
+        except Exception as e:
+            # Model/transformers build without the hooks we need: plain path from here on
+            print(f"   ⚠️ Prefix cache disabled: {e}")
+            prefix_cache.enabled = False
+
+    if generated_ids_trimmed is None:
+        inputs = pad_left(encodings, processor.tokenizer.pad_token_id, model.device)
+        prompt_len = inputs['input_ids'].shape[1]
+        with torch.inference_mode():
+            generated_ids = model.generate(**inputs, **limits.generate_kwargs(processor, prompt_len))
+        # Left padding: every prompt ends at the same column
+        generated_ids_trimmed = generated_ids[:, inputs['input_ids'].shape[1]:]
+
+    captions = processor.batch_decode(
+        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
+    )
+    return [limits.trim(processor, c) for c in captions]
+
+def caption_batch(model, processor, img_paths, instruction, limits=None, vision_fn=None, prefix_cache=None):
+    encodings = prepare_batch(processor, img_paths, instruction, vision_fn, prefix_first=prefix_cache is not None)
+    return generate_batch(model, processor, encodings, limits, prefix_cache)
+
+def prefetch(fn, batches, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS):
+    # Yields (batch, future) in order with at most `depth` batches prepared
+    # ahead, which bounds the decoded pixels held in memory.
+    batches = iter(batches)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque((b, pool.submit(fn, b)) for b in islice(batches, max(1, depth)))
+        while pending:
+            batch, future = pending.popleft()
+            nxt = next(batches, None)
+            if nxt is not None: pending.append((nxt, pool.submit(fn, nxt)))
+            yield batch, future
+
+def caption_files(model, processor, img_paths, instruction, on_caption, on_error=None,
+                  batch_size=None, max_new_tokens=MAX_NEW_TOKENS, vision_fn=None, reuse_prefix=False,
+                  prefetch_depth=PREFETCH_DEPTH, token_budget=CAPTION_TOKEN_BUDGET,
+                  batch_deadline=BATCH_DEADLINE):
+    img_paths = list(img_paths)
+    if not img_paths: return
+
+    limits = CaptionLimits(max_new_tokens, token_budget, batch_deadline)
+    max_new_tokens = limits.max_new_tokens
+
+    sizes = {p: image_size(p) for p in img_paths}
+    if batch_size is None:
+        worst = max(estimate_tokens(s, max_new_tokens=max_new_tokens) for s in sizes.values())
+        batch_size = auto_batch_size(model, worst)
+    print(f"   Batch size: {batch_size}, prefetch depth: {prefetch_depth}")
+
+    prefix_cache = PrefixCache(model) if reuse_prefix else None
+    batches = group_by_size(img_paths, batch_size, sizes)
+    prepare = lambda batch: prepare_batch(processor, batch, instruction, vision_fn, prefix_first=reuse_prefix)
+    done = 0
+
+    for batch, future in prefetch(prepare, batches, depth=prefetch_depth):
+        try:
+            encodings = future.result()
+        except Exception as e:
+            for p in batch:
+                if on_error: on_error(p, e)
+            done += len(batch)
+            continue
+
+        # Already-prepared batches are split in place if the GPU runs out
+        work = [(batch[i:i + batch_size], encodings[i:i + batch_size]) for i in range(0, len(batch), batch_size)]
+        while work:
+            paths, encs = work.pop(0)
+            start_t = time.time()
+            try:
+                captions = generate_batch(model, processor, encs, limits, prefix_cache)
+            except torch.cuda.OutOfMemoryError:
+                if len(paths) == 1: raise
+                torch.cuda.empty_cache()
+                batch_size = len(paths) // 2
+                print(f"   ⚠️ OOM at batch {len(paths)}, retrying as {batch_size}")
+                work = [(paths[:batch_size], encs[:batch_size]), (paths[batch_size:], encs[batch_size:])] + work
+                continue
+            except Exception as e:
+                for p in paths:
+                    if on_error: on_error(p, e)
+                done += len(paths)
+                continue
+
+            elapsed = time.time() - start_t
+            for p, caption in zip(paths, captions):
+                on_caption(p, caption)
+            done += len(paths)
+            print(f"   [{done}/{len(img_paths)}] {len(paths)} captions in {elapsed:.1f}s ({elapsed / len(paths):.2f}s/img)")
+
+def _replica_worker(shard, instruction, cpus, kwargs, results):
+    # One CPU replica: pinned to its own slice of cores with a matching thread count
+    if hasattr(os, 'sched_setaffinity'): os.sched_setaffinity(0, cpus)
+    model, processor = load_qwen(device="cpu", threads=len(cpus))
+    caption_files(
+        model, processor, shard, instruction,
+        on_caption=lambda p, c: results.put((str(p), c, None)),
+        on_error=lambda p, e: results.put((str(p), None, repr(e))),
+        **kwargs,
+    )
+    results.put(None)
+
+def caption_files_replicated(img_paths, instruction, on_caption, on_error=None, replicas=2, **kwargs):
+    # Splits the work across `replicas` CPU processes, each with its own model
+    # copy and core slice. Captions stream back to this process, which keeps
+    # all writes (and the caption cache) on one thread.
+    img_paths = list(img_paths)
+    if hasattr(os, 'sched_getaffinity'): cpus = sorted(os.sched_getaffinity(0))
+    else: cpus = list(range(os.cpu_count() or 1))
+    replicas = max(1, min(replicas, len(img_paths), len(cpus)))
+    per = len(cpus) // replicas
+    by_name = {str(p): p for p in img_paths}
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    workers = []
+    for i in range(replicas):
+        shard = img_paths[i::replicas]
+        proc = ctx.Process(target=_replica_worker, args=(shard, instruction, cpus[i * per:(i + 1) * per], kwargs, results))
+        proc.start()
+        workers.append(proc)
+    print(f"   {replicas} CPU replicas x {per} cores")
+
+    finished = 0
+    returned = set()
+    while finished < replicas:
+        try:
+            item = results.get(timeout=5)
+        except queue.Empty:
+            if not any(proc.is_alive() for proc in workers): break  # A replica crashed
+            continue
+        if item is None:
+            finished += 1
+            continue
+        name, caption, error = item
+        returned.add(name)
+        if caption is not None: on_caption(by_name[name], caption)
+        elif on_error: on_error(by_name[name], RuntimeError(error))
+    for proc in workers: proc.join()
+
+    # Images a dead replica never reported back still get their error callback
+    for i, proc in enumerate(workers):
+        lost = [p for p in img_paths[i::replicas] if str(p) not in returned]
+        if not lost: continue
+        print(f"   ❌ CPU replica {i} exited with code {proc.exitcode}, {len(lost)} images not captioned")
+        for p in lost:
+            if on_error: on_error(p, RuntimeError(f"CPU replica exited with code {proc.exitcode}"))
+
+def caption_paths(img_paths, instruction, on_caption, on_error=None, device="auto", replicas=1, **kwargs):
+    # Entry point for the pipeline steps: picks GPU 4-bit, CPU int8, or
+    # several CPU int8 replicas, then runs caption_files.
+    device = resolve_device(device)
+    if device == "cpu" and replicas > 1:
+        return caption_files_replicated(img_paths, instruction, on_caption, on_error, replicas, **kwargs)
+    model, processor = load_qwen(device=device)
+    caption_files(model, processor, img_paths, instruction, on_caption, on_error, **kwargs)
@@ -0,0 +1,121 @@
+import sys
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Facenet embeddings persisted per project as a float32 memory-mapped array
+# (<name>.f32) plus a JSON row index (<name>.json). Rows are append-only; a
+# re-embedded image gets a new row and the index points at the latest one.
+
+MODEL_NAME = "Facenet"
+EMBED_DIM = 128
+BATCH_SIZE = 32
+EMBED_WORKERS = min(8, os.cpu_count() or 4)
+STORE_NAME = "embeddings"
+
+def file_signature(img_path):
+    st = os.stat(img_path)
+    return [st.st_size, st.st_mtime_ns]
+
+class EmbeddingStore:
+    def __init__(self, root, name=STORE_NAME, dim=EMBED_DIM):
+        self.data_path = root / f"{name}.f32"
+        self.index_path = root / f"{name}.json"
+        index = {'model': MODEL_NAME, 'dim': dim, 'rows': []}
+        if self.index_path.exists():
+            with open(self.index_path, 'r') as f: index = json.load(f)
+        self.dim = index['dim']
+        self.rows = index['rows']  # [id, size, mtime_ns] per row
+        self.latest = {row[0]: i for i, row in enumerate(self.rows)}
+
+    def __len__(self):
+        return len(self.latest)
+
+    def is_current(self, item_id, signature):
+        i = self.latest.get(item_id)
+        return i is not None and self.rows[i][1:] == signature
+
+    def ids(self):
+        return list(self.latest)
+
+    def array(self):
+        if not self.rows: return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(len(self.rows), self.dim))
+
+    def get(self, ids):
+        return np.asarray(self.array()[[self.latest[i] for i in ids]])
+
+    def append(self, ids, signatures, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.data_path, 'ab') as f:
+            # Drop rows a crashed run wrote without updating the index
+            f.truncate(len(self.rows) * self.dim * 4)
+            f.write(vectors.tobytes())
+        for item_id, sig in zip(ids, signatures):
+            self.latest[item_id] = len(self.rows)
+            self.rows.append([item_id] + sig)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': MODEL_NAME, 'dim': self.dim, 'rows': self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+
+def load_model():
+    from deepface import DeepFace
+    return DeepFace.build_model(MODEL_NAME)
+
+def prepare_face(img_path, target_size):
+    # Same steps as DeepFace.represent: detect, take the largest face (whole
+    # image if none), BGR order, resize with padding, 'base' normalization.
+    from deepface.modules import detection, preprocessing
+    faces = detection.extract_faces(
+        img_path=str(img_path), detector_backend='opencv', enforce_detection=False, align=True
+    )
+    face = max(faces, key=lambda x: x['facial_area']['w'] * x['facial_area']['h'])['face']
+    img = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(target_size[1], target_size[0]))
+    return preprocessing.normalize_input(img=img, normalization="base")[0]
+
+def embed_paths(img_paths, model=None, batch_size=BATCH_SIZE, workers=EMBED_WORKERS):
+    # Yields (paths, vectors) per batch. Detection/resizing runs on a thread
+    # pool; the network sees one stacked batch per call.
+    model = model or load_model()
+    target_size = getattr(model, 'input_shape', (160, 160))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(img_paths), batch_size):
+            chunk = img_paths[start:start + batch_size]
+
+            def safe_prepare(p):
+                try: return prepare_face(p, target_size)
+                except Exception: return None
+
+            faces = list(pool.map(safe_prepare, chunk))
+            ok = [p for p, face in zip(chunk, faces) if face is not None]
+            if not ok: continue
+            batch = np.stack([face for face in faces if face is not None])
+            vectors = np.asarray(model.model.predict_on_batch(batch), dtype=np.float32)
+            yield ok, vectors
+
+def update_store(store, in_dir, files, **kwargs):
+    # Embeds only files that are new or changed since they were stored;
+    # returns the names that got a new row.
+    signatures = {f: file_signature(in_dir / f) for f in files}
+    todo = [f for f in files if not store.is_current(f, signatures[f])]
+    if not todo: return []
+
+    start_t = time.time()
+    embedded = []
+    for paths, vectors in embed_paths([in_dir / f for f in todo], **kwargs):
+        names = [p.name for p in paths]
+        store.append(names, [signatures[n] for n in names], vectors)
+        embedded += names
+        print(f"    Embedded {len(embedded)}/{len(todo)}...", end='\r')
+    print(f"\n    {len(embedded)} new embeddings in {time.time() - start_t:.1f}s.")
+    return embedded
@@ -0,0 +1,173 @@
+import sys
+import os
+import json
+import time
+import numpy as np
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import face_embeddings
+import identity
+
+# Global face index across every project under outputs/. Each project is one
+# shard: its kept faces as unit-normalized float16 (<slug>.npy, memory-mapped)
+# plus ids (<slug>.json). centroids.json holds one identity centroid per
+# project and acts as the coarse level: a query is scored against all
+# centroids first, then exact blocked search runs only inside the project it
+# landed closest to. Query cost grows with the number of projects, not the
+# number of vectors.
+
+INDEX_DIR = utils.CACHE_ROOT / "face_index"
+CENTROIDS_NAME = "centroids.json"
+REPORT_NAME = "face_contamination.json"
+
+SEARCH_BLOCK = 65536     # Rows per matmul block during exact search
+MARGIN = 0.02            # Foreign centroid must beat own by this much (cosine)
+
+def shard_paths(slug, index_dir=INDEX_DIR):
+    return index_dir / f"{slug}.npy", index_dir / f"{slug}.json"
+
+def load_centroids(index_dir=INDEX_DIR):
+    path = index_dir / CENTROIDS_NAME
+    if not path.exists(): return {}
+    with open(path, 'r') as f: return json.load(f)
+
+def save_centroids(centroids, index_dir=INDEX_DIR):
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_dir / (CENTROIDS_NAME + ".tmp")
+    with open(tmp_path, 'w') as f: json.dump(centroids, f)
+    os.replace(tmp_path, index_dir / CENTROIDS_NAME)
+
+def load_shard(slug, index_dir=INDEX_DIR):
+    # -> (ids, float16 memmap) or (None, None)
+    vec_path, ids_path = shard_paths(slug, index_dir)
+    if not vec_path.exists() or not ids_path.exists(): return None, None
+    with open(ids_path, 'r') as f: ids = json.load(f)
+    return ids, np.load(vec_path, mmap_mode='r')
+
+def update_project(slug, ids, vectors, centroid=None, index_dir=INDEX_DIR):
+    # Replaces the project's shard. `centroid` is the identity model's if it
+    # has one, otherwise the normalized mean of the vectors.
+    index_dir.mkdir(parents=True, exist_ok=True)
+    unit = identity.normalize(vectors)
+    if centroid is None: centroid = identity.normalize(unit.mean(axis=0))
+
+    vec_path, ids_path = shard_paths(slug, index_dir)
+    tmp_path = vec_path.with_suffix(".tmp")
+    with open(tmp_path, 'wb') as f: np.save(f, unit.astype(np.float16))
+    os.replace(tmp_path, vec_path)
+    tmp_path = ids_path.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f: json.dump(list(ids), f)
+    os.replace(tmp_path, ids_path)
+
+    centroids = load_centroids(index_dir)
+    centroids[slug] = [round(float(x), 6) for x in centroid]
+    save_centroids(centroids, index_dir)
+
+def drop_project(slug, index_dir=INDEX_DIR):
+    centroids = load_centroids(index_dir)
+    if centroids.pop(slug, None) is not None: save_centroids(centroids, index_dir)
+    for p in shard_paths(slug, index_dir):
+        if p.exists(): p.unlink()
+
+def blocked_top1(queries, base, block=SEARCH_BLOCK):
+    # Exact nearest neighbour by cosine for unit vectors: (best_sim, best_row)
+    best_sim = np.full(len(queries), -np.inf, dtype=np.float32)
+    best_row = np.full(len(queries), -1, dtype=np.int64)
+    q = queries.astype(np.float32).T
+    for start in range(0, len(base), block):
+        sims = np.asarray(base[start:start + block], dtype=np.float32) @ q
+        rows = sims.argmax(axis=0)
+        top = sims[rows, np.arange(sims.shape[1])]
+        better = top > best_sim
+        best_sim[better] = top[better]
+        best_row[better] = rows[better] + start
+    return best_sim, best_row
+
+def find_contamination(slug, ids, vectors, centroid=None, index_dir=INDEX_DIR, margin=MARGIN):
+    # Flags ids whose embedding sits closer to another project's centroid than
+    # to this project's. Each flag names the nearest foreign image as evidence.
+    # `centroid` overrides the published one (a project checked before it is
+    # (re)published).
+    centroids = load_centroids(index_dir)
+    if centroid is not None: centroids[slug] = centroid
+    if slug not in centroids or len(centroids) < 2: return {}
+
+    slugs = list(centroids)
+    matrix = identity.normalize(np.array([centroids[s] for s in slugs]))
+    own = slugs.index(slug)
+
+    unit = identity.normalize(vectors)
+    sims = unit @ matrix.T
+    own_sim = sims[:, own].copy()
+    sims[:, own] = -np.inf
+    other = sims.argmax(axis=1)
+    other_sim = sims[np.arange(len(unit)), other]
+    suspect = np.flatnonzero(other_sim > own_sim + margin)
+    if not suspect.size: return {}
+
+    # Exact search only inside the foreign shards the suspects landed in
+    flags = {}
+    for target in sorted(set(other[suspect].tolist())):
+        rows = suspect[other[suspect] == target]
+        shard_ids, base = load_shard(slugs[target], index_dir)
+        if base is None or not len(base): continue
+        near_sim, near_row = blocked_top1(unit[rows], base)
+        for r, sim, n in zip(rows, near_sim, near_row):
+            flags[ids[r]] = {
+                'project': slugs[target],
+                'own_similarity': round(float(own_sim[r]), 4),
+                'project_similarity': round(float(other_sim[r]), 4),
+                'nearest': shard_ids[n],
+                'nearest_similarity': round(float(sim), 4),
+            }
+    return flags
+
+def index_project(slug, index_dir=INDEX_DIR):
+    # Indexes a project from its stored embeddings, keeping only images its
+    # identity model accepted and QC did not flag as another project's face.
+    # Projects without a settled identity are left out. Returns the number
+    # of vectors indexed.
+    path = utils.get_project_path(slug)
+    if not (path / f"{face_embeddings.STORE_NAME}.json").exists(): return 0
+    store = face_embeddings.EmbeddingStore(path)
+    model = identity.load_model(slug)
+    if not model.ready: return 0
+    contaminated = (utils.load_project_data(slug, REPORT_NAME) or {}).get('images', {})
+    ids = [i for i in store.ids() if model.decisions.get(i, [True])[0] and i not in contaminated]
+    if not ids: return 0
+    update_project(slug, ids, store.get(ids), model.centroid, index_dir)
+    return len(ids)
+
+def rebuild(index_dir=INDEX_DIR):
+    # Re-index every project under outputs/ and drop shards of deleted ones
+    start_t = time.time()
+    slugs = sorted(p.name for p in utils.LINUX_PROJECTS_ROOT.iterdir() if p.is_dir()) if utils.LINUX_PROJECTS_ROOT.exists() else []
+    total = 0
+    for slug in slugs:
+        n = index_project(slug, index_dir)
+        if not n: drop_project(slug, index_dir)
+        total += n
+
+    centroids = load_centroids(index_dir)
+    for slug in [s for s in centroids if s not in slugs]:
+        drop_project(slug, index_dir)
+    centroids = load_centroids(index_dir)
+    print(f"✅ Face index: {total} faces from {len(centroids)} projects ({time.time() - start_t:.1f}s).")
+    return centroids
+
+def scan_all(index_dir=INDEX_DIR):
+    for slug in rebuild(index_dir):
+        path = utils.get_project_path(slug)
+        store = face_embeddings.EmbeddingStore(path)
+        ids = store.ids()
+        flags = find_contamination(slug, ids, store.get(ids), index_dir=index_dir)
+        utils.save_project_data(slug, REPORT_NAME, {'images': flags})
+        if flags:
+            print(f"   ⚠️ {slug}: {len(flags)} faces match another project better")
+
+if __name__ == "__main__":
+    scan_all()
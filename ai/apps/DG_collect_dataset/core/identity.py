@@ -0,0 +1,130 @@
+import sys
+import os
+from collections import Counter
+import numpy as np
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Incremental identity model for the target person. A full DBSCAN pass picks
+# the majority cluster; from it we keep a robust centroid (median of unit
+# vectors) and spread (median/MAD of cosine distances). Each new image is then
+# accepted or rejected in O(1), with a full re-cluster every RECLUSTER_EVERY
+# arrivals to absorb drift.
+
+MODEL_NAME = "identity_model.json"
+
+DBSCAN_EPS = 10.0        # Raw Facenet euclidean, same as the original 06_qc clustering
+DBSCAN_MIN_SAMPLES = 3
+ACCEPT_K = 3.0           # Accept if distance <= median + K * MAD
+MIN_SPREAD = 0.02        # Floor on MAD so tight bootstrap clusters don't reject everything
+CENTROID_RATE = 0.02     # EMA step for centroid/spread updates on accepted images
+RECLUSTER_EVERY = 250
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def majority_cluster(vectors, eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES):
+    # Boolean mask of the largest DBSCAN cluster (all False if only noise)
+    from sklearn.cluster import DBSCAN
+    labels = DBSCAN(eps=eps, min_samples=min_samples).fit(vectors).labels_
+    counts = Counter(labels)
+    counts.pop(-1, None)
+    if not counts: return np.zeros(len(labels), dtype=bool)
+    return labels == counts.most_common(1)[0][0]
+
+class IdentityModel:
+    def __init__(self, centroid=None, median=0.0, mad=0.0, since_fit=0, decisions=None):
+        self.centroid = None if centroid is None else normalize(centroid)
+        self.median = median
+        self.mad = mad
+        self.since_fit = since_fit
+        self.decisions = decisions or {}  # id -> [accepted, distance]
+
+    @property
+    def ready(self):
+        return self.centroid is not None
+
+    @property
+    def due_refit(self):
+        return not self.ready or self.since_fit >= RECLUSTER_EVERY
+
+    @property
+    def threshold(self):
+        return self.threshold_at(ACCEPT_K)
+
+    def threshold_at(self, k):
+        return self.median + k * max(self.mad, MIN_SPREAD)
+
+    def distances(self, vectors):
+        return 1.0 - normalize(vectors) @ self.centroid
+
+    def fit(self, ids, vectors, members=None):
+        # Full re-cluster. `members` overrides DBSCAN (e.g. reference photos).
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if members is None: members = majority_cluster(vectors)
+        if not members.any():
+            self.centroid = None
+            return members
+        unit = normalize(vectors[members])
+        self.centroid = normalize(np.median(unit, axis=0))
+        dist = 1.0 - unit @ self.centroid
+        self.median = float(np.median(dist))
+        self.mad = float(np.median(np.abs(dist - self.median)))
+        self.since_fit = 0
+
+        all_dist = self.distances(vectors)
+        self.decisions = {i: [bool(d <= self.threshold), round(float(d), 4)] for i, d in zip(ids, all_dist)}
+        return members
+
+    def observe(self, item_id, vector):
+        # O(1): one dot product plus an EMA update on acceptance
+        unit = normalize(vector)
+        dist = float(1.0 - unit @ self.centroid)
+        accepted = dist <= self.threshold
+        if accepted:
+            self.centroid = normalize((1 - CENTROID_RATE) * self.centroid + CENTROID_RATE * unit)
+            self.median += CENTROID_RATE * (dist - self.median)
+            self.mad += CENTROID_RATE * (abs(dist - self.median) - self.mad)
+        self.since_fit += 1
+        self.decisions[item_id] = [accepted, round(dist, 4)]
+        return accepted, dist
+
+    def to_dict(self):
+        return {
+            'centroid': None if self.centroid is None else self.centroid.tolist(),
+            'median': self.median,
+            'mad': self.mad,
+            'since_fit': self.since_fit,
+            'decisions': self.decisions,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('centroid'), data.get('median', 0.0), data.get('mad', 0.0),
+                   data.get('since_fit', 0), data.get('decisions'))
+
+def load_model(slug, name=MODEL_NAME):
+    data = utils.load_project_data(slug, name)
+    return IdentityModel.from_dict(data) if data else IdentityModel()
+
+def save_model(slug, model, name=MODEL_NAME):
+    utils.save_project_data(slug, name, model.to_dict())
+
+def classify(model, ids, vectors, refit_fn=None):
+    # Streams ids through the model; anything already decided is kept.
+    # refit_fn() -> (all_ids, all_vectors) is called when a re-cluster is due.
+    refit_failed = False
+    for item_id, vector in zip(ids, vectors):
+        if item_id in model.decisions: continue
+        if model.due_refit and refit_fn is not None and not refit_failed:
+            model.fit(*refit_fn())
+            refit_failed = not model.ready
+            if item_id in model.decisions: continue
+        if model.ready: model.observe(item_id, vector)
+    return model.decisions
@@ -0,0 +1,175 @@
+import sys
+import os
+import json
+import uuid
+import hashlib
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import publish_manifest
+
+# Cache steps for the generated training launchers (.bat / .sh).
+#
+# VAE latents depend only on the images (and bucket resolution), text-encoder
+# outputs only on the captions, so the two jobs are independent: when the
+# host has the VRAM/RAM for both models at once they run side by side, each
+# logging to its own file, and training starts once both have finished.
+#
+# Each job writes a stamp into the cache directory after a successful run
+# holding the digest of the dataset content it encoded (taken from the
+# publish manifest's content hashes). A launcher whose stamp matches the
+# dataset it was generated for skips that job entirely, without loading the
+# model. Launchers are regenerated on every publish, so a new image or
+# caption changes the digest and the job runs again (with --skip_existing,
+# after 06_publish pruned the stale cache files).
+
+STEPS = ("latents", "te")
+CONCURRENT_MIN_VRAM_GB = 16     # VAE + fp8 T5 resident together, with headroom
+CONCURRENT_MIN_RAM_GB = 32      # T5 is loaded as bf16 on the host first
+CACHE_POLL_SECONDS = 5
+CACHE_MAX_WAIT_POLLS = 1440     # 2 hours, then give up on a job that died without its .done file
+
+def dataset_digests(dataset_dir, extra=""):
+    # -> {'latents': sha1 of image content, 'te': sha1 of caption content}.
+    # extra goes into the latent digest (resolution, bucket mode, backend...).
+    hashes = publish_manifest.load_manifest_data(dataset_dir).get('hashes')
+    if hashes is None:
+        # No manifest (legacy publish): hash the files directly
+        hashes = {
+            f: publish_manifest.content_hash(dataset_dir / f) for f in sorted(os.listdir(dataset_dir))
+            if f.lower().endswith(publish_manifest.IMAGE_EXTS + ('.txt',))
+        } if dataset_dir.exists() else {}
+
+    def digest(names, salt=""):
+        payload = json.dumps([salt, [[n, hashes[n]] for n in sorted(names)]])
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    return {
+        'latents': digest([n for n in hashes if n.lower().endswith(publish_manifest.IMAGE_EXTS)], str(extra)),
+        'te': digest([n for n in hashes if n.lower().endswith('.txt')]),
+    }
+
+def no_digests():
+    # Fresh random digests: no stamp matches, every cache job runs
+    return {step: uuid.uuid4().hex for step in STEPS}
+
+def run_concurrently(host):
+    # host: train_planner.probe_host() dict. Unknown VRAM stays sequential.
+    if not host: return False
+    ram_ok = not host.get('ram_total_gb') or host['ram_total_gb'] >= CONCURRENT_MIN_RAM_GB
+    return host.get('vram_gb', 0) >= CONCURRENT_MIN_VRAM_GB and ram_ok
+
+# ================= WINDOWS (.bat) =================
+# Concurrent jobs re-enter the launcher itself ("train_x.bat cache_latents")
+# through start /b and report their exit code in a .done file that the main
+# script polls for, since cmd has no way to wait on a background process.
+
+def bat_dispatch(cache_dir, digests):
+    # Goes after the environment setup (cd, venv) and before the caches
+    return f"""REM --- CACHE JOBS ---
+set "CACHE={cache_dir}"
+set "LATENTS_DIGEST={digests['latents']}"
+set "TE_DIGEST={digests['te']}"
+if not exist "%CACHE%" mkdir "%CACHE%"
+if "%~1"=="cache_latents" goto :cache_latents
+if "%~1"=="cache_te" goto :cache_te
+"""
+
+def bat_run_caches(slug, concurrent):
+    if not concurrent:
+        return """call :cache_latents
+if errorlevel 1 goto :cache_failed
+call :cache_te
+if errorlevel 1 goto :cache_failed
+"""
+    return f"""echo Starting VAE Latent and T5 caches concurrently (logs in %LOGDIR%)...
+del /q "%CACHE%\\.latents.done" "%CACHE%\\.te.done" 2>nul
+start "" /b cmd /c ""%~f0" cache_latents > "%LOGDIR%\\{slug}_cache_latents.log" 2>&1"
+start "" /b cmd /c ""%~f0" cache_te > "%LOGDIR%\\{slug}_cache_te.log" 2>&1"
+set /a WAITED=0
+:wait_caches
+timeout /t {CACHE_POLL_SECONDS} /nobreak >nul
+set /a WAITED+=1
+if %WAITED% geq {CACHE_MAX_WAIT_POLLS} (
+    echo Cache jobs did not finish within {CACHE_POLL_SECONDS * CACHE_MAX_WAIT_POLLS // 60} minutes.
+    goto :cache_failed
+)
+if not exist "%CACHE%\\.latents.done" goto :wait_caches
+if not exist "%CACHE%\\.te.done" goto :wait_caches
+set /p LATENTS_RC=<"%CACHE%\\.latents.done"
+set /p TE_RC=<"%CACHE%\\.te.done"
+if not "%LATENTS_RC%%TE_RC%"=="00" goto :cache_failed
+"""
+
+def _bat_job(step, title, command):
+    var = step.upper()
+    return f""":cache_{step}
+set "STAMP="
+if exist "%CACHE%\\.{step}.stamp" set /p STAMP=<"%CACHE%\\.{step}.stamp"
+if "%STAMP%"=="%{var}_DIGEST%" (
+    echo {title} is up to date, skipping.
+    > "%CACHE%\\.{step}.done" echo 0
+    exit /b 0
+)
+echo Starting {title}...
+{command}
+set "RC=%ERRORLEVEL%"
+if "%RC%"=="0" (> "%CACHE%\\.{step}.stamp" echo %{var}_DIGEST%)
+> "%CACHE%\\.{step}.done" echo %RC%
+exit /b %RC%
+"""
+
+def bat_jobs(latents_cmd, te_cmd):
+    # Goes after the main flow's final exit /b
+    return f"""
+REM --- CACHE JOB BODIES ---
+{_bat_job("latents", "VAE Latent Cache", latents_cmd)}
+{_bat_job("te", "T5 Cache", te_cmd)}
+:cache_failed
+echo Cache step failed, not starting training. See the output above or %LOGDIR%.
+pause
+exit /b 1
+"""
+
+# ================= LINUX (.sh) =================
+
+def sh_caches(cache_dir, digests, latents_cmd, te_cmd, slug, concurrent):
+    def job(step, title, command):
+        return f"""cache_{step}() {{
+  if [ "$(cat "${{CACHE}}/.{step}.stamp" 2>/dev/null)" = "${{{step.upper()}_DIGEST}}" ]; then
+    echo "{title} is up to date, skipping."
+    return 0
+  fi
+  echo "Starting {title}..."
+  {command} || return 1
+  echo "${{{step.upper()}_DIGEST}}" > "${{CACHE}}/.{step}.stamp"
+}}
+"""
+    if concurrent:
+        run = f"""echo "Starting VAE Latent and T5 caches concurrently (logs in ${{LOGDIR}})..."
+mkdir -p "${{LOGDIR}}"
+cache_latents > "${{LOGDIR}}/{slug}_cache_latents.log" 2>&1 &
+LATENTS_PID=$!
+cache_te > "${{LOGDIR}}/{slug}_cache_te.log" 2>&1 &
+TE_PID=$!
+wait ${{LATENTS_PID}}; LATENTS_RC=$?
+wait ${{TE_PID}}; TE_RC=$?
+if [ ${{LATENTS_RC}} -ne 0 ] || [ ${{TE_RC}} -ne 0 ]; then
+  echo "Cache step failed, not starting training. See ${{LOGDIR}}."
+  exit 1
+fi
+"""
+    else:
+        run = """cache_latents || { echo "Cache step failed, not starting training."; exit 1; }
+cache_te || { echo "Cache step failed, not starting training."; exit 1; }
+"""
+    return f"""# --- CACHE JOBS ---
+CACHE="{cache_dir}"
+LATENTS_DIGEST="{digests['latents']}"
+TE_DIGEST="{digests['te']}"
+mkdir -p "${{CACHE}}"
+{job("latents", "VAE Latent Cache", latents_cmd)}
+{job("te", "T5 Cache", te_cmd)}
+{run}"""
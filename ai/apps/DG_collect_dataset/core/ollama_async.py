@@ -0,0 +1,103 @@
+import sys
+import os
+import io
+import time
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+import aiohttp  # Installed by utils.bootstrap()
+
+# Async client for the Ollama /api/chat endpoint. Several requests stay in
+# flight over one keep-alive connection pool while a thread pool downscales
+# and encodes the next images. Point `host` at any server that speaks the
+# same JSON (e.g. a local stub) to exercise it without Ollama.
+
+OLLAMA_HOST = "http://127.0.0.1:11434"
+OLLAMA_MODEL = "moondream"
+MAX_IN_FLIGHT = 4
+REQUEST_TIMEOUT = 60    # Seconds per request
+MAX_RETRIES = 2         # Extra attempts after a timeout, dropped connection or 5xx
+RETRY_BACKOFF = 1.0     # Seconds, doubled on each retry
+MAX_SIDE = 768          # Moondream works at far lower res; no point shipping the full file
+JPEG_QUALITY = 90
+
+def encode_image(img_path, max_side=MAX_SIDE):
+    with Image.open(img_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=JPEG_QUALITY)
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+async def chat(session, host, model, prompt, b64, timeout=REQUEST_TIMEOUT):
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt, "images": [b64]}],
+        "stream": False,
+    }
+    async with session.post(f"{host}/api/chat", json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+    return data["message"]["content"]
+
+def is_transient(e):
+    # Worth retrying: server busy/restarting or the request timed out. A 4xx
+    # (bad model name, bad payload) would fail the same way again.
+    if isinstance(e, aiohttp.ClientResponseError): return e.status >= 500
+    return isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+async def chat_with_retry(session, host, model, prompt, b64, timeout=REQUEST_TIMEOUT,
+                          retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            return await chat(session, host, model, prompt, b64, timeout)
+        except Exception as e:
+            if attempt == retries or not is_transient(e): raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+async def caption_files_async(img_paths, prompt, on_caption, on_error=None, host=OLLAMA_HOST,
+                              model=OLLAMA_MODEL, max_in_flight=MAX_IN_FLIGHT,
+                              timeout=REQUEST_TIMEOUT, max_side=MAX_SIDE, encode_workers=None,
+                              retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    loop = asyncio.get_running_loop()
+    # Encoded payloads wait at most one "wave" ahead of the requests
+    slots = asyncio.Semaphore(max_in_flight * 2)
+    in_flight = asyncio.Semaphore(max_in_flight)
+    stats = {'done': 0, 'failed': 0}
+    total = len(img_paths)
+
+    async def worker(session, pool, img_path):
+        async with slots:
+            try:
+                b64 = await loop.run_in_executor(pool, encode_image, str(img_path), max_side)
+                async with in_flight:
+                    caption = await chat_with_retry(session, host, model, prompt, b64, timeout, retries, backoff)
+                on_caption(img_path, caption.replace('\n', ' ').strip())
+                stats['done'] += 1
+            except Exception as e:
+                stats['failed'] += 1
+                if on_error: on_error(img_path, e)
+            print(f"   [{stats['done'] + stats['failed']}/{total}] {img_path.name}", flush=True)
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=30)
+    with ThreadPoolExecutor(max_workers=encode_workers or min(8, os.cpu_count() or 4)) as pool:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(*(worker(session, pool, p) for p in img_paths))
+    return stats
+
+def caption_files(img_paths, prompt, on_caption, on_error=None, **kwargs):
+    img_paths = list(img_paths)
+    if not img_paths: return {'done': 0, 'failed': 0}
+    start_t = time.time()
+    stats = asyncio.run(caption_files_async(img_paths, prompt, on_caption, on_error, **kwargs))
+    elapsed = time.time() - start_t
+    print(f"   {stats['done']} captioned, {stats['failed']} failed in {elapsed:.1f}s ({elapsed / len(img_paths):.2f}s/img)")
+    return stats
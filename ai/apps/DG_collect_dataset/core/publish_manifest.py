@@ -0,0 +1,227 @@
+import sys
+import os
+import re
+import json
+import errno
+import shutil
+import ctypes
+import hashlib
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Incremental, atomic publishing of a flat output directory.
+#
+# Every published directory carries a manifest of {output name: signature},
+# where the signature describes everything the output was built from. A new
+# publish builds <dest>.staging: outputs whose signature is unchanged are
+# hard-linked (copied if the filesystem refuses) from the live directory,
+# only added/changed outputs are rendered, removed ones are simply absent.
+# The staging dir is then exchanged with the live one in a single
+# renameat2(RENAME_EXCHANGE), so readers see either the old dataset or the
+# new one, never a half-written mix. Filesystems without it (drvfs, Windows)
+# fall back to two renames through <dest>.old; a crash between them leaves
+# only <dest>.old, which the next publish moves back. The manifest lives
+# inside the directory it describes and is swapped with it.
+#
+# The manifest also records a content hash per output and the added/changed/
+# removed names (by content) relative to the previous publish, so downstream
+# latent / text-encoder caches can be pruned and refreshed incrementally.
+
+MANIFEST_NAME = "_publish_manifest.json"
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Musubi cache file names: <stem>_<WWWW>x<HHHH>_wan.safetensors (VAE latents)
+# and <stem>_wan_te.safetensors (text encoder outputs)
+LATENT_CACHE_RE = re.compile(r"^(?P<stem>.+)_\d{4}x\d{4}_wan\.safetensors$")
+TE_CACHE_RE = re.compile(r"^(?P<stem>.+)_wan_te\.safetensors$")
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def text_signature(path):
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+def content_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest_data(dest):
+    path = dest / MANIFEST_NAME
+    if not path.exists(): return {}
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except Exception: return {}
+
+def load_manifest(dest):
+    return load_manifest_data(dest).get('files', {})
+
+def link_or_copy(src, dst):
+    try: os.link(src, dst)
+    except OSError: shutil.copy2(src, dst)
+
+class PublishPlan:
+    def __init__(self, dest, items):
+        # items: {output name: JSON-able signature}
+        self.dest = dest
+        self.items = items
+        self.staging = dest.with_name(dest.name + ".staging")
+        recover(dest)
+        old_data = load_manifest_data(dest) if dest.exists() else {}
+        old = self.old_files = old_data.get('files', {})
+        self.old_hashes = old_data.get('hashes', {})
+        self.changes = {'added': [], 'changed': [], 'removed': []}
+
+        self.reused = [n for n, sig in items.items() if old.get(n) == sig and (dest / n).exists()]
+        reused = set(self.reused)
+        self.todo = [n for n in items if n not in reused]
+        self.added = [n for n in self.todo if n not in old]
+        self.changed = [n for n in self.todo if n in old]
+        self.removed = [n for n in old if n not in items]
+
+        if self.staging.exists(): shutil.rmtree(self.staging)  # Leftover from a crashed run
+        self.staging.mkdir(parents=True)
+
+    @property
+    def dirty(self):
+        return bool(self.todo or self.removed)
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {len(self.reused)} unchanged")
+
+    def commit(self, content_dir=None):
+        # Link unchanged outputs, hash new ones, write the manifest, swap
+        # staging into place. content_dir is where the new outputs can be read
+        # cheaply for hashing (defaults to staging). Names in todo that were
+        # not written (render failures) are dropped.
+        if not self.dirty and self.dest.exists():
+            shutil.rmtree(self.staging)
+            clear_changes(self.dest)
+            return True
+        for n in self.reused:
+            if not (self.staging / n).exists():
+                link_or_copy(self.dest / n, self.staging / n)
+        files = {n: sig for n, sig in self.items.items() if (self.staging / n).exists()}
+
+        reused, hashes = set(self.reused), {}
+        for n in files:
+            if n in reused and n in self.old_hashes:
+                hashes[n] = self.old_hashes[n]
+                continue
+            local = content_dir / n if content_dir and (content_dir / n).exists() else self.staging / n
+            hashes[n] = content_hash(local)
+
+        # By content where the old manifest has hashes, by signature otherwise
+        def is_changed(n):
+            if n in self.old_hashes: return hashes[n] != self.old_hashes[n]
+            return n in self.old_files and n not in reused
+        self.changes = {
+            'added': sorted(n for n in hashes if n not in self.old_hashes and n not in self.old_files),
+            'changed': sorted(n for n in hashes if is_changed(n)),
+            'removed': sorted(n for n in set(self.old_hashes) | set(self.old_files) if n not in hashes),
+        }
+        with open(self.staging / MANIFEST_NAME, 'w') as f:
+            json.dump({'files': files, 'hashes': hashes, 'changes': self.changes}, f)
+        return swap_in(self.staging, self.dest)
+
+    def abort(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+def clear_changes(dest):
+    # A publish with nothing to do still moves the baseline: no changes since
+    data = load_manifest_data(dest)
+    if not any(data.get('changes', {}).values()): return
+    data['changes'] = {'added': [], 'changed': [], 'removed': []}
+    tmp_path = dest / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w') as f: json.dump(data, f)
+    os.replace(tmp_path, dest / MANIFEST_NAME)
+
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+def rename_exchange(a, b):
+    # Atomically swaps two existing paths. False where the kernel, libc or
+    # filesystem can't (the caller falls back to plain renames).
+    if not sys.platform.startswith("linux"): return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        renameat2 = libc.renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    if renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0: return True
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP): return False
+    raise OSError(err, os.strerror(err), str(b))
+
+def recover(dest):
+    # A crash between the fallback's two renames leaves only <dest>.old
+    old = dest.with_name(dest.name + ".old")
+    if old.exists() and not dest.exists():
+        print(f"⚠️ Restoring {dest.name} from an interrupted publish.")
+        os.rename(old, dest)
+
+def swap_in(staging, dest):
+    recover(dest)
+    old = dest.with_name(dest.name + ".old")
+    if old.exists(): shutil.rmtree(old)
+    try:
+        if dest.exists() and rename_exchange(staging, dest):
+            shutil.rmtree(staging, ignore_errors=True)  # Now holds the previous version
+            return True
+        if dest.exists(): os.rename(dest, old)
+        os.rename(staging, dest)
+    except OSError as e:
+        # Typically Windows refusing to rename a folder a trainer has open
+        print(f"❌ Could not swap in {dest}: {e}. Previous version left in place.")
+        if old.exists() and not dest.exists(): os.rename(old, dest)
+        shutil.rmtree(staging, ignore_errors=True)
+        return False
+    shutil.rmtree(old, ignore_errors=True)
+    return True
+
+def prune_musubi_cache(dataset_dir, cache_dir):
+    # Deletes cache files whose source is gone or whose content changed in the
+    # last publish: latents follow the image, text-encoder outputs follow the
+    # caption. Run the cache scripts with --skip_existing afterwards and they
+    # only encode what was removed here or is new. Returns (latents, te) counts.
+    data = load_manifest_data(dataset_dir)
+    if not cache_dir.exists() or 'hashes' not in data: return 0, 0
+
+    def stems(names, exts):
+        return {os.path.splitext(n)[0] for n in names if n.lower().endswith(exts)}
+
+    changes = data.get('changes', {})
+    touched = changes.get('changed', []) + changes.get('removed', [])
+    live_images = stems(data['hashes'], IMAGE_EXTS)
+    stale_images = stems(touched, IMAGE_EXTS)
+    stale_captions = stems(touched + changes.get('added', []), ('.txt',))
+
+    pruned = [0, 0]
+    for f in os.listdir(cache_dir):
+        m = LATENT_CACHE_RE.match(f)
+        if m and (m['stem'] not in live_images or m['stem'] in stale_images):
+            os.remove(cache_dir / f)
+            pruned[0] += 1
+            continue
+        m = TE_CACHE_RE.match(f)
+        if m and (m['stem'] not in live_images or m['stem'] in stale_captions):
+            os.remove(cache_dir / f)
+            pruned[1] += 1
+    return tuple(pruned)
+
+if __name__ == "__main__":
+    # python publish_manifest.py <dataset_dir> [cache_dir]
+    if len(sys.argv) > 1:
+        from pathlib import Path
+        dataset = Path(sys.argv[1])
+        cache = Path(sys.argv[2]) if len(sys.argv) > 2 else dataset.with_name(dataset.name + "_cache")
+        latents, te = prune_musubi_cache(dataset, cache)
+        print(f"✅ Pruned {latents} latent and {te} text-encoder cache files in {cache}")
@@ -0,0 +1,168 @@
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import buckets
+
+# One decode per image, every published resolution rendered from that single
+# in-memory square (never from a saved JPEG), JPEG encodes spread across cores.
+#
+# Backends (project_config.json -> "resample_backend"):
+#   lanczos  plain LANCZOS from the padded source; the reference path and default
+#   reduce   opt-in levels cascade (1024 -> 512 -> 256); exact integer factors use
+#            Image.reduce (box average), anything else LANCZOS with reducing_gap
+#   area     OpenCV INTER_AREA
+# Run `python pyramid.py <image_dir>` to benchmark them against lanczos.
+#
+# pad=False skips the padding and stretches the source to each square, as
+# 05_downsample always has for its (normally square) masters.
+#
+# Bucketed mode (project_config.json -> "bucketed": true) strips the black
+# square padding instead and renders each size into its aspect bucket
+# (see buckets.py) with no padding at all.
+
+BACKENDS = ("lanczos", "reduce", "area")
+DEFAULT_BACKEND = "lanczos"
+REDUCING_GAP = 2.0
+JPEG_QUALITY = 95
+WORKERS = os.cpu_count() or 4
+PAD_THRESHOLD = 8  # Pixel values at or below this count as padding
+
+def content_bbox(gray, threshold=PAD_THRESHOLD):
+    # Bounding box of non-padding pixels as (y1, y2, x1, x2)
+    rows = np.flatnonzero(gray.max(axis=1) > threshold)
+    cols = np.flatnonzero(gray.max(axis=0) > threshold)
+    if rows.size == 0 or cols.size == 0:
+        return 0, gray.shape[0], 0, gray.shape[1]
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+def load_square(src, max_size, pad=True):
+    # Decode once, letting the JPEG decoder downscale by 1/2, 1/4, 1/8 when the
+    # source is far larger than anything we publish, then pad to a square.
+    with Image.open(src) as img:
+        img.draft("RGB", (max_size, max_size))
+        img = img.convert("RGB")
+    side = max(img.size)
+    if img.size == (side, side) or not pad: return img
+    return ImageOps.pad(img, (side, side), color=(0, 0, 0), centering=(0.5, 0.5))
+
+def load_content(src, max_size):
+    # Decode once (draft-scaled, leaving room for the widest bucket) and crop
+    # away the black padding 02_crop added.
+    with Image.open(src) as img:
+        img.draft("RGB", (int(max_size * buckets.MAX_ASPECT ** 0.5) + 1,) * 2)
+        img = img.convert("RGB")
+    y1, y2, x1, x2 = content_bbox(np.asarray(img.convert("L")))
+    if (x1, y1, x2, y2) == (0, 0, img.width, img.height): return img
+    return img.crop((x1, y1, x2, y2))
+
+def resample(img, size, backend=DEFAULT_BACKEND):
+    # size: int for a square, or (w, h)
+    w, h = (size, size) if isinstance(size, int) else size
+    if img.size == (w, h): return img
+    if backend == "lanczos":
+        return img.resize((w, h), Image.Resampling.LANCZOS)
+    if backend == "reduce":
+        if img.width % w == 0 and img.height % h == 0 and img.width // w == img.height // h:
+            return img.reduce(img.width // w)
+        return img.resize((w, h), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+    if backend == "area":
+        import cv2
+        arr = cv2.resize(np.asarray(img), (w, h), interpolation=cv2.INTER_AREA)
+        return Image.fromarray(arr)
+    raise ValueError(f"Unknown resample backend: {backend}")
+
+def to_bucket(img, resolution, backend=DEFAULT_BACKEND):
+    bucket = buckets.nearest_bucket(img.width, img.height, resolution)
+    scaled, box = buckets.cover_crop_box(img.width, img.height, bucket)
+    return resample(img, scaled, backend).crop(box)
+
+def render_bucketed(src, sizes, backend=DEFAULT_BACKEND):
+    # -> ({size: PIL image}, content (w, h))
+    content = load_content(src, max(sizes))
+    return {size: to_bucket(content, size, backend) for size in sizes}, content.size
+
+def render_levels(src, sizes, backend=DEFAULT_BACKEND, bucketed=False, pad=True):
+    # -> {size: PIL image}. 'reduce' renders each level from the one above it.
+    if bucketed: return render_bucketed(src, sizes, backend)[0]
+    current = load_square(src, max(sizes), pad)
+    levels = {}
+    for size in sorted(sizes, reverse=True):
+        levels[size] = resample(current, size, backend)
+        if backend == "reduce": current = levels[size]
+    return levels
+
+def _publish_one(job):
+    # job: (src, {size: dest_path}, backend, bucketed, pad) -> (src, info or None)
+    src, outputs, backend, bucketed, pad = job
+    try:
+        if bucketed:
+            levels, content = render_bucketed(src, list(outputs), backend)
+        else:
+            levels = render_levels(src, list(outputs), backend, pad=pad)
+            content = levels[max(outputs)].size
+        for size, dest in outputs.items():
+            levels[size].save(dest, quality=JPEG_QUALITY)
+        return src, {'content': list(content), 'outputs': {str(s): list(levels[s].size) for s in outputs}}
+    except Exception as e:
+        print(f"    ❌ {Path(src).name}: {e}")
+        return src, None
+
+def publish_detailed(jobs, backend=DEFAULT_BACKEND, workers=WORKERS, bucketed=False, pad=True):
+    # jobs: [(src, {size: dest_path})] -> [(src, {'content': [w, h], 'outputs': {size: [w, h]}})]
+    if backend not in BACKENDS:
+        print(f"⚠️ Unknown resample backend '{backend}', using {DEFAULT_BACKEND}.")
+        backend = DEFAULT_BACKEND
+    tasks = [(src, outputs, backend, bucketed, pad) for src, outputs in jobs]
+    if workers <= 1 or len(tasks) < 2:
+        return [(src, info) for src, info in map(_publish_one, tasks) if info]
+    chunk = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [(src, info) for src, info in pool.map(_publish_one, tasks, chunksize=chunk) if info]
+
+def publish(jobs, backend=DEFAULT_BACKEND, workers=WORKERS, bucketed=False, pad=True):
+    # Returns the list of sources written
+    return [src for src, _ in publish_detailed(jobs, backend, workers, bucketed, pad)]
+
+def backend_for(config):
+    return (config or {}).get('resample_backend', DEFAULT_BACKEND)
+
+def bucketed_for(config):
+    return bool((config or {}).get('bucketed', False))
+
+def psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def benchmark(img_paths, sizes=(1024, 512, 256), backends=BACKENDS):
+    # Per-image render time (decode + resample, no encode) and PSNR vs lanczos
+    reference = {p: render_levels(p, sizes, "lanczos") for p in img_paths}
+    print(f"📊 {len(img_paths)} images -> {list(sizes)}")
+    for backend in backends:
+        try:
+            start_t = time.time()
+            rendered = {p: render_levels(p, sizes, backend) for p in img_paths}
+            ms = (time.time() - start_t) * 1000 / max(1, len(img_paths))
+        except ImportError as e:
+            print(f"   {backend:8s} skipped ({e})")
+            continue
+        scores = [psnr(rendered[p][s], reference[p][s]) for p in img_paths for s in sizes if s < max(sizes)]
+        quality = f"{np.mean(scores):.1f} dB" if scores else "n/a"
+        print(f"   {backend:8s} {ms:7.1f} ms/image   PSNR vs lanczos: {quality}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        folder = Path(sys.argv[1])
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        paths = sorted(p for p in folder.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))[:limit]
+        benchmark(paths)
@@ -0,0 +1,150 @@
+import sys
+import os
+import io
+import json
+import shutil
+import tarfile
+import hashlib
+import numpy as np
+from PIL import Image
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import pyramid
+
+# Packed exports of a published dataset, so loaders stream or mmap a few big
+# files instead of opening thousands of small ones.
+#
+#   shard-<S>-000000.tar   sequential tar shards of <key>.jpg/.txt pairs
+#                          (WebDataset layout), per resolution S
+#   pack-<S>.u8            every image's raw RGB uint8 pixels back to back
+#   pack-<S>.json          offset index: [key, offset, height, width] per image
+#   captions.json          side table key -> caption, shared by all packs
+#
+# Everything is derived from the 1024 masters (square, or bucketed when the
+# project publishes bucketed), each decoded once for all sizes. Rebuilt only when the masters' publish manifest changes.
+
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+SHARD_MAX_FILES = 2000          # Image+caption pairs per shard
+INDEX_NAME = "export_index.json"
+
+def source_digest(master_dir, manifest_name):
+    path = master_dir / manifest_name
+    return hashlib.sha1(path.read_bytes()).hexdigest() if path.exists() else None
+
+def load_pairs(master_dir):
+    # -> [(key, image path, caption)] in stable order
+    pairs = []
+    for f in sorted(os.listdir(master_dir)):
+        if not f.lower().endswith(('.jpg', '.png')): continue
+        key = os.path.splitext(f)[0]
+        txt = master_dir / f"{key}.txt"
+        caption = txt.read_text(encoding="utf-8").strip() if txt.exists() else ""
+        pairs.append((key, master_dir / f, caption))
+    return pairs
+
+class ShardWriter:
+    def __init__(self, out_dir, size, max_bytes=SHARD_MAX_BYTES, max_files=SHARD_MAX_FILES):
+        self.out_dir, self.size = out_dir, size
+        self.max_bytes, self.max_files = max_bytes, max_files
+        self.names, self.tar = [], None
+
+    def _roll(self):
+        if self.tar: self.tar.close()
+        name = f"shard-{self.size}-{len(self.names):06d}.tar"
+        self.names.append(name)
+        self.tar = tarfile.open(self.out_dir / name, "w")
+        self.count, self.bytes = 0, 0
+
+    def add(self, key, img_bytes, caption, ext=".jpg"):
+        if self.tar is None or self.count >= self.max_files or self.bytes >= self.max_bytes: self._roll()
+        for name, data in ((f"{key}{ext}", img_bytes), (f"{key}.txt", caption.encode("utf-8"))):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            self.tar.addfile(info, io.BytesIO(data))
+            self.bytes += len(data)
+        self.count += 1
+
+    def close(self):
+        if self.tar: self.tar.close()
+        return self.names
+
+class PackWriter:
+    def __init__(self, out_dir, size):
+        self.data_name, self.index_name = f"pack-{size}.u8", f"pack-{size}.json"
+        self.out_dir = out_dir
+        self.f = open(out_dir / self.data_name, "wb")
+        self.rows, self.offset = [], 0
+
+    def add(self, key, img):
+        arr = np.ascontiguousarray(np.asarray(img.convert("RGB"), dtype=np.uint8))
+        self.f.write(arr.tobytes())
+        self.rows.append([key, self.offset, arr.shape[0], arr.shape[1]])
+        self.offset += arr.nbytes
+
+    def close(self):
+        self.f.close()
+        with open(self.out_dir / self.index_name, "w") as f:
+            json.dump({'dtype': 'uint8', 'channels': 3, 'rows': self.rows}, f)
+        return [self.data_name, self.index_name]
+
+class PackReader:
+    # Minimal loader side: pack[i] -> (key, HxWx3 uint8 view, caption)
+    def __init__(self, export_dir, size):
+        with open(export_dir / f"pack-{size}.json", "r") as f: self.rows = json.load(f)['rows']
+        with open(export_dir / "captions.json", "r") as f: self.captions = json.load(f)
+        self.data = np.memmap(export_dir / f"pack-{size}.u8", dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        key, offset, h, w = self.rows[i]
+        return key, self.data[offset:offset + h * w * 3].reshape(h, w, 3), self.captions.get(key, "")
+
+def encode_jpeg(img):
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=pyramid.JPEG_QUALITY)
+    return buf.getvalue()
+
+def export(master_dir, out_dir, sizes, tar_shards=True, pack=True, digest=None, backend=pyramid.DEFAULT_BACKEND, bucketed=False):
+    # Writes the export into out_dir (rebuilt from scratch). Returns file names.
+    if out_dir.exists(): shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    pairs = load_pairs(master_dir)
+
+    shard_writers = {s: ShardWriter(out_dir, s) for s in sizes} if tar_shards else {}
+    pack_writers = {s: PackWriter(out_dir, s) for s in sizes} if pack else {}
+    for key, img_path, caption in pairs:
+        with Image.open(img_path) as img: master_size = img.size
+        levels = pyramid.render_levels(img_path, sizes, backend, bucketed)
+        for s in sizes:
+            if s in shard_writers:
+                # Masters already at this size go in as-is, no re-encode
+                if levels[s].size == master_size:
+                    shard_writers[s].add(key, img_path.read_bytes(), caption, img_path.suffix.lower())
+                else:
+                    shard_writers[s].add(key, encode_jpeg(levels[s]), caption)
+            if s in pack_writers: pack_writers[s].add(key, levels[s])
+
+    names = []
+    for w in list(shard_writers.values()) + list(pack_writers.values()): names += w.close()
+    with open(out_dir / "captions.json", "w") as f:
+        json.dump({key: caption for key, _, caption in pairs}, f)
+    with open(out_dir / INDEX_NAME, "w") as f:
+        json.dump({'source_digest': digest, 'sizes': sizes, 'formats': formats(tar_shards, pack),
+                   'count': len(pairs), 'files': names}, f, indent=4)
+    return names + ["captions.json", INDEX_NAME]
+
+def formats(tar_shards, pack):
+    return [name for name, on in (("tar", tar_shards), ("pack", pack)) if on]
+
+def is_current(out_dir, digest, sizes, tar_shards=True, pack=True):
+    path = out_dir / INDEX_NAME
+    if not path.exists() or digest is None: return False
+    with open(path, "r") as f: index = json.load(f)
+    return (index.get('source_digest') == digest and index.get('sizes') == sizes
+            and index.get('formats') == formats(tar_shards, pack))
@@ -0,0 +1,143 @@
+import sys
+import os
+import math
+import shutil
+import subprocess
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+import buckets
+
+# Picks Musubi training settings from what was actually published (image
+# count, resolution, bucket spread) and the machine doing the training (CPU
+# cores, RAM, VRAM). Every choice is recorded with its reason in
+# train_plan.json so a run that underperforms can be traced back.
+
+PLAN_NAME = "train_plan.json"
+
+TARGET_STEPS = 2000          # Optimizer steps for a typical single-person LoRA
+MIN_EPOCH_STEPS = 100        # Repeat tiny datasets so epochs aren't a few steps long
+MAX_EPOCHS = 100
+SAVES_PER_RUN = 7            # Checkpoints spread over the run
+MAX_LOADER_WORKERS = 8       # Latents are pre-cached; more workers only cost RAM
+WORKER_RAM_GB = 1.5          # Per loader worker (a forked copy of dataset state)
+RESERVED_RAM_GB = 32         # Offloaded DiT block + cached VAE on the host
+MIN_BUCKET_BATCHES = 4       # A bucket should fill this many full batches
+
+def host_memory_gb():
+    # -> (total, available); /proc/meminfo avoids a psutil dependency
+    try:
+        info = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                info[key] = int(value.split()[0]) / (1024 ** 2)
+        return info.get("MemTotal", 0.0), info.get("MemAvailable", 0.0)
+    except Exception:
+        return 0.0, 0.0
+
+def gpu_memory_gb():
+    # Largest GPU via nvidia-smi (works inside WSL); 0 when unknown
+    if not shutil.which("nvidia-smi"): return 0.0
+    try:
+        out = subprocess.check_output(
+            ["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"], text=True, timeout=10)
+        return max(float(x) for x in out.split()) / 1024
+    except Exception:
+        return 0.0
+
+def probe_host():
+    total, available = host_memory_gb()
+    return {
+        'physical_cores': utils.physical_cores(),
+        'logical_cores': os.cpu_count() or 1,
+        'ram_total_gb': round(total, 1),
+        'ram_available_gb': round(available, 1),
+        'vram_gb': round(gpu_memory_gb(), 1),
+    }
+
+def dataset_stats(slug, image_count, resolution, bucketed=False):
+    # Square publishes are one bucket; an older bucket report must not count
+    report = utils.load_project_data(slug, buckets.REPORT_NAME) if bucketed else None
+    counts = (report or {}).get('distribution', {}).get(str(resolution))
+    bucket_sizes = sorted(counts.values(), reverse=True) if counts else [image_count]
+    return {'images': image_count, 'resolution': resolution, 'buckets': len(bucket_sizes), 'bucket_sizes': bucket_sizes}
+
+def plan(dataset, host):
+    why = []
+    n = max(1, dataset['images'])
+
+    # Batch size: VRAM headroom at this resolution, then bucket fill
+    batch = 1
+    if host['vram_gb'] >= 40 and dataset['resolution'] <= 512: batch = 4
+    elif host['vram_gb'] >= 24 and dataset['resolution'] <= 512: batch = 2
+    vram = f"{host['vram_gb']:.0f} GB VRAM" if host['vram_gb'] else "VRAM unknown"
+    why.append(f"batch_size {batch}: {vram} at {dataset['resolution']}px with fp8 DiT")
+
+    grad_accum = 1
+    if batch > 1:
+        # Each batch comes from one bucket; a sparse bucket ends in partial batches
+        median_bucket = dataset['bucket_sizes'][len(dataset['bucket_sizes']) // 2]
+        if median_bucket < batch * MIN_BUCKET_BATCHES:
+            why.append(f"batch_size {batch} -> 1 with {batch}x gradient accumulation: median bucket holds "
+                       f"{median_bucket} images across {dataset['buckets']} buckets")
+            grad_accum, batch = batch, 1
+    effective = batch * grad_accum
+
+    # Repeats: keep an epoch at least MIN_EPOCH_STEPS optimizer steps long
+    repeats = max(1, math.ceil(MIN_EPOCH_STEPS * effective / n))
+    epoch_steps = math.ceil(n * repeats / effective)
+    if repeats > 1:
+        why.append(f"num_repeats {repeats}: {n} images would give {math.ceil(n / effective)}-step epochs")
+
+    epochs = max(1, min(MAX_EPOCHS, round(TARGET_STEPS / epoch_steps)))
+    save_every = max(1, epochs // SAVES_PER_RUN)
+    why.append(f"max_train_epochs {epochs}: {epoch_steps} steps/epoch toward ~{TARGET_STEPS} steps")
+
+    # Loader workers: spare cores after the main process, capped by host RAM
+    spare_cores = max(1, host['physical_cores'] - 2)
+    ram_left = host['ram_total_gb'] - RESERVED_RAM_GB
+    ram_cap = max(1, int(ram_left // WORKER_RAM_GB)) if host['ram_total_gb'] else MAX_LOADER_WORKERS
+    workers = max(1, min(spare_cores, ram_cap, MAX_LOADER_WORKERS, n))
+    why.append(f"max_data_loader_n_workers {workers}: {host['physical_cores']} physical cores, "
+               f"{host['ram_total_gb']:.0f} GB RAM ({RESERVED_RAM_GB} GB reserved for offload)")
+
+    return {
+        'dataset': dataset,
+        'host': host,
+        'settings': {
+            'batch_size': batch,
+            'num_repeats': repeats,
+            'gradient_accumulation_steps': grad_accum,
+            'max_train_epochs': epochs,
+            'save_every_n_epochs': save_every,
+            'max_data_loader_n_workers': workers,
+            'total_steps': epochs * epoch_steps,
+        },
+        'rationale': why,
+    }
+
+def make_plan(slug, image_count, resolution, overrides=None, bucketed=False):
+    # Plans, applies project_config.json -> "train": {...} overrides, saves
+    result = plan(dataset_stats(slug, image_count, resolution, bucketed), probe_host())
+    for key, value in (overrides or {}).items():
+        if key in result['settings']:
+            result['settings'][key] = value
+            result['rationale'].append(f"{key} {value}: set in project config")
+    utils.save_project_data(slug, PLAN_NAME, result)
+    return result
+
+def to_env(settings):
+    # Shell form, sourced by config_files/templates/wan_train_template.sh
+    return "".join(f"{key.upper()}={value}\n" for key, value in settings.items())
+
+def print_plan(result):
+    s = result['settings']
+    print(f"   📐 Train plan: batch {s['batch_size']} x accum {s['gradient_accumulation_steps']}, "
+          f"repeats {s['num_repeats']}, {s['max_train_epochs']} epochs (~{s['total_steps']} steps), "
+          f"{s['max_data_loader_n_workers']} loader workers")
+    for line in result['rationale']:
+        print(f"      - {line}")
@@ -0,0 +1,104 @@
+import sys
+import os
+import time
+import shutil
+import tarfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# --- BOOTSTRAP PATHS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+import utils
+
+# Bulk transfer to Windows drives. Files under /mnt/c go through the 9P bridge
+# where every open/close costs far more than the bytes, so outputs are built on
+# local ext4 first and moved in bulk:
+#   threads  many files copied concurrently (hides per-file latency)
+#   tar      one archive written sequentially, unpacked on the Windows side
+#            by tar.exe so the per-file work never crosses the bridge
+#   auto     tar above TAR_MIN_FILES files, threads below
+# Set DG_WINDOWS_ROOT to any local directory to stand in for /mnt/c.
+
+WINDOWS_ROOT = Path(os.environ.get("DG_WINDOWS_ROOT", "/mnt/c"))
+STAGE_ROOT = utils.CACHE_ROOT / "transfer"
+MODES = ("auto", "threads", "tar")
+COPY_WORKERS = 16
+TAR_MIN_FILES = 200
+ARCHIVE_NAME = ".dg_transfer.tar"
+
+def is_windows_path(path):
+    path = Path(path)
+    return path == WINDOWS_ROOT or WINDOWS_ROOT in path.parents
+
+def stage_dir(name):
+    # Empty local staging directory on ext4
+    path = STAGE_ROOT / name
+    if path.exists(): shutil.rmtree(path)
+    path.mkdir(parents=True)
+    return path
+
+def windows_tar():
+    # Windows' own bsdtar, reachable through WSL interop. Only used for real
+    # drvfs mounts; a stand-in directory is unpacked with tarfile instead.
+    if str(WINDOWS_ROOT).startswith("/mnt/"): return shutil.which("tar.exe")
+    return None
+
+def to_windows_path(path):
+    return subprocess.check_output(["wslpath", "-w", str(path)], text=True).strip()
+
+def copy_threads(src_dir, dst_dir, names, workers=COPY_WORKERS):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda n: shutil.copyfile(src_dir / n, dst_dir / n), names))
+
+def copy_tar(src_dir, dst_dir, names):
+    local_archive = src_dir.with_name(src_dir.name + ".tar")
+    with tarfile.open(local_archive, "w") as tar:
+        for n in names: tar.add(src_dir / n, arcname=n)
+
+    remote_archive = dst_dir / ARCHIVE_NAME
+    shutil.copyfile(local_archive, remote_archive)
+    local_archive.unlink()
+    try:
+        tar_exe = windows_tar()
+        if tar_exe:
+            subprocess.run([tar_exe, "-xf", to_windows_path(remote_archive), "-C", to_windows_path(dst_dir)],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        else:
+            with tarfile.open(remote_archive) as tar: tar.extractall(dst_dir)
+    finally:
+        remote_archive.unlink()
+
+def transfer(src_dir, dst_dir, names=None, mode="auto", label=""):
+    # Copies names (default: every file in src_dir) into dst_dir and reports
+    # throughput. Returns the stats dict.
+    src_dir, dst_dir = Path(src_dir), Path(dst_dir)
+    if names is None: names = sorted(f for f in os.listdir(src_dir) if (src_dir / f).is_file())
+    if mode not in MODES:
+        print(f"⚠️ Unknown transfer mode '{mode}', using auto.")
+        mode = "auto"
+    if mode == "auto": mode = "tar" if len(names) >= TAR_MIN_FILES else "threads"
+
+    stats = {'files': len(names), 'bytes': 0, 'seconds': 0.0, 'mode': mode}
+    if not names: return stats
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    stats['bytes'] = sum((src_dir / n).stat().st_size for n in names)
+
+    start_t = time.time()
+    if mode == "tar":
+        try: copy_tar(src_dir, dst_dir, names)
+        except (OSError, subprocess.CalledProcessError, tarfile.TarError) as e:
+            print(f"   ⚠️ Archive transfer failed ({e}); falling back to threaded copy.")
+            stats['mode'] = "threads"
+            copy_threads(src_dir, dst_dir, names)
+    else:
+        copy_threads(src_dir, dst_dir, names)
+    stats['seconds'] = time.time() - start_t
+
+    secs = max(stats['seconds'], 1e-6)
+    print(f"   📦 {label or dst_dir.name}: {stats['files']} files, {stats['bytes'] / 1e6:.1f} MB "
+          f"in {stats['seconds']:.2f}s ({stats['bytes'] / 1e6 / secs:.1f} MB/s, "
+          f"{stats['files'] / secs:.0f} files/s, {stats['mode']})")
+    return stats
@@ -18,6 +18,7 @@ REQUIREMENTS_PATH = ROOT_DIR / "core" / "requirements.txt"
 LINUX_PROJECTS_ROOT = ROOT_DIR / "outputs"
 LINUX_DATASETS_ROOT = ROOT_DIR / "datasets"
 DB_PATH = ROOT_DIR / "Database" / "trigger_words.csv"
+CACHE_ROOT = ROOT_DIR / "cache"  # Cross-project caches (captions, face index)
 
 # --- UNIFIED DIRECTORY SCHEMA (1-6 PIPELINE) ---
 DIRS = {
@@ -27,10 +28,15 @@ DIRS = {
     "clean": "04_clean",
     "caption": "05_caption",
     "publish": "06_publish",
+    "qc": "06_qc",
     "master": "06_publish/1024",
     "downsample": "06_publish",
 }
 
+# Per-project gate reports. Each maps image name -> scores + 'passed' flag;
+# anything marked failed is skipped by 03_validate.
+GATE_REPORTS = ["quality_scores.json", "identity_gate.json"]
+
 # Musubi Tuner Paths
 MUSUBI_PATHS = {
     'wsl_app': "/home/seanf/ai/apps/musubi-tuner",
@@ -65,6 +71,8 @@ def bootstrap(install_reqs=True):
     except ImportError: install_package("huggingface_hub")
     try: import requests
     except ImportError: install_package("requests")
+    try: import aiohttp
+    except ImportError: install_package("aiohttp")
     try: import diffusers
     except ImportError: install_package("diffusers transformers accelerate scipy")
     try: import sklearn
@@ -107,12 +115,37 @@ def save_config(slug, data):
     path.parent.mkdir(parents=True, exist_ok=True)
     with open(path, 'w') as f: json.dump(data, f, indent=4)
 
+def load_project_data(slug, name):
+    path = get_project_path(slug) / name
+    if not path.exists(): return None
+    with open(path, 'r') as f: return json.load(f)
+
+def save_project_data(slug, name, data):
+    path = get_project_path(slug) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f: json.dump(data, f, indent=4)
+
+def load_gate_rejects(slug):
+    rejected = set()
+    for name in GATE_REPORTS:
+        report = load_project_data(slug, name) or {}
+        for img_name, entry in report.get('images', {}).items():
+            if not entry.get('passed', True): rejected.add(img_name)
+    return rejected
+
 def get_windows_unc_path(wsl_path):
     if not wsl_path.startswith("/home"): return wsl_path 
     clean_path = str(wsl_path).replace("/", "\\")
     if clean_path.startswith("\\"): clean_path = clean_path[1:]
     return f"\\\\wsl.localhost\\Ubuntu\\{clean_path}"
 
+def physical_cores():
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
 def update_trigger_db(slug, trigger, full_name):
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     row = [slug, trigger, full_name]
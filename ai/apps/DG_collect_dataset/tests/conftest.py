@@ -0,0 +1,7 @@
+import sys
+import os
+
+# Pipeline modules import each other by bare name from core/
+CORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core")
+if CORE_DIR not in sys.path:
+    sys.path.insert(0, os.path.abspath(CORE_DIR))
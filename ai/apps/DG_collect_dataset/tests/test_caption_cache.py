@@ -0,0 +1,61 @@
+from PIL import Image
+
+import caption_cache
+
+def clean(text, trigger):
+    return text
+
+def setup(tmp_path):
+    cache = caption_cache.CaptionCache(tmp_path / "captions.sqlite")
+    img = tmp_path / "a.png"
+    Image.new("RGB", (8, 8)).save(img)
+    txt_for = lambda p: p.with_suffix(".txt")
+    cache.put(img, "qwen", "v1", "alice in a park", "alice")
+    cache.write_text(txt_for(img), "alice in a park")
+    return cache, img, txt_for
+
+def test_trigger_change_rewrites_our_own_text(tmp_path):
+    cache, img, txt_for = setup(tmp_path)
+    assert caption_cache.apply_cached(cache, [img], "qwen", "v1", "bob", txt_for, clean) == []
+    assert txt_for(img).read_text(encoding="utf-8") == "bob in a park"
+
+def test_hand_edited_text_is_kept(tmp_path):
+    cache, img, txt_for = setup(tmp_path)
+    txt_for(img).write_text("alice, hand written", encoding="utf-8")
+    caption_cache.apply_cached(cache, [img], "qwen", "v1", "bob", txt_for, clean)
+    assert txt_for(img).read_text(encoding="utf-8") == "alice, hand written"
+
+def test_missing_text_is_written(tmp_path):
+    cache, img, txt_for = setup(tmp_path)
+    txt_for(img).unlink()
+    caption_cache.apply_cached(cache, [img], "qwen", "v1", "alice", txt_for, clean)
+    assert txt_for(img).read_text(encoding="utf-8") == "alice in a park"
+
+def test_prompt_layout_is_part_of_the_version():
+    instruction = lambda trigger, gender: f"Describe {trigger}, a {gender}."
+    plain = caption_cache.prompt_version(instruction, "man")
+    assert caption_cache.prompt_version(instruction, "man", prefix_first=False) == plain
+    assert caption_cache.prompt_version(instruction, "man", prefix_first=True) != plain
+
+def test_triggers_with_non_word_edges_become_placeholders():
+    for trigger in ("ohwx", "ohwx_", "<sks>", "j.doe"):
+        template = caption_cache.to_template(f"{trigger.upper()} in a park, {trigger}.", trigger)
+        assert template == "{trigger} in a park, {trigger}."
+    assert caption_cache.to_template("ohwxy and xohwx", "ohwx") == "ohwxy and xohwx"
+
+def test_lookups_read_only_the_paths_asked_for(tmp_path, monkeypatch):
+    monkeypatch.setattr(caption_cache, "QUERY_CHUNK", 3)
+    cache, img, txt_for = setup(tmp_path)
+    imgs = []
+    for i in range(7):
+        p = tmp_path / f"img_{i}.png"
+        Image.new("RGB", (8, 8), (i + 1, 0, 0)).save(p)
+        imgs.append(p)
+    cache.hash_files(imgs)
+    cache.put(imgs[5], "qwen", "v1", "bob outside", "bob")
+
+    queries = []
+    cache.conn.set_trace_callback(queries.append)
+    assert cache.get_many([img, *imgs], "qwen", "v1") == {img: "{trigger} in a park", imgs[5]: "{trigger} outside"}
+    assert all(" IN (" in q for q in queries if q.startswith("SELECT"))
+    assert sum(q.startswith("SELECT") and "file_hashes" in q for q in queries) == 3  # 8 paths in chunks of 3
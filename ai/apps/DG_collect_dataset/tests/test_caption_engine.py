@@ -0,0 +1,263 @@
+import types
+import pytest
+import torch
+from PIL import Image
+
+import caption_engine
+
+# CPU stand-ins for Qwen2.5-VL and its processor: each image is encoded as
+# [prompt tokens | image id] and the "model" answers with the id back, so
+# every caption can be traced to the image it was generated for.
+
+IMAGE_ID_BASE = 1000
+
+class FakeEncoding(dict):
+    __getattr__ = dict.__getitem__
+
+class FakeTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, text, add_special_tokens=False):
+        return types.SimpleNamespace(input_ids=text.split())
+
+class FakeProcessor:
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.ids = {}
+
+    def apply_chat_template(self, conv, tokenize=False, add_generation_prompt=True):
+        return next(c["image"] for c in conv[0]["content"] if c["type"] == "image")
+
+    def __call__(self, text, images, videos, return_tensors="pt"):
+        img_id = self.ids.setdefault(text[0], len(self.ids))
+        prompt_len = 3 + img_id % 4  # Ragged prompts exercise the left padding
+        return FakeEncoding(
+            input_ids=torch.tensor([[7] * prompt_len + [IMAGE_ID_BASE + img_id]]),
+            pixel_values=torch.zeros(1, 4),
+            image_grid_thw=torch.tensor([[1, 2, 2]]),
+        )
+
+    def batch_decode(self, ids, skip_special_tokens=True, clean_up_tokenization_spaces=False):
+        return [f"caption {int(row[0]) - IMAGE_ID_BASE}." for row in ids]
+
+class FakeModel:
+    device = torch.device("cpu")
+    dtype = torch.float16
+    config = types.SimpleNamespace(num_attention_heads=4, num_key_value_heads=2, hidden_size=64, num_hidden_layers=2)
+
+    def __init__(self, oom_above=None):
+        self.oom_above = oom_above
+        self.batches = []
+
+    def generate(self, input_ids, attention_mask, pixel_values, image_grid_thw, **kwargs):
+        if self.oom_above and input_ids.shape[0] > self.oom_above:
+            raise torch.cuda.OutOfMemoryError("fake OOM")
+        self.batches.append(input_ids.shape[0])
+        # The last prompt column holds each row's image id (left padded)
+        return torch.cat([input_ids, input_ids[:, -1:]], dim=1)
+
+def no_vision(conv):
+    return [None], None
+
+@pytest.fixture(autouse=True)
+def no_transformers(monkeypatch):
+    # Stopping criteria come from transformers; the fakes only need the token cap
+    monkeypatch.setattr(caption_engine.CaptionLimits, "generate_kwargs",
+                        lambda self, processor, prompt_len: {'max_new_tokens': self.max_new_tokens})
+
+def make_images(tmp_path, sizes):
+    paths = []
+    for i, size in enumerate(sizes):
+        p = tmp_path / f"img_{i:02d}.png"
+        Image.new("RGB", size).save(p)
+        paths.append(p)
+    return paths
+
+def run_captions(model, processor, paths, **kwargs):
+    captions, errors = {}, {}
+    caption_engine.caption_files(
+        model, processor, paths, "describe",
+        on_caption=lambda p, c: captions.__setitem__(p, c),
+        on_error=lambda p, e: errors.__setitem__(p, e),
+        vision_fn=no_vision, prefetch_depth=1, **kwargs,
+    )
+    return captions, errors
+
+def test_group_by_size_orders_by_token_estimate(tmp_path):
+    sizes = [(900, 900), (32, 32), (500, 300), (64, 64), (700, 700), (40, 40)]
+    paths = make_images(tmp_path, sizes)
+    batches = caption_engine.group_by_size(paths, 2)
+
+    assert [len(b) for b in batches] == [2, 2, 2]
+    flat = [p for b in batches for p in b]
+    estimates = [caption_engine.estimate_tokens(caption_engine.image_size(p)) for p in flat]
+    assert estimates == sorted(estimates)
+    # Smallest pair together, largest pair together
+    assert set(batches[0]) == {paths[1], paths[5]}
+    assert set(batches[-1]) == {paths[0], paths[4]}
+
+def test_captions_map_back_to_their_images(tmp_path):
+    paths = make_images(tmp_path, [(64 + 16 * i, 64) for i in range(7)])
+    processor = FakeProcessor()
+    captions, errors = run_captions(FakeModel(), processor, paths, batch_size=3, reuse_prefix=False)
+
+    assert not errors
+    assert set(captions) == set(paths)
+    for p, caption in captions.items():
+        img_id = processor.ids[str(p)]
+        assert caption == f"caption {img_id}."
+
+def test_oom_splits_batch_and_retries(tmp_path):
+    paths = make_images(tmp_path, [(64, 64)] * 8)
+    model = FakeModel(oom_above=2)
+    captions, errors = run_captions(model, FakeProcessor(), paths, batch_size=8, reuse_prefix=False)
+
+    assert not errors
+    assert len(captions) == 8
+    assert max(model.batches) <= 2
+    assert sum(model.batches) == 8
+
+def test_oom_on_single_image_raises(tmp_path):
+    paths = make_images(tmp_path, [(64, 64)] * 2)
+    with pytest.raises(torch.cuda.OutOfMemoryError):
+        run_captions(FakeModel(oom_above=0.5), FakeProcessor(), paths, batch_size=2, reuse_prefix=False)
+
+def test_auto_batch_size_follows_free_memory(monkeypatch):
+    model = FakeModel()
+    per_image = caption_engine.kv_bytes_per_token(model) * 1000 * caption_engine.ACTIVATION_OVERHEAD
+    monkeypatch.setattr(caption_engine, "free_memory_bytes", lambda device: per_image * 5 / caption_engine.MEMORY_HEADROOM)
+    assert caption_engine.auto_batch_size(model, 1000) == 5
+    monkeypatch.setattr(caption_engine, "free_memory_bytes", lambda device: 0)
+    assert caption_engine.auto_batch_size(model, 1000) == 1
+    monkeypatch.setattr(caption_engine, "free_memory_bytes", lambda device: per_image * 1000)
+    assert caption_engine.auto_batch_size(model, 1000) == caption_engine.MAX_BATCH
+
+def test_image_comes_first_unless_prefix_cache():
+    plain = caption_engine.build_messages("a.png", "describe")[0]["content"]
+    assert [c["type"] for c in plain] == ["image", "text"]
+    prefixed = caption_engine.build_messages("a.png", "describe", prefix_first=True)[0]["content"]
+    assert [c["type"] for c in prefixed] == ["text", "image"]
+
+class ToyModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embed = torch.nn.Embedding(10, 8)
+        self.proj = torch.nn.Linear(8, 8)
+        self.head = torch.nn.Linear(8, 10, bias=False)
+        self.register_buffer("inv_freq", torch.arange(8.0), persistent=False)
+
+    def forward(self, x):
+        return self.head(torch.relu(self.proj(self.embed(x) + self.inv_freq)))
+
+def test_int8_state_dict_round_trip(tmp_path):
+    model = torch.ao.quantization.quantize_dynamic(ToyModel(), {torch.nn.Linear}, dtype=torch.qint8)
+    cache_path = tmp_path / "toy-int8.pt"
+    caption_engine.save_cpu_model(model, cache_path)
+
+    saved = torch.load(cache_path, weights_only=True)
+    assert list(saved['buffers']) == ["inv_freq"]
+    with torch.device("meta"):
+        restored = ToyModel()
+    caption_engine.swap_dynamic_linears(restored)
+    restored.load_state_dict(saved['state_dict'], assign=True)
+    restored.register_buffer("inv_freq", saved['buffers']["inv_freq"], persistent=False)
+
+    x = torch.tensor([[1, 2, 3]])
+    assert torch.equal(model(x), restored(x))
+
+class VocabTokenizer(FakeTokenizer):
+    vocab = {"Ġcat": 1, ".": 2, "Ġdog": 3, "!": 4, "Ġwhy?": 5, "Ġ...": 6, ".Ġthe": 7}
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+    def convert_tokens_to_string(self, tokens):
+        return "".join(tokens).replace("Ġ", " ")
+
+def test_sentence_end_ids_only_tokens_ending_a_sentence():
+    tokenizer = VocabTokenizer()
+    ids = caption_engine.sentence_end_ids(tokenizer)
+    assert ids.tolist() == [2, 4, 5, 6]
+    assert caption_engine.sentence_end_ids(tokenizer) is ids  # Built once
+
+def test_sentence_budget_stop_waits_for_soft_budget_then_sentence_end():
+    stop = caption_engine.SentenceBudgetStop(prompt_len=3, soft_tokens=2, end_ids=torch.tensor([2, 4]))
+    prompt = [9, 9, 9]
+    early = torch.tensor([prompt + [2], prompt + [4]])
+    assert stop(early, None).tolist() == [False, False]  # Under the soft budget
+    late = torch.tensor([prompt + [1, 2], prompt + [2, 1], prompt + [1, 4]])
+    assert stop(late, None).tolist() == [True, False, True]
+
+def test_default_budget_is_what_limits_generation():
+    limits = caption_engine.CaptionLimits()
+    assert limits.max_new_tokens < caption_engine.MAX_NEW_TOKENS
+    assert caption_engine.CaptionLimits(token_budget=10_000).token_budget == caption_engine.TEXT_ENCODER_TOKEN_BUDGET
+
+def test_trim_drops_half_sentence_and_fits_budget():
+    processor = FakeProcessor()
+    per_word = caption_engine.T5_TOKENS_PER_QWEN_TOKEN
+
+    limits = caption_engine.CaptionLimits(token_budget=100)
+    assert limits.trim(processor, "ohwx in a park. She wears a red") == "ohwx in a park."
+    assert limits.trim(processor, "  ohwx in a park  ") == "ohwx in a park"  # Lone fragment kept
+
+    # Three 4-word sentences; a budget for ~9 words keeps the first two
+    limits = caption_engine.CaptionLimits(token_budget=int(9 * per_word))
+    text = "ohwx in a park. Trees are very green. The light is soft."
+    assert limits.trim(processor, text) == "ohwx in a park. Trees are very green."
+    limits = caption_engine.CaptionLimits(token_budget=1)
+    assert limits.trim(processor, text) == "ohwx in a park."  # Never below one sentence
+
+# A randomly initialised two-layer Qwen2.5-VL: small enough for CPU, real
+# enough to check the cached-prefix path against plain generate token by token.
+# Large weights and a fast RoPE make a wrong position show up in the tokens.
+VISION_START, IMAGE_TOKEN, VISION_END = 60, 61, 62
+
+def tiny_qwen():
+    transformers = pytest.importorskip("transformers")
+    config = transformers.Qwen2_5_VLConfig(
+        text_config=dict(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=256,
+                         rope_scaling={"type": "mrope", "mrope_section": [1, 1, 2]}, rope_theta=10.0,
+                         initializer_range=0.5, pad_token_id=0, bos_token_id=None, eos_token_id=None),
+        vision_config=dict(depth=1, hidden_size=32, intermediate_size=64, num_heads=2, out_hidden_size=32,
+                           patch_size=14, spatial_merge_size=2, temporal_patch_size=2, window_size=56,
+                           fullatt_block_indexes=[0]),
+        vision_start_token_id=VISION_START, image_token_id=IMAGE_TOKEN, vision_end_token_id=VISION_END,
+        pad_token_id=0,
+    )
+    torch.manual_seed(0)
+    return transformers.Qwen2_5_VLForConditionalGeneration(config).eval()
+
+def tiny_encoding(model, prefix, grid_h, grid_w, tail):
+    ids = torch.tensor([prefix + [VISION_START] + [IMAGE_TOKEN] * (grid_h * grid_w // 4) + [VISION_END] + tail])
+    enc = FakeEncoding(
+        input_ids=ids,
+        pixel_values=torch.randn(grid_h * grid_w, 3 * 2 * 14 * 14),
+        image_grid_thw=torch.tensor([[1, grid_h, grid_w]]),
+    )
+    enc.update(caption_engine.rope_index_kwargs(model, ids))  # As the processor returns them
+    return enc
+
+def test_prefix_cache_matches_plain_generate():
+    model = tiny_qwen()
+    processor = FakeProcessor()
+    limits = caption_engine.CaptionLimits(max_new_tokens=8)
+    prefix_cache = caption_engine.PrefixCache(model)
+    assert prefix_cache.enabled
+    prefix = [5, 6, 7, 8, 9]
+
+    # Different image grids and answer prompts: the suffixes are ragged
+    batches = [
+        [tiny_encoding(model, prefix, 4, 4, [10, 11]), tiny_encoding(model, prefix, 4, 8, [10, 11, 12])],
+        [tiny_encoding(model, prefix, 8, 4, [13]), tiny_encoding(model, prefix, 4, 4, [10, 11]),
+         tiny_encoding(model, prefix, 8, 8, [14, 15])],
+        [tiny_encoding(model, prefix, 4, 8, [10])],
+    ]
+    for encodings in batches:
+        inputs = caption_engine.pad_left(encodings, 0, model.device)
+        with torch.inference_mode():
+            plain = model.generate(**inputs, max_new_tokens=8, do_sample=False)[:, inputs['input_ids'].shape[1]:]
+        cached = caption_engine.generate_with_prefix(model, processor, prefix_cache, encodings, limits)
+        assert torch.equal(cached, plain)
+    assert prefix_cache.ids.tolist() == [prefix]
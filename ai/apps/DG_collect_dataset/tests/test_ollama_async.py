@@ -0,0 +1,115 @@
+import io
+import base64
+import asyncio
+from collections import Counter
+from PIL import Image
+from aiohttp import web
+
+import ollama_async
+
+# A local stand-in for Ollama's /api/chat. Each test image has a distinct
+# width, which the stub reads back from the uploaded JPEG to decide how to
+# answer and to count attempts per image.
+
+class StubOllama:
+    def __init__(self, flaky=(), broken=(), down=(), delay=0.05):
+        self.flaky, self.broken, self.down = set(flaky), set(broken), set(down)
+        self.delay = delay
+        self.attempts = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_side_seen = 0
+
+    async def chat(self, request):
+        data = await request.json()
+        with Image.open(io.BytesIO(base64.b64decode(data["messages"][0]["images"][0]))) as img:
+            width, height = img.size
+        self.max_side_seen = max(self.max_side_seen, width, height)
+        key = width
+        self.attempts[key] += 1
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        if key in self.broken: return web.json_response({"error": "bad request"}, status=400)
+        if key in self.down: return web.json_response({"error": "overloaded"}, status=500)
+        if key in self.flaky and self.attempts[key] == 1: return web.json_response({"error": "busy"}, status=503)
+        return web.json_response({"message": {"role": "assistant", "content": f"caption\n{key}"}})
+
+async def run_against_stub(stub, paths, **kwargs):
+    app = web.Application()
+    app.router.add_post("/api/chat", stub.chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    captions, errors = {}, {}
+    try:
+        stats = await ollama_async.caption_files_async(
+            paths, "describe", on_caption=lambda p, c: captions.__setitem__(p, c),
+            on_error=lambda p, e: errors.__setitem__(p, e),
+            host=f"http://127.0.0.1:{port}", backoff=0.01, **kwargs,
+        )
+    finally:
+        await runner.cleanup()
+    return stats, captions, errors
+
+def make_images(tmp_path, widths, height=64):
+    paths = []
+    for w in widths:
+        p = tmp_path / f"img_{w}.png"
+        Image.new("RGB", (w, height), (w % 256, 0, 0)).save(p)
+        paths.append(p)
+    return paths
+
+def test_keeps_max_in_flight_requests(tmp_path):
+    paths = make_images(tmp_path, range(100, 120))
+    stub = StubOllama(delay=0.05)
+    stats, captions, errors = asyncio.run(run_against_stub(stub, paths, max_in_flight=3))
+
+    assert stats == {'done': 20, 'failed': 0}
+    assert not errors
+    assert stub.max_in_flight == 3
+    # Newlines folded, each caption belongs to its own image
+    assert all(captions[p] == f"caption {p.stem.split('_')[1]}" for p in paths)
+
+def test_transient_errors_are_retried(tmp_path):
+    paths = make_images(tmp_path, [100, 101, 102])
+    stub = StubOllama(flaky=[101])
+    stats, captions, errors = asyncio.run(run_against_stub(stub, paths, max_in_flight=2))
+
+    assert stats == {'done': 3, 'failed': 0}
+    assert stub.attempts[101] == 2
+    assert stub.attempts[100] == 1
+
+def test_errors_reach_the_callback(tmp_path):
+    paths = make_images(tmp_path, [100, 101, 102])
+    stub = StubOllama(broken=[101], down=[102])
+    stats, captions, errors = asyncio.run(run_against_stub(stub, paths, max_in_flight=2, retries=2))
+
+    assert stats == {'done': 1, 'failed': 2}
+    assert set(captions) == {paths[0]}
+    assert set(errors) == {paths[1], paths[2]}
+    assert stub.attempts[101] == 1      # 4xx: not retried
+    assert stub.attempts[102] == 3      # 5xx: first try + 2 retries
+
+def test_timeout_is_an_error(tmp_path):
+    paths = make_images(tmp_path, [100])
+    stub = StubOllama(delay=1.0)
+    stats, captions, errors = asyncio.run(run_against_stub(stub, paths, timeout=0.1, retries=1))
+
+    assert stats == {'done': 0, 'failed': 1}
+    assert isinstance(errors[paths[0]], asyncio.TimeoutError)
+    assert stub.attempts[100] == 2
+
+def test_images_are_downscaled_before_upload(tmp_path):
+    paths = make_images(tmp_path, [2000], height=1000)
+    stub = StubOllama()
+    asyncio.run(run_against_stub(stub, paths, max_side=256))
+    assert stub.max_side_seen == 256
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import utils
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, os.path.abspath(APP_DIR))
+import DG_collect_dataset
+
+def test_run_keeps_unrelated_config_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "LINUX_PROJECTS_ROOT", tmp_path)
+    utils.save_config("ed", {'trigger': "old", 'caption_device': "cpu", 'quality': {'min_side': 512}})
+
+    # Step 9 does not exist: only the config write runs
+    DG_collect_dataset.run_pipeline("ed", 50, 40, 'f', "ohwx", "qwen-vl", only_step="9")
+
+    config = utils.load_config("ed")
+    assert config['caption_device'] == "cpu"
+    assert config['quality'] == {'min_side': 512}
+    assert (config['trigger'], config['gender'], config['limit'], config['count']) == ("ohwx", 'f', 50, 40)
@@ -0,0 +1,36 @@
+import publish_manifest
+
+def publish(dest, items):
+    plan = publish_manifest.PublishPlan(dest, {n: [text] for n, text in items.items()})
+    for n in plan.todo: (plan.staging / n).write_text(items[n])
+    return plan, plan.commit()
+
+def test_commit_swaps_in_new_version(tmp_path):
+    dest = tmp_path / "256"
+    publish(dest, {"a.txt": "one", "b.txt": "two"})
+    plan, ok = publish(dest, {"a.txt": "one", "c.txt": "three"})
+
+    assert ok
+    assert sorted(p.name for p in dest.iterdir()) == ["_publish_manifest.json", "a.txt", "c.txt"]
+    assert plan.changes == {'added': ["c.txt"], 'changed': [], 'removed': ["b.txt"]}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["256"]
+
+def test_rename_exchange_swaps_directories(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir(); b.mkdir()
+    (a / "x").write_text("a")
+    if not publish_manifest.rename_exchange(a, b): return  # Not supported here
+    assert (b / "x").read_text() == "a"
+    assert not (a / "x").exists()
+
+def test_interrupted_swap_is_recovered(tmp_path):
+    dest = tmp_path / "256"
+    publish(dest, {"a.txt": "one"})
+    # Crash between the fallback's two renames: only <dest>.old is left
+    dest.rename(tmp_path / "256.old")
+    plan, ok = publish(dest, {"a.txt": "one"})
+
+    assert ok
+    assert plan.reused == ["a.txt"]
+    assert (dest / "a.txt").read_text() == "one"
+    assert not (tmp_path / "256.old").exists()
@@ -0,0 +1,19 @@
+from PIL import Image
+
+import pyramid
+
+def test_default_backend_is_lanczos():
+    assert pyramid.DEFAULT_BACKEND == "lanczos"
+    assert pyramid.backend_for({}) == "lanczos"
+    assert pyramid.backend_for({'resample_backend': "reduce"}) == "reduce"
+
+def test_pad_false_stretches_instead_of_padding(tmp_path):
+    src = tmp_path / "wide.png"
+    Image.new("RGB", (400, 200), (200, 200, 200)).save(src)
+
+    padded = pyramid.render_levels(src, [128])[128]
+    stretched = pyramid.render_levels(src, [128], pad=False)[128]
+
+    assert padded.size == stretched.size == (128, 128)
+    assert padded.getpixel((64, 2)) == (0, 0, 0)          # Black bar above the content
+    assert stretched.getpixel((64, 2)) == (200, 200, 200)  # Content fills the square
@@ -1,39 +1,100 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
+import hashlib
 import shutil
+import sqlite3
 import subprocess
 from pathlib import Path
 
 # CONFIG
 ROOT = Path(__file__).resolve().parent
 OVERSEER_FILE = ROOT / "overseer" / "overseer.txt"
+OVERSEER_TMP = OVERSEER_FILE.with_suffix(".tmp")
 MODULES_DIR = ROOT / "modules"
 LOCAL_REPO = Path("/mnt/c/Users/seanf/Documents/GitHub/deadlygraphics")
+MANIFEST_CACHE = ROOT / "logs" / "manifest_cache.sqlite3"
+SKIP_DIRS = {"logs", "__pycache__", ".git", "apps_managed"}
+SNIFF_BYTES = 8192  # A NUL byte in here marks a file as binary
 
 # UTILS
 def run(cmd, cwd=None):
     print(f"[DEBUG] RUN: {cmd}")
     subprocess.run(cmd, cwd=cwd, text=True, check=False)
 
+def file_digest(p):
+    h = hashlib.sha1()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    return h.hexdigest()
+
+def same_file(src, dest):
+    # Size + mtime first (copy2 carries mtime over); content hash only when
+    # those disagree, e.g. after a checkout touched the mirror
+    try: d = dest.stat()
+    except OSError: return False
+    s = src.stat()
+    if s.st_size != d.st_size: return False
+    if abs(s.st_mtime_ns - d.st_mtime_ns) < 1000: return True  # NTFS keeps 100ns ticks
+    if file_digest(src) != file_digest(dest): return False
+    shutil.copystat(src, dest)  # Same bytes: align mtime so the next sync is cheap
+    return True
+
+def mirror_tree(src_root, dest_root):
+    # -> ([copied], [deleted]) paths under dest_root; unchanged files untouched
+    copied, deleted = [], []
+    # SKIP_DIRS only apply at the top level, as they always have for the mirror
+    for dirpath, dirnames, filenames in os.walk(src_root):
+        rel_dir = Path(dirpath).relative_to(src_root)
+        if not rel_dir.parts: dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for name in filenames:
+            src, dest = Path(dirpath) / name, dest_root / rel_dir / name
+            if same_file(src, dest): continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dest)
+            copied.append(dest)
+    for dirpath, dirnames, filenames in os.walk(dest_root, topdown=False):
+        rel_dir = Path(dirpath).relative_to(dest_root)
+        if rel_dir.parts and rel_dir.parts[0] in SKIP_DIRS: continue
+        for name in filenames:
+            if not (src_root / rel_dir / name).exists():
+                os.remove(Path(dirpath) / name)
+                deleted.append(Path(dirpath) / name)
+        if rel_dir.parts and not os.listdir(dirpath) and not (src_root / rel_dir).exists(): os.rmdir(dirpath)
+    return copied, deleted
+
 def sync_to_github(message):
     print("[SYNC] Syncing local vibecoder -> GitHub mirror...")
-    # Copy files
-    for item in ROOT.iterdir():
-        if item.name in ["logs", "__pycache__", ".git", "apps_managed"]: continue
-        dest = LOCAL_REPO / "ai/apps/DG_vibecoder" / item.name
-        if item.is_dir():
-            if dest.exists(): shutil.rmtree(dest)
-            shutil.copytree(item, dest)
-        else:
-            shutil.copy2(item, dest)
-    
-    # Push
-    run(["git", "add", "."], cwd=LOCAL_REPO)
-    run(["git", "commit", "-m", message], cwd=LOCAL_REPO)
+    start = time.time()
+    copied, deleted = mirror_tree(ROOT, LOCAL_REPO / "ai/apps/DG_vibecoder")
+    print(f"[SYNC] {len(copied)} copied, {len(deleted)} deleted in {time.time() - start:.2f}s")
+    if copied or deleted:
+        # Stage only what the sync touched (deletions included). Literal, NUL
+        # separated pathspecs: names with * ? [ or quotes are taken as is.
+        paths = "\0".join(str(p.relative_to(LOCAL_REPO)) for p in copied + deleted)
+        print(f"[DEBUG] RUN: git add -A --pathspec-from-file=- ({len(copied) + len(deleted)} paths)")
+        subprocess.run(["git", "--literal-pathspecs", "add", "-A", "--pathspec-from-file=-", "--pathspec-file-nul"],
+                       cwd=LOCAL_REPO, input=paths, text=True, check=False)
+        run(["git", "commit", "-m", message], cwd=LOCAL_REPO)
+    else:
+        print("[SYNC] Mirror already up to date, nothing to commit.")
+
+    # Push whenever main is ahead of origin, so commits left by an earlier
+    # failed push still go out
+    if not unpushed_commits():
+        print("[SYNC] Nothing to push.")
+        return
     run(["git", "push", "origin", "main"], cwd=LOCAL_REPO)
     print("[SYNC] Git push complete.")
 
+def unpushed_commits():
+    # True when main has commits origin/main lacks (or origin/main is unknown)
+    r = subprocess.run(["git", "rev-list", "--count", "origin/main..main"],
+                       cwd=LOCAL_REPO, capture_output=True, text=True, check=False)
+    if r.returncode != 0: return True
+    return int(r.stdout.strip() or 0) > 0
+
 # LOGIC
 def parse_patch_blocks(text):
     blocks = []
@@ -60,17 +121,64 @@ def implement_patches():
         target.write_text("\n".join(patch["content"]), encoding="utf-8")
     sync_to_github("Vibecoder auto-sync (implement)")
 
+def iter_manifest_files(folder=ROOT):
+    # Depth-first in name order (same order as sorted(rglob)), holding one
+    # directory listing per level instead of the whole tree
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in SKIP_DIRS: yield from iter_manifest_files(entry.path)
+        elif entry.is_file(follow_symlinks=False) and Path(entry.path) not in (OVERSEER_FILE, OVERSEER_TMP):
+            yield Path(entry.path)
+
+def read_manifest_text(p):
+    # -> text, or None for binaries (NUL in the header, or not valid UTF-8)
+    with open(p, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+        if b"\0" in head: return None
+        data = head + f.read()
+    try: text = data.decode("utf-8")
+    except UnicodeDecodeError: return None
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+def open_manifest_cache():
+    MANIFEST_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(MANIFEST_CACHE)
+    db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, text TEXT, seen INTEGER)")
+    return db
+
 def generate_manifest():
-    lines = ["=== OVERSEER MANIFEST START ===\n"]
-    for p in sorted(ROOT.rglob("*")):
-        if p.is_dir() or "overseer.txt" in str(p) or "apps_managed" in str(p): continue
-        rel = p.relative_to(ROOT)
-        try: text = p.read_text(encoding="utf-8")
-        except: text = "<BINARY FILE>"
-        lines.append(f"=== FILE START: {rel} ===\n{text}\n=== FILE END: {rel} ===\n")
-    lines.append("=== OVERSEER MANIFEST END ===\n")
+    # Streams the dump to disk one file at a time. Contents are cached in
+    # SQLite by (mtime, size), so an unchanged file is never read again.
+    start = time.time()
     (ROOT / "overseer").mkdir(exist_ok=True)
-    OVERSEER_FILE.write_text("\n".join(lines), encoding="utf-8")
+    db = open_manifest_cache()
+    run_id = int(start * 1000)
+    total = reads = 0
+    with open(OVERSEER_TMP, "w", encoding="utf-8") as out:
+        out.write("=== OVERSEER MANIFEST START ===\n")
+        for p in iter_manifest_files():
+            rel = p.relative_to(ROOT)
+            try: st = p.stat()
+            except OSError: continue
+            row = db.execute("SELECT mtime_ns, size, text FROM files WHERE path = ?", (str(rel),)).fetchone()
+            if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+                text = row[2]
+                db.execute("UPDATE files SET seen = ? WHERE path = ?", (run_id, str(rel)))
+            else:
+                try: text = read_manifest_text(p)
+                except OSError: continue
+                reads += 1
+                db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                           (str(rel), st.st_mtime_ns, st.st_size, text, run_id))
+            if text is None: text = "<BINARY FILE>"
+            out.write(f"\n=== FILE START: {rel} ===\n{text}\n=== FILE END: {rel} ===\n")
+            total += 1
+        out.write("\n=== OVERSEER MANIFEST END ===\n")
+    db.execute("DELETE FROM files WHERE seen != ?", (run_id,))
+    db.commit()
+    db.close()
+    os.replace(OVERSEER_TMP, OVERSEER_FILE)
+    print(f"[INFO] Manifest: {total} files ({reads} read, {total - reads} cached) in {time.time() - start:.2f}s")
     sync_to_github("Vibecoder auto-sync (dump)")
 
 # MAIN
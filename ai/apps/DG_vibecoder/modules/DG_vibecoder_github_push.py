@@ -2,8 +2,14 @@
 import os
 import sys
 import json
+import time
+import zlib
+import difflib
+import hashlib
+import shutil
 import subprocess
 from pathlib import Path
+from collections import defaultdict
 from datetime import datetime
 
 # ============================================================
@@ -13,6 +19,14 @@ from datetime import datetime
 CREDENTIALS_FILE = "/mnt/c/credentials/credentials.json"
 INCLUDE_EXT = {".py", ".txt", ".md", ".toml", ".bat", ".sh"}
 EXCLUDE_DIRS = {"logs", ".git", "__pycache__"}
+STATE_FILE_NAME = "overseer_state.json"   # logs/: content hashes of the last snapshot
+CHARS_PER_TOKEN = 4                       # Estimate when tiktoken isn't installed
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
 
 
 # ============================================================
@@ -135,19 +149,21 @@ def read_file(path: Path) -> str:
         return f"<< ERROR READING FILE {path}: {e} >>"
 
 
-def build_overseer_dump(target_folder: Path) -> str:
+def estimate_tokens(text: str) -> int:
     """
-    Build a snapshot string of all code/text files in target_folder.
+    Token count via tiktoken when available, otherwise ~4 chars per token.
     """
-    lines = []
-    lines.append("=== OVERSEER SNAPSHOT ===")
-    lines.append(f"generated={datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    lines.append(f"target_folder={target_folder}")
-    lines.append("")
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
 
-    lines.append("=== FILES ===")
 
-    file_count = 0
+def collect_snapshot_files(target_folder: Path) -> list:
+    """
+    All code/text files in target_folder, in walk order.
+    Returns dicts with rel, content, hash and mtime.
+    """
+    entries = []
     for root, dirs, files in os.walk(target_folder):
         # prune excluded dirs
         dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
@@ -158,30 +174,143 @@ def build_overseer_dump(target_folder: Path) -> str:
                 continue
 
             abs_path = Path(root) / fname
-            rel_path = abs_path.relative_to(target_folder)
-
             content = read_file(abs_path)
-            file_count += 1
+            entries.append({
+                "rel": str(abs_path.relative_to(target_folder)),
+                "content": content,
+                "hash": hashlib.sha1(content.encode("utf-8")).hexdigest(),
+                "mtime": abs_path.stat().st_mtime,
+            })
+    return entries
+
+
+def format_file_block(rel_path: str, content: str) -> str:
+    return "\n".join([
+        f"=== FILE START: {rel_path} ===",
+        "<CONTENT>",
+        content,
+        "</CONTENT>",
+        "=== FILE END ===",
+        "",
+    ])
+
+
+def format_snapshot(target_folder: Path, blocks: list, header_extra=(), summary_extra=(), generated=None) -> str:
+    lines = []
+    lines.append("=== OVERSEER SNAPSHOT ===")
+    lines.append(f"generated={generated or datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"target_folder={target_folder}")
+    lines.extend(header_extra)
+    lines.append("")
 
-            lines.append(f"=== FILE START: {rel_path} ===")
-            lines.append("<CONTENT>")
-            lines.append(content)
-            lines.append("</CONTENT>")
-            lines.append("=== FILE END ===")
-            lines.append("")
+    lines.append("=== FILES ===")
+    lines.extend(blocks)
 
     lines.append("=== SUMMARY ===")
-    lines.append(f"total_files={file_count}")
+    lines.append(f"total_files={len(blocks)}")
+    lines.extend(summary_extra)
     lines.append("")
     return "\n".join(lines)
 
 
-def run_overseer_dump():
+def build_overseer_dump(target_folder: Path) -> str:
+    """
+    Build a snapshot string of all code/text files in target_folder.
+    """
+    blocks = [format_file_block(e["rel"], e["content"]) for e in collect_snapshot_files(target_folder)]
+    return format_snapshot(target_folder, blocks)
+
+
+def load_snapshot_state(logs_root: Path) -> dict:
+    path = logs_root / STATE_FILE_NAME
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_snapshot_state(logs_root: Path, entries: list, generated: str):
+    path = logs_root / STATE_FILE_NAME
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"generated": generated, "files": {e["rel"]: e["hash"] for e in entries}}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def order_by_relevance(entries: list, previous: dict) -> list:
+    """
+    Changed/new files first, then most recently modified, then smallest.
+    """
+    return sorted(entries, key=lambda e: (
+        previous.get(e["rel"]) == e["hash"],
+        -e["mtime"],
+        len(e["content"]),
+    ))
+
+
+def chunk_by_budget(entries: list, budget: int) -> list:
+    """
+    Greedy split of file blocks into chunks of at most `budget` tokens
+    (relevance order kept). A single file over budget gets its own chunk.
+    """
+    chunks, current, used = [], [], 0
+    for e in entries:
+        block = format_file_block(e["rel"], e["content"])
+        tokens = estimate_tokens(block)
+        if current and budget and used + tokens > budget:
+            chunks.append((current, used))
+            current, used = [], 0
+        current.append(block)
+        used += tokens
+    if current or not chunks:
+        chunks.append((current, used))
+    return chunks
+
+
+def build_overseer_chunks(target_folder: Path, logs_root: Path, delta: bool = False, budget: int = None):
+    """
+    Snapshot texts for one dump, plus the entries to save as the new state.
+    delta: only files whose content hash changed since the last snapshot
+    (removed files are listed). budget: max estimated tokens per chunk.
+    """
+    state = load_snapshot_state(logs_root)
+    previous = state.get("files", {})
+    entries = collect_snapshot_files(target_folder)
+
+    selected = entries
+    header_extra = [f"mode={'delta' if delta else 'full'}"]
+    if delta:
+        selected = [e for e in entries if previous.get(e["rel"]) != e["hash"]]
+        current = {e["rel"] for e in entries}
+        removed = sorted(rel for rel in previous if rel not in current)
+        header_extra.append(f"since={state.get('generated', 'never')}")
+        header_extra.append(f"unchanged_files={len(entries) - len(selected)}")
+        if removed:
+            header_extra.append("removed_files=" + ", ".join(removed))
+
+    chunks = chunk_by_budget(order_by_relevance(selected, previous), budget)
+    texts = []
+    for i, (blocks, tokens) in enumerate(chunks, 1):
+        summary_extra = [f"estimated_tokens={tokens}"]
+        if len(chunks) > 1:
+            summary_extra.append(f"chunk={i}/{len(chunks)}")
+        texts.append(format_snapshot(target_folder, blocks, header_extra, summary_extra))
+    return texts, entries
+
+
+def run_overseer_dump(delta: bool = False, budget: int = None):
     """
     MARCO:
-      - Create per-timestamp snapshot (overseer_adjust.txt + history copy).
+      - Record the snapshot in logs/history (deduplicated blobs + index).
       - Overwrite logs/overseer_response.txt with the latest snapshot
         plus instructions for the LLM to add PATCH blocks.
+      - delta: only files changed since the last snapshot.
+      - budget: split into chunks of at most this many estimated tokens,
+        most relevant first; chunk 1 goes in the working doc, the rest in
+        logs/overseer_response_partN.txt.
     """
     print("=================================================")
     print("=== DG_vibecoder — OVERSEER DUMP MODE (v3.0) ====")
@@ -190,26 +319,25 @@ def run_overseer_dump():
     root_folder = Path(__file__).resolve().parent
     print(f"[INFO] Snapshotting folder: {root_folder}")
 
-    # Build snapshot text
-    snapshot_text = build_overseer_dump(root_folder)
-
-    # 1) Per-timestamp logs (history)
     logs_root = root_folder / "logs"
     logs_root.mkdir(exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_dir = logs_root / timestamp
-    history_dir = log_dir / "history"
-    history_dir.mkdir(parents=True, exist_ok=True)
-
-    adjust_path = log_dir / "overseer_adjust.txt"
-    history_adjust_path = history_dir / "overseer_adjust.txt"
+    # Build snapshot text (one or more budget-sized chunks)
+    chunks, entries = build_overseer_chunks(root_folder, logs_root, delta, budget)
+    snapshot_text = chunks[0]
+    full_text = "\n".join(chunks)
+    tokenizer = "tiktoken" if _ENCODING is not None else f"~{CHARS_PER_TOKEN} chars/token"
+    print(f"[INFO] {'Delta' if delta else 'Full'} snapshot: {len(chunks)} chunk(s), "
+          f"~{estimate_tokens(full_text)} tokens ({tokenizer})")
 
-    adjust_path.write_text(snapshot_text, encoding="utf-8")
-    history_adjust_path.write_text(snapshot_text, encoding="utf-8")
+    # 1) History: deduplicated file blobs + a small per-snapshot index
+    index_path, new_blobs = save_history_snapshot(
+        logs_root, datetime.now().strftime("%Y%m%d_%H%M%S"), root_folder, entries)
+    timestamp = index_path.stem
 
-    print(f"[SUCCESS] Overseer adjust dump created at: {adjust_path}")
-    print(f"[INFO] History copy saved at: {history_adjust_path}")
+    print(f"[SUCCESS] Overseer snapshot {timestamp} recorded: {index_path}")
+    print(f"[INFO] History: {new_blobs} new blob(s), {len(entries) - new_blobs} reused. "
+          f"Reconstruct with: overseer-history restore {timestamp}")
 
     # 2) Persistent working document at logs/overseer_response.txt
     working_doc_path = logs_root / "overseer_response.txt"
@@ -246,6 +374,17 @@ def run_overseer_dump():
     working_doc_path.write_text(response_template, encoding="utf-8")
     print(f"[INFO] Working doc updated: {working_doc_path}")
 
+    # Remaining chunks, replacing any from the previous dump
+    for old_part in logs_root.glob("overseer_response_part*.txt"):
+        old_part.unlink()
+    for i, chunk in enumerate(chunks[1:], 2):
+        part_path = logs_root / f"overseer_response_part{i}.txt"
+        part_path.write_text(chunk, encoding="utf-8")
+        print(f"[INFO] Chunk {i}/{len(chunks)} written: {part_path}")
+
+    # This snapshot is the baseline for the next delta
+    save_snapshot_state(logs_root, entries, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
     print("")
     print("Next steps:")
     print("  1) Open logs/overseer_response.txt and paste its content to ChatGPT.")
@@ -255,6 +394,157 @@ def run_overseer_dump():
     print("=================================================")
 
 
+# ============================================================
+# OVERSEER: HISTORY STORE
+# ============================================================
+# logs/history/objects/ab/cdef...   zlib-compressed file contents, named by
+#                                   the sha1 of the text (stored once)
+# logs/history/snapshots/<ts>.json  {file: sha1} index for one snapshot
+#                                   (<ts>_1.json, ... for same-second ones)
+# Disk use grows only with file versions never seen before.
+
+HISTORY_DIR_NAME = "history"
+
+
+def history_root(logs_root: Path) -> Path:
+    return logs_root / HISTORY_DIR_NAME
+
+
+def blob_path(logs_root: Path, digest: str) -> Path:
+    return history_root(logs_root) / "objects" / digest[:2] / digest[2:]
+
+
+def write_blob(logs_root: Path, digest: str, content: str) -> bool:
+    """
+    Store content under its digest. Returns False if it was already stored.
+    """
+    path = blob_path(logs_root, digest)
+    if path.exists():
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(zlib.compress(content.encode("utf-8"), 6))
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_blob(logs_root: Path, digest: str) -> str:
+    return zlib.decompress(blob_path(logs_root, digest).read_bytes()).decode("utf-8")
+
+
+def save_history_snapshot(logs_root: Path, timestamp: str, target_folder: Path, entries: list):
+    """
+    Record a snapshot of every collected file (delta dumps included).
+    Same-second snapshots get a _1, _2... suffix instead of overwriting.
+    Returns (index path, number of new blobs written); the snapshot id is
+    the index path's stem.
+    """
+    new_blobs = sum(write_blob(logs_root, e["hash"], e["content"]) for e in entries)
+    snapshots_dir = history_root(logs_root) / "snapshots"
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    index_path = snapshots_dir / f"{timestamp}.json"
+    suffix = 0
+    while index_path.exists():
+        suffix += 1
+        index_path = snapshots_dir / f"{timestamp}_{suffix}.json"
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "generated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "target_folder": str(target_folder),
+                "files": {e["rel"]: e["hash"] for e in entries},
+            }, f, indent=2)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return index_path, new_blobs
+
+
+def list_history_snapshots(logs_root: Path) -> list:
+    snapshots_dir = history_root(logs_root) / "snapshots"
+    if not snapshots_dir.exists():
+        return []
+    return sorted(p.stem for p in snapshots_dir.glob("*.json"))
+
+
+def load_history_snapshot(logs_root: Path, timestamp: str) -> dict:
+    path = history_root(logs_root) / "snapshots" / f"{timestamp}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"No snapshot {timestamp} in {path.parent}")
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def restore_history_snapshot(logs_root: Path, timestamp: str) -> str:
+    """
+    Rebuild the full snapshot text (same format as overseer-dump).
+    """
+    index = load_history_snapshot(logs_root, timestamp)
+    blocks = [format_file_block(rel, read_blob(logs_root, digest)) for rel, digest in index["files"].items()]
+    return format_snapshot(index["target_folder"], blocks, [f"restored_from={timestamp}"],
+                           generated=index["generated"])
+
+
+def diff_history_snapshots(logs_root: Path, old_ts: str, new_ts: str) -> str:
+    """
+    Unified diff of every file that differs between two snapshots.
+    """
+    old_files = load_history_snapshot(logs_root, old_ts)["files"]
+    new_files = load_history_snapshot(logs_root, new_ts)["files"]
+    out = []
+    for rel in sorted(set(old_files) | set(new_files)):
+        a, b = old_files.get(rel), new_files.get(rel)
+        if a == b:
+            continue
+        a_lines = read_blob(logs_root, a).splitlines(keepends=True) if a else []
+        b_lines = read_blob(logs_root, b).splitlines(keepends=True) if b else []
+        for line in difflib.unified_diff(
+            a_lines, b_lines,
+            fromfile=f"{old_ts}/{rel}" if a else "/dev/null",
+            tofile=f"{new_ts}/{rel}" if b else "/dev/null",
+        ):
+            # Last lines without a newline would run into the next one
+            out.append(line if line.endswith("\n") else line + "\n")
+    return "".join(out)
+
+
+def run_overseer_history(args: list):
+    """
+    overseer-history list
+    overseer-history restore <ts> [out_file]
+    overseer-history diff <old_ts> [<new_ts>]   (new defaults to the latest)
+    """
+    logs_root = Path(__file__).resolve().parent / "logs"
+    snapshots = list_history_snapshots(logs_root)
+    action = args[0].lower() if args else "list"
+
+    if action == "list":
+        if not snapshots:
+            print("[INFO] No snapshots recorded yet.")
+        for ts in snapshots:
+            print(f"{ts}  ({len(load_history_snapshot(logs_root, ts)['files'])} files)")
+        return
+
+    try:
+        if action == "restore" and len(args) >= 2:
+            text = restore_history_snapshot(logs_root, args[1])
+            if len(args) >= 3:
+                Path(args[2]).write_text(text, encoding="utf-8")
+                print(f"[OK] Snapshot {args[1]} restored to: {args[2]}")
+            else:
+                sys.stdout.write(text)
+        elif action == "diff" and len(args) >= 2:
+            new_ts = args[2] if len(args) >= 3 else (snapshots[-1] if snapshots else args[1])
+            diff = diff_history_snapshots(logs_root, args[1], new_ts)
+            sys.stdout.write(diff if diff else f"[INFO] No differences between {args[1]} and {new_ts}.\n")
+        else:
+            print("[ERROR] Usage: overseer-history [list | restore <ts> [out_file] | diff <old_ts> [<new_ts>]]")
+    except FileNotFoundError as e:
+        print(f"[ERROR] {e}")
+
+
 # ============================================================
 # OVERSEER: PATCH PARSING & APPLY (POLO)
 # ============================================================
@@ -269,38 +559,52 @@ class Patch:
         self.insert_text = ""
 
 
+PATCH_SECTIONS = {
+    "FIND:": ("FIND", "replace"),
+    "REPLACE:": ("REPLACE", None),
+    "INSERT_AFTER:": ("INSERT_AFTER", "insert_after"),
+    "INSERT_TEXT:": ("INSERT_TEXT", None),
+}
+SECTION_FIELDS = {
+    "FIND": "find_text",
+    "REPLACE": "replace_text",
+    "INSERT_AFTER": "insert_after",
+    "INSERT_TEXT": "insert_text",
+}
+
+
 def parse_patches(response_text: str):
     """
-    Parse all PATCH START/END blocks from a large working document.
+    Parse all PATCH START/END blocks from a large working document in one
+    pass. Section lines are collected in lists and joined once per patch.
     Returns a list of Patch objects.
     """
     patches = []
-    lines = response_text.splitlines()
-
     current = None
     state = None  # None, "FIND", "REPLACE", "INSERT_AFTER", "INSERT_TEXT"
+    sections = {}
 
-    for raw in lines:
-        line = raw.rstrip("\n")
+    def finish():
+        # A repeated section header starts that section over, as before
+        for name, lines in sections.items():
+            setattr(current, SECTION_FIELDS[name], "\n".join(lines).rstrip("\n"))
 
+    for line in response_text.splitlines():
         if line.startswith("=== PATCH START:"):
-            # Extract raw filename
-            file_rel_raw = line[len("=== PATCH START:"):].strip()
-
-            # Remove trailing "===" or any '=' clutter
-            if file_rel_raw.endswith("==="):
-                file_rel_raw = file_rel_raw[:-3].rstrip()
-            while file_rel_raw.endswith("="):
-                file_rel_raw = file_rel_raw[:-1].rstrip()
-
-            file_rel_raw = file_rel_raw.strip()
+            if current is not None:
+                finish()
+            # Extract raw filename, dropping trailing "===" / '=' clutter
+            file_rel_raw = line[len("=== PATCH START:"):].strip().rstrip("= \t")
 
             current = Patch(file_rel_raw)
             patches.append(current)
             state = None
+            sections = {}
             continue
 
         if line.startswith("=== PATCH END"):
+            if current is not None:
+                finish()
             current = None
             state = None
             continue
@@ -308,83 +612,87 @@ def parse_patches(response_text: str):
         if current is None:
             continue
 
-        if line.strip() == "FIND:":
-            current.mode = "replace"
-            state = "FIND"
-            current.find_text = ""
-            continue
-
-        if line.strip() == "REPLACE:":
-            state = "REPLACE"
-            current.replace_text = ""
-            continue
-
-        if line.strip() == "INSERT_AFTER:":
-            current.mode = "insert_after"
-            state = "INSERT_AFTER"
-            current.insert_after = ""
-            continue
-
-        if line.strip() == "INSERT_TEXT:":
-            state = "INSERT_TEXT"
-            current.insert_text = ""
+        header = PATCH_SECTIONS.get(line.strip())
+        if header:
+            state, mode = header
+            if mode:
+                current.mode = mode
+            sections[state] = []
             continue
 
         # Accumulate text for the current state
-        if state == "FIND":
-            current.find_text += (line + "\n")
-        elif state == "REPLACE":
-            current.replace_text += (line + "\n")
-        elif state == "INSERT_AFTER":
-            current.insert_after += (line + "\n")
-        elif state == "INSERT_TEXT":
-            current.insert_text += (line + "\n")
-
-    # Strip trailing newlines
-    for p in patches:
-        if p.find_text:
-            p.find_text = p.find_text.rstrip("\n")
-        if p.replace_text:
-            p.replace_text = p.replace_text.rstrip("\n")
-        if p.insert_after:
-            p.insert_after = p.insert_after.rstrip("\n")
-        if p.insert_text:
-            p.insert_text = p.insert_text.rstrip("\n")
+        if state:
+            sections[state].append(line)
 
+    if current is not None:
+        finish()
     return patches
 
 
-def apply_patch_to_file(root_folder: Path, patch: Patch) -> str:
+def apply_patch(content: str, patch: Patch):
     """
-    Apply a single patch to the appropriate file.
-    Returns a human-readable summary line.
+    Apply a single patch to in-memory file content.
+    Returns (new_content, human-readable summary line).
     """
-    target_path = root_folder / patch.file_rel
-
-    if not target_path.exists():
-        return f"[WARN] File not found: {patch.file_rel}"
-
-    original = target_path.read_text(encoding="utf-8")
-
     if patch.mode == "replace":
-        if patch.find_text not in original:
-            return f"[WARN] FIND text not found in {patch.file_rel}"
-        new_content = original.replace(patch.find_text, patch.replace_text, 1)
-        target_path.write_text(new_content, encoding="utf-8")
-        return f"[OK] Replace applied to {patch.file_rel}"
+        if not patch.find_text:
+            # Empty FIND has always meant "prepend REPLACE to the file"
+            return (patch.replace_text + content,
+                    f"[OK] Replace applied to {patch.file_rel} (empty FIND, prepended)")
+        matches = content.count(patch.find_text)
+        if not matches:
+            return content, f"[WARN] FIND text not found in {patch.file_rel}"
+        note = f" (first of {matches} matches)" if matches > 1 else ""
+        return (content.replace(patch.find_text, patch.replace_text, 1),
+                f"[OK] Replace applied to {patch.file_rel}{note}")
 
     elif patch.mode == "insert_after":
-        idx = original.find(patch.insert_after)
+        idx = content.find(patch.insert_after)
         if idx == -1:
-            return f"[WARN] INSERT_AFTER text not found in {patch.file_rel}"
-
+            return content, f"[WARN] INSERT_AFTER text not found in {patch.file_rel}"
+        matches = content.count(patch.insert_after)
+        note = f" (first of {matches} matches)" if matches > 1 else ""
         insert_pos = idx + len(patch.insert_after)
-        new_content = original[:insert_pos] + "\n" + patch.insert_text + original[insert_pos:]
-        target_path.write_text(new_content, encoding="utf-8")
-        return f"[OK] Insert-after applied to {patch.file_rel}"
+        return (content[:insert_pos] + "\n" + patch.insert_text + content[insert_pos:],
+                f"[OK] Insert-after applied to {patch.file_rel}{note}")
 
     else:
-        return f"[WARN] Unknown patch mode for {patch.file_rel}"
+        return content, f"[WARN] Unknown patch mode for {patch.file_rel}"
+
+
+def apply_patches_to_file(root_folder: Path, file_rel: str, patches: list) -> dict:
+    """
+    Apply every patch for one file, in document order, with a single read
+    and a single atomic write (temp file + os.replace).
+    Returns {'summaries', 'applied', 'missed', 'seconds'}.
+    """
+    start = time.perf_counter()
+    target_path = root_folder / file_rel
+    result = {"summaries": [], "applied": 0, "missed": 0, "seconds": 0.0}
+
+    if not target_path.exists():
+        result["summaries"] = [f"[WARN] File not found: {file_rel}"] * len(patches)
+        result["missed"] = len(patches)
+        return result
+
+    content = target_path.read_text(encoding="utf-8")
+    for patch in patches:
+        content, summary = apply_patch(content, patch)
+        result["summaries"].append(summary)
+        result["applied" if summary.startswith("[OK]") else "missed"] += 1
+
+    if result["applied"]:
+        tmp_path = target_path.with_name(target_path.name + ".patch_tmp")
+        try:
+            tmp_path.write_text(content, encoding="utf-8")
+            shutil.copymode(target_path, tmp_path)  # Keep the exec bit on scripts
+            os.replace(tmp_path, target_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    result["seconds"] = time.perf_counter() - start
+    return result
 
 
 def run_overseer_implement():
@@ -421,10 +729,29 @@ def run_overseer_implement():
     report_lines.append(f"Working doc: {working_doc_path}")
     report_lines.append("")
 
+    # One read-modify-write per file, files in order of first appearance
+    by_file = defaultdict(list)
     for p in patches:
-        summary = apply_patch_to_file(root_folder, p)
-        print(summary)
-        report_lines.append(summary)
+        by_file[p.file_rel].append(p)
+
+    start = time.perf_counter()
+    applied = 0
+    for file_rel, file_patches in by_file.items():
+        result = apply_patches_to_file(root_folder, file_rel, file_patches)
+        for summary in result["summaries"]:
+            print(summary)
+            report_lines.append(summary)
+        timing = (f"[INFO] {file_rel}: {result['applied']}/{len(file_patches)} applied "
+                  f"in {result['seconds'] * 1000:.1f} ms")
+        print(timing)
+        report_lines.append(timing)
+        applied += result["applied"]
+
+    total = (f"[INFO] {applied}/{len(patches)} patch(es) applied across {len(by_file)} file(s) "
+             f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(total)
+    report_lines.append("")
+    report_lines.append(total)
 
     report_text = "\n".join(report_lines)
     last_report_path = logs_root / "last_patch_report.txt"
@@ -451,6 +778,13 @@ def print_usage():
     print("  python3 DG_vibecoder.py overseer-dump")
     print("      MARCO: Overwrite logs/overseer_response.txt with a full snapshot")
     print("      of the DG_vibecoder folder plus instructions for the LLM.")
+    print("      --delta         only files changed since the last snapshot")
+    print("      --budget N      chunks of at most N estimated tokens, most")
+    print("                      relevant first (extra chunks in logs/overseer_response_partN.txt)")
+    print("")
+    print("  python3 DG_vibecoder.py overseer-history [list | restore <ts> [out] | diff <old> [<new>]]")
+    print("      List recorded snapshots, rebuild one in full, or diff two")
+    print("      (new defaults to the latest).")
     print("")
     print("  python3 DG_vibecoder.py overseer-implement")
     print("      POLO: Read logs/overseer_response.txt, apply all PATCH blocks")
@@ -468,9 +802,19 @@ def main():
     if mode == "debug-push":
         run_debug_push()
     elif mode == "overseer-dump":
-        run_overseer_dump()
+        args = sys.argv[2:]
+        budget = None
+        if "--budget" in args:
+            try:
+                budget = int(args[args.index("--budget") + 1])
+            except (IndexError, ValueError):
+                print("[ERROR] --budget needs a token count, e.g. --budget 60000")
+                return
+        run_overseer_dump(delta="--delta" in args, budget=budget)
     elif mode == "overseer-implement":
         run_overseer_implement()
+    elif mode == "overseer-history":
+        run_overseer_history(sys.argv[2:])
     else:
         print(f"[ERROR] Unknown mode: {mode}")
         print_usage()
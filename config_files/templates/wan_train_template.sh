@@ -1,29 +1,51 @@
 ﻿# WAN 2.2 TRAINING TEMPLATE (Linux/WSL)
 # Usage: ./train_wan.sh [PROJECT_NAME]
 # Note: Paths converted from C:\AI to /mnt/c/AI
+# DG_collect_dataset's 06_publish deploys <PROJECT_NAME>.toml (WSL paths) and
+# <PROJECT_NAME>_plan.env with the training settings (reasons in the project's
+# train_plan.json) to the Windows musubi-tuner's files/tomls.
 
 # --- CONFIG ---
-PROJECT_NAME="\"
+PROJECT_NAME="${1:?Usage: ./train_wan.sh [PROJECT_NAME]}"
 TRIGGER_WORD="ohwx" # Default trigger, can be overridden
 WSL_MODEL_ROOT="/mnt/c/AI/models"
 WSL_APP_ROOT="/home/seanf/workspace/deadlygraphics/ai/apps/musubi-tuner"
+TOML_DIR="/mnt/c/AI/apps/musubi-tuner/files/tomls"
+
+# --- TRAIN PLAN (defaults match the old fixed values) ---
+BATCH_SIZE=1
+GRADIENT_ACCUMULATION_STEPS=1
+MAX_TRAIN_EPOCHS=35
+SAVE_EVERY_N_EPOCHS=5
+MAX_DATA_LOADER_N_WORKERS=6
+PLAN_ENV="${TOML_DIR}/${PROJECT_NAME}_plan.env"
+if [ -f "${PLAN_ENV}" ]; then
+  source "${PLAN_ENV}"
+  echo "Using train plan: ${PLAN_ENV}"
+fi
 
 # --- MODEL PATHS (Wan 2.2 Standard) ---
 # Note: Wan 2.2 paths confirmed from original batch file
-DIT_LOW="\/diffusion_models/Wan/Wan2.2/14B/Wan_2_2_T2V/fp16/wan2.2_t2v_low_noise_14B_fp16.safetensors"
-DIT_HIGH="\/diffusion_models/Wan/Wan2.2/14B/Wan_2_2_T2V/fp16/wan2.2_t2v_high_noise_14B_fp16.safetensors"
-VAE="\/vae/WAN/wan_2.1_vae.pth"
-T5="\/clip/models_t5_umt5-xxl-enc-bf16.pth"
+DIT_LOW="${WSL_MODEL_ROOT}/diffusion_models/Wan/Wan2.2/14B/Wan_2_2_T2V/fp16/wan2.2_t2v_low_noise_14B_fp16.safetensors"
+DIT_HIGH="${WSL_MODEL_ROOT}/diffusion_models/Wan/Wan2.2/14B/Wan_2_2_T2V/fp16/wan2.2_t2v_high_noise_14B_fp16.safetensors"
+VAE="${WSL_MODEL_ROOT}/vae/WAN/wan_2.1_vae.pth"
+T5="${WSL_MODEL_ROOT}/clip/models_t5_umt5-xxl-enc-bf16.pth"
 
 # --- COMMAND ---
+# batch_size / num_repeats are read from the dataset TOML
 accelerate launch --num_processes 1 "wan_train_network.py" \
-  --dataset_config "\/files/tomls/\.toml" \
-  --dit "\" \
-  --dit_high_noise "\" \
-  --t5 "\" \
-  --vae "\" \
-  --output_dir "\/outputs/\" \
-  --output_name "\" \
+  --dataset_config "${TOML_DIR}/${PROJECT_NAME}.toml" \
+  --dit "${DIT_LOW}" \
+  --dit_high_noise "${DIT_HIGH}" \
+  --t5 "${T5}" \
+  --vae "${VAE}" \
+  --output_dir "${WSL_APP_ROOT}/outputs/${PROJECT_NAME}" \
+  --output_name "${PROJECT_NAME}" \
   --fp8_base --fp8_scaled --fp8_t5 \
   --optimizer_type AdamW8bit \
-  --learning_rate 0.0001
+  --learning_rate 0.0001 \
+  --gradient_accumulation_steps "${GRADIENT_ACCUMULATION_STEPS}" \
+  --max_train_epochs "${MAX_TRAIN_EPOCHS}" \
+  --save_every_n_epochs "${SAVE_EVERY_N_EPOCHS}" \
+  --max_data_loader_n_workers "${MAX_DATA_LOADER_N_WORKERS}" \
+  --persistent_data_loader_workers